@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Batch conversion for cad2qryleth
+================================
+Converts many Blender scripts in one interpreter launch by fanning
+`converter.convert()` out across a process pool.
+
+```bash
+python converter.py input/ -j 8                  # every *.py under input/
+python converter.py "input/*Table*.py" --out-dir build
+```
+
+Every script is converted independently: an exception in one of them is
+reported in the summary and never aborts the rest of the batch.  Outputs
+mirror the scripts' subdirectories below the directory (or the fixed
+prefix of the glob) that matched them, so `input/a/Chair.py` and
+`input/b/Chair.py` become `a/Chair.json` and `b/Chair.json`; scripts that
+would still share an output are reported as failures.
+"""
+from __future__ import annotations
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, TextIO
+
+from cache import ConversionCache, cached_convert
+from converter import ConversionStats, atomic_writer, dump, encode_json, primitive_count, quantize, size_report
+
+###############################################################################
+# Inputs                                                                      #
+###############################################################################
+
+def collect_outputs(patterns: Iterable[str]) -> Dict[Path, str]:
+  """Expand files, directories (recursively, `*.py`) and glob patterns,
+  mapping every match to its output name: its path below the directory or
+  the glob's fixed prefix, without suffix (`a/Chair`), or just its stem
+  for a plain file.
+
+  The result is sorted and free of duplicates so batch output is stable.
+  """
+  found: Dict[Path, str] = {}
+  for pattern in patterns:
+    path = Path(pattern)
+    if path.is_dir():
+      root = path
+      matches = [p for p in path.rglob("*.py") if p.is_file()]
+    elif any(ch in pattern for ch in "*?["):
+      parts = path.parts
+      fixed = next(i for i, part in enumerate(parts) if any(ch in part for ch in "*?["))
+      root = Path(*parts[:fixed])
+      matches = [Path(p) for p in glob.glob(pattern, recursive=True) if Path(p).is_file()]
+    else:
+      root = path.parent
+      matches = [path]
+    for m in sorted(matches):
+      found.setdefault(m, m.relative_to(root).with_suffix("").as_posix())
+  return found
+
+
+def collect_inputs(patterns: Iterable[str]) -> List[Path]:
+  """The scripts of `collect_outputs(patterns)`, in order."""
+  return list(collect_outputs(patterns))
+
+
+def _clashes(names: Dict[Path, str]) -> Dict[Path, str]:
+  """Error message for every script whose output name another one shares."""
+  owners: Dict[str, List[Path]] = {}
+  for src, name in names.items():
+    owners.setdefault(name, []).append(src)
+  return {src: f"output name {name!r} is shared with " + ", ".join(str(o) for o in srcs if o != src)
+          for name, srcs in owners.items() if len(srcs) > 1 for src in srcs}
+
+###############################################################################
+# Worker                                                                      #
+###############################################################################
+
+@dataclass
+class BatchResult:
+  """Outcome of converting a single script."""
+  source: Path
+  output: Path | None = None
+  ok: bool = False
+  primitives: int = 0
+  seconds: float = 0.0
+  error: str | None = None
+  cached: bool = False
+  size: int = 0
+  raw_size: int | None = None  # pretty, unquantized size when --precision/--compact is used
+  culled: int = 0
+  merged: int = 0  # draw calls saved by --merge-boxes
+  dropped: int = 0  # primitives dropped to meet --budget
+  stats: Dict[str, Any] | None = None  # ConversionStats.to_dict() when requested
+
+
+def _convert_one(source: str, out_dir: str, options: Dict[str, Any],
+                 cache: ConversionCache | None = None, fmt: str = "json",
+                 precision: int | None = None, compact: bool = False,
+                 collect_stats: bool = False, json_backend: str | None = None,
+                 output: str | None = None) -> BatchResult:
+  """Pool worker: convert `source` and write `<out_dir>/<output>.json`
+  (`.qryb` with `fmt="binary"`; `output` defaults to the script's stem).
+  `collect_stats` fills `BatchResult.stats`."""
+  src = Path(source)
+  target = Path(out_dir) / (output or src.stem)
+  started = time.perf_counter()
+  stats = ConversionStats() if collect_stats else None
+  try:
+    code = src.read_text(encoding="utf-8")
+    data, hit = cached_convert(code, cache, name=src.stem, stats=stats, **options)
+    raw_size = None
+    if precision is not None or compact:
+      raw_size = len(encode_json(data, backend=json_backend))
+    if precision is not None:
+      quantize(data, precision)
+    with stats.phase("serialize") if stats else nullcontext():
+      if fmt == "binary":
+        from binary import write_binary
+        out = target.with_name(target.name + ".qryb")
+        out.parent.mkdir(parents=True, exist_ok=True)
+        write_binary(data, out)
+      else:
+        out = target.with_name(target.name + ".json")
+        out.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_writer(out, "wb") as fh:
+          dump(data, fh, compact=compact, backend=json_backend)
+  except (Exception, SystemExit) as exc:  # scripts may call sys.exit()
+    return BatchResult(src, error=f"{type(exc).__name__}: {exc}",
+                       seconds=time.perf_counter() - started,
+                       stats=stats.to_dict() if stats else None)
+  size = out.stat().st_size
+  if stats:
+    stats.count("outputBytes", size)
+  return BatchResult(src, out, True, primitive_count(data), time.perf_counter() - started,
+                     cached=hit, size=size, raw_size=raw_size,
+                     culled=len(data.get("culledPrimitives", ())),
+                     merged=sum(len(m["parts"]) - 1 for m in data.get("mergedBoxes", ())),
+                     dropped=len(data.get("droppedPrimitives", ())),
+                     stats=stats.to_dict() if stats else None)
+
+###############################################################################
+# Public API                                                                  #
+###############################################################################
+
+def run_batch(patterns: Iterable[str], *, out_dir: str | Path = "output",
+              jobs: int | None = None, options: Dict[str, Any] | None = None,
+              cache: ConversionCache | None = None, fmt: str = "json",
+              precision: int | None = None, compact: bool = False,
+              json_backend: str | None = None,
+              stats: ConversionStats | None = None) -> List[BatchResult]:
+  """Convert every script matched by `patterns` into `out_dir`.
+
+  `options` are passed to `convert()` (everything except `name`, which is
+  the script's stem).  Outputs keep the scripts' relative subdirectories
+  (see `collect_outputs`); scripts sharing an output name fail without
+  being converted.
+
+  `jobs` is the number of worker processes (CPU count by default); with
+  `jobs=1` everything runs in the calling process.  Unchanged scripts are
+  served from `cache` when one is given.  `fmt` selects JSON or `.qryb`
+  output; `precision`/`compact` quantize and compact it (see
+  `converter.quantize`), `json_backend` picks the encoder (see
+  `converter.encode_json`).  Results are returned in input order.  With
+  `stats`, every result carries its own numbers and `stats` receives their
+  sum (`files`/`failed` counters included).
+  """
+  names = collect_outputs(patterns)
+  sources = list(names)
+  options = options or {}
+  Path(out_dir).mkdir(parents=True, exist_ok=True)
+  results: dict[Path, BatchResult] = {src: BatchResult(src, error=error)
+                                      for src, error in _clashes(names).items()}
+  todo = [s for s in sources if s not in results]
+  jobs = max(1, min(jobs or os.cpu_count() or 1, len(todo) or 1))
+
+  args = (str(out_dir), options, cache, fmt, precision, compact, stats is not None, json_backend)
+  if jobs == 1:
+    results.update((s, _convert_one(str(s), *args, output=names[s])) for s in todo)
+  else:
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+      futures = {pool.submit(_convert_one, str(s), *args, output=names[s]): s for s in todo}
+      for fut in as_completed(futures):
+        src = futures[fut]
+        try:
+          results[src] = fut.result()
+        except Exception as exc:  # worker died (e.g. os._exit, segfault)
+          results[src] = BatchResult(src, error=f"{type(exc).__name__}: {exc}")
+  ordered = [results[s] for s in sources]
+
+  if stats is not None:
+    for r in ordered:
+      if r.stats:
+        stats.merge(r.stats)
+      stats.count("files")
+      stats.count("failed", not r.ok)
+    stats.info.pop("capture", None)  # differs per file
+  return ordered
+
+
+def format_result(r: BatchResult) -> str:
+  """One summary line for a single conversion."""
+  if r.ok:
+    note = ", cached" if r.cached else ""
+    if r.culled:
+      note += f", {r.culled} culled"
+    if r.merged:
+      note += f", {r.merged} draws merged"
+    if r.dropped:
+      note += f", {r.dropped} dropped for budget"
+    if r.raw_size is not None:
+      note += f", {size_report(r.raw_size, r.size)}"
+    return f"  ok    {r.source} -> {r.output} ({r.primitives} primitives, {r.seconds:.2f}s{note})"
+  return f"  FAIL  {r.source}: {r.error}"
+
+
+def print_summary(results: List[BatchResult], stream: TextIO | None = None) -> None:
+  """Print one line per file followed by a success/failure total."""
+  stream = stream or sys.stdout
+  for r in results:
+    print(format_result(r), file=stream)
+  failed = sum(1 for r in results if not r.ok)
+  print(f"{len(results) - failed} converted, {failed} failed, {len(results)} total", file=stream)
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for cad2qryleth
+===============================
+Generates synthetic Blender scripts of a given size, runs the full
+`convert()` pipeline plus serialization against them and compares the
+result with stored baselines.
+
+```bash
+python bench.py                          # 1k, 10k, 100k primitives vs bench_baseline.json
+python bench.py --sizes 1000,1000000     # pick the sizes
+python bench.py --update-baseline        # record this machine's numbers
+python bench.py --emit 10000 > big.py    # just print a generated script
+```
+
+Every case runs in a fresh worker process, so its peak RSS is not
+inflated by earlier cases.  Timings are the best of `--repeat` runs.  A
+case regresses when its time or peak memory exceeds the baseline by more
+than `--threshold` (default 25%; tiny absolute differences are ignored),
+or its output size changes at all; the exit code is then 1.  Baselines are
+machine-specific: record them on the machine that runs the comparison.
+The 1M-primitive case needs about 6 GB of RAM.
+"""
+from __future__ import annotations
+import argparse
+import json
+import math
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List
+
+from converter import ConversionStats, convert, encode_json, np, write_text_atomic
+
+BASELINE_FILE = Path(__file__).resolve().with_name("bench_baseline.json")
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+DEFAULT_THRESHOLD = 0.25
+# differences below these never count as regressions (timer/allocator noise)
+_SLACK = {"seconds": 0.05, "peakMiB": 8.0}
+
+###############################################################################
+# Script generator                                                            #
+###############################################################################
+
+# diffuse colours: the first two match global materials, the rest become
+# object materials (one of them semi-transparent)
+_PALETTE = (
+  (0.133, 0.545, 0.133, 1.0), (0.545, 0.271, 0.075, 1.0), (0.8, 0.1, 0.1, 1.0),
+  (0.1, 0.3, 0.8, 1.0), (0.9, 0.8, 0.2, 1.0), (0.6, 0.6, 0.65, 1.0),
+  (0.2, 0.2, 0.2, 1.0), (0.7, 0.9, 1.0, 0.4),
+)
+
+_ADD_CALLS = (
+  "bpy.ops.mesh.primitive_cube_add(size={s}, location={loc}, rotation={rot})",
+  "bpy.ops.mesh.primitive_cylinder_add(radius={s} * 0.4, depth={s} * 1.5, location={loc}, rotation={rot})",
+  "bpy.ops.mesh.primitive_uv_sphere_add(radius={s} * 0.5, location={loc})",
+  "bpy.ops.mesh.primitive_cone_add(radius1={s} * 0.5, depth={s}, location={loc}, rotation={rot})",
+  "bpy.ops.mesh.primitive_torus_add(major_radius={s} * 0.5, minor_radius={s} * 0.1, location={loc}, rotation={rot})",
+  "bpy.ops.mesh.primitive_plane_add(size={s}, location={loc}, rotation={rot})",
+)
+
+
+def generate_script(n: int, *, style: str = "loop") -> str:
+  """A deterministic bpy script adding `n` primitives.
+
+  Primitives cycle through every supported type on a 3D grid, with varying
+  rotations, non-uniform scales and eight materials.  `style="loop"` writes
+  a compact script driven by a `for` loop and a helper function (the
+  script size is constant); `style="flat"` writes one literal call per
+  primitive, like most generated input scripts.  Both styles describe the
+  same object and convert to identical output.
+  """
+  side = max(1, round(n ** (1 / 3)))
+  head = ["import bpy", "import math", "",
+          "materials = []",
+          f"for k, color in enumerate({list(_PALETTE)!r}):",
+          "  mat = bpy.data.materials.new(name=f'Mat{k}')",
+          "  mat.diffuse_color = color",
+          "  materials.append(mat)", ""]
+  if style == "loop":
+    body = ["def add(i):",
+            f"  x, y, z = i % {side} * 1.5, i // {side} % {side} * 1.5, i // {side * side} * 1.5",
+            "  s = 0.5 + i % 5 * 0.1",
+            "  rot = (i % 7 * math.pi / 14, i % 11 * math.pi / 22, i % 13 * math.pi / 26)",
+            "  kind = i % 6"]
+    for k, call in enumerate(_ADD_CALLS):
+      body.append(f"  {'if' if k == 0 else 'elif'} kind == {k}:")
+      body.append("    " + call.format(s="s", loc="(x, y, z)", rot="rot"))
+    body += ["  obj = bpy.context.object",
+             "  obj.name = f'Part{i}'",
+             "  obj.scale = (1.0, 1.0 + i % 3 * 0.25, 1.0)",
+             f"  obj.data.materials.append(materials[i % {len(_PALETTE)}])",
+             "",
+             f"for i in range({n}):",
+             "  add(i)"]
+    return "\n".join(head + body) + "\n"
+  if style != "flat":
+    raise ValueError(f"Unknown script style: {style}")
+
+  body = []
+  for i in range(n):
+    loc = (i % side * 1.5, i // side % side * 1.5, i // (side * side) * 1.5)
+    rot = (i % 7 * math.pi / 14, i % 11 * math.pi / 22, i % 13 * math.pi / 26)
+    body.append(_ADD_CALLS[i % 6].format(s=repr(0.5 + i % 5 * 0.1), loc=loc, rot=rot))
+    body.append(f"obj = bpy.context.object; obj.name = 'Part{i}'; "
+                f"obj.scale = (1.0, {1.0 + i % 3 * 0.25}, 1.0); "
+                f"obj.data.materials.append(materials[{i % len(_PALETTE)}])")
+  return "\n".join(head + body) + "\n"
+
+###############################################################################
+# Runner                                                                      #
+###############################################################################
+
+def _peak_rss_mib() -> float | None:
+  try:
+    import resource
+  except ImportError:  # not POSIX
+    return None
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # kilobytes on Linux, bytes on macOS
+  return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _run_case(n: int, style: str, repeat: int, options: Dict[str, Any]) -> Dict[str, Any]:
+  """Worker: generate, convert and serialize one case; best of `repeat`."""
+  src = generate_script(n, style=style)
+  best: Dict[str, Any] | None = None
+  for _ in range(repeat):
+    stats = ConversionStats()
+    started = time.perf_counter()
+    data = convert(src, name=f"Bench{n}", stats=stats, **options)
+    with stats.phase("serialize"):
+      blob = encode_json(data)
+    seconds = time.perf_counter() - started
+    if best is None or seconds < best["seconds"]:
+      best = {"seconds": round(seconds, 4),
+              "phases": {k: round(e["wall"], 4) for k, e in stats.phases.items()},
+              "capture": stats.info.get("capture"),
+              "outputBytes": len(blob)}
+    del data, blob
+  best.update(primitives=n, throughput=round(n / best["seconds"]), peakMiB=_peak_rss_mib())
+  return best
+
+
+def run_benchmarks(sizes: List[int], *, style: str = "loop", repeat: int = 3,
+                   options: Dict[str, Any] | None = None) -> Dict[str, Dict[str, Any]]:
+  """Run every size in its own worker process; results keyed by case name
+  (`loop-10000`, or `loop-10000[bvh,instancing]` with `options`)."""
+  options = options or {}
+  suffix = f"[{','.join(sorted(options))}]" if options else ""
+  results = {}
+  for n in sizes:
+    with ProcessPoolExecutor(max_workers=1) as pool:
+      results[f"{style}-{n}{suffix}"] = pool.submit(_run_case, n, style, repeat, options).result()
+  return results
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+            threshold: float = DEFAULT_THRESHOLD) -> List[str]:
+  """Regressions of `results` against `baseline`, one message each."""
+  problems = []
+  for case, r in results.items():
+    b = baseline.get(case)
+    if b is None:
+      continue
+    for key in ("seconds", "peakMiB"):
+      if r.get(key) is not None and b.get(key) and r[key] > max(b[key] * (1 + threshold), b[key] + _SLACK[key]):
+        problems.append(f"{case}: {key} {b[key]} -> {r[key]} (+{(r[key] / b[key] - 1) * 100:.0f}%)")
+    if r["outputBytes"] != b["outputBytes"]:
+      problems.append(f"{case}: outputBytes {b['outputBytes']} -> {r['outputBytes']}")
+  return problems
+
+
+def _environment() -> Dict[str, Any]:
+  return {"python": platform.python_version(), "platform": platform.platform(),
+          "machine": platform.machine(), "numpy": np.__version__ if np is not None else None}
+
+###############################################################################
+# CLI                                                                         #
+###############################################################################
+
+def main(argv: List[str] | None = None) -> int:
+  parser = argparse.ArgumentParser(description="cad2qryleth benchmark suite")
+  parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                      help="Comma-separated primitive counts (default: 1000,10000,100000)")
+  parser.add_argument("--style", choices=["loop", "flat"], default="loop", help="Generated script style (default: loop)")
+  parser.add_argument("--options", type=json.loads, default={}, metavar="JSON",
+                      help='convert() keyword arguments, e.g. \'{"bvh": true, "instancing": true}\'')
+  parser.add_argument("--repeat", type=int, default=3, help="Runs per case; the best is kept (default: 3)")
+  parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                      help="Allowed slowdown / memory growth vs the baseline (default: 0.25)")
+  parser.add_argument("--baseline", type=Path, default=BASELINE_FILE, help="Baseline file (default: bench_baseline.json)")
+  parser.add_argument("--update-baseline", action="store_true", help="Store these results as the new baseline")
+  parser.add_argument("--json", action="store_true", help="Print results as JSON")
+  parser.add_argument("--emit", type=int, metavar="N", help="Print a generated script with N primitives and exit")
+  ns = parser.parse_args(argv)
+
+  if ns.emit is not None:
+    sys.stdout.write(generate_script(ns.emit, style=ns.style))
+    return 0
+
+  sizes = [int(s.replace("_", "")) for s in ns.sizes.split(",") if s]
+  results = run_benchmarks(sizes, style=ns.style, repeat=ns.repeat, options=ns.options)
+  if ns.json:
+    print(json.dumps(results, indent=2))
+  else:
+    print(f"{'case':<28} {'seconds':>9} {'prims/s':>10} {'peak MiB':>9} {'output':>12}  capture")
+    for case, r in results.items():
+      print(f"{case:<28} {r['seconds']:>9.3f} {r['throughput']:>10} {r['peakMiB'] or '-':>9} "
+            f"{r['outputBytes']:>12}  {r['capture']}")
+
+  stored = json.loads(ns.baseline.read_text(encoding="utf-8")) if ns.baseline.exists() else {}
+  if ns.update_baseline:
+    cases = {**stored.get("cases", {}), **results}
+    write_text_atomic(ns.baseline, json.dumps({"environment": _environment(), "cases": cases}, indent=2) + "\n")
+    print(f"Baseline written to {ns.baseline}", file=sys.stderr)
+    return 0
+
+  problems = compare(results, stored.get("cases", {}), ns.threshold)
+  for p in problems:
+    print(f"REGRESSION {p}", file=sys.stderr)
+  if stored and stored.get("environment") != _environment():
+    print("note: baseline was recorded in a different environment", file=sys.stderr)
+  return 1 if problems else 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
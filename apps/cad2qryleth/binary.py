@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Compact binary export format (`.qryb`)
+======================================
+Binary twin of the converter's JSON output, laid out so a JavaScript reader
+can wrap every column in a typed array (`new Float32Array(buf, off, n)`)
+without per-primitive parsing.
+
+Layout, little-endian, every section 4-byte aligned:
+
+```
+offset  type      field
+0       char[4]   magic "QRYB"
+4       uint16    version (1)
+6       uint16    flags (bit 0: Y-up)
+8       uint32    primitive count N
+12      uint32    meta offset      16  uint32  meta length (UTF-8 JSON)
+20      uint32    type column      Uint8[N]    index into meta.types
+24      uint32    material column  Int32[N]    index into meta.materialRefs, -1 = none
+28      uint32    position column  Float32[N*3]
+32      uint32    rotation column  Float32[N*3]
+36      uint32    geometry column  Float32[N*3] params in meta.geometryLayout order, 0-padded
+```
+
+The meta block holds everything that is not numeric: object `name`,
+`types`, `geometryLayout`, the deduplicated `materialRefs`
+(`{"globalMaterialUuid": ...}` / `{"objectMaterialUuid": ...}`), the object
+`materials` table, primitive `names` and `geometryExtra`, the geometry
+fields outside the layout (segment hints) by primitive index.  Any other top-level keys of the
+converter output (e.g. `instancedPrimitives`) are kept verbatim in
+`meta.extra`.
+
+```bash
+python converter.py input/Dog.py --format binary -o Dog.qryb
+python binary.py decode Dog.qryb              # back to JSON (float32 precision)
+python binary.py check input/                 # JSON ↔ binary round trip
+```
+"""
+from __future__ import annotations
+import argparse
+import json
+import math
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Any, Dict, List
+
+from converter import _GEOMETRY_LAYOUT, _TYPE_NAMES, atomic_writer, convert
+
+MAGIC = b"QRYB"
+VERSION = 1
+FLAG_Y_UP = 1
+
+_HEADER = struct.Struct("<4sHHI7I")
+_BASE_KEYS = ("name", "upAxis", "primitives", "materials")
+
+###############################################################################
+# Encoding                                                                    #
+###############################################################################
+
+def _f32(values: List[float]) -> bytes:
+  col = array("f", values)
+  if sys.byteorder != "little":
+    col.byteswap()
+  return col.tobytes()
+
+def _i32(values: List[int]) -> bytes:
+  col = array("i", values)
+  if sys.byteorder != "little":
+    col.byteswap()
+  return col.tobytes()
+
+def _pad4(buf: bytearray) -> None:
+  buf.extend(b"\0" * (-len(buf) % 4))
+
+
+def encode(data: Dict[str, Any]) -> bytes:
+  """Encode a `convert()` result into the `.qryb` layout."""
+  prims = data["primitives"]
+  type_codes = {t: i for i, t in enumerate(_TYPE_NAMES)}
+
+  refs: List[Dict[str, str]] = []
+  ref_index: Dict[tuple, int] = {}
+  types, materials, names = bytearray(), [], []
+  positions, rotations, geometry = [], [], []
+  geometry_extra: Dict[str, Dict[str, Any]] = {}
+  for i, p in enumerate(prims):
+    kind = p["type"]
+    if kind not in type_codes:
+      raise ValueError(f"Primitive type {kind!r} has no binary encoding")
+    types.append(type_codes[kind])
+    ref = {k: p[k] for k in ("globalMaterialUuid", "objectMaterialUuid") if k in p}
+    if ref:
+      key = tuple(sorted(ref.items()))
+      if key not in ref_index:
+        ref_index[key] = len(refs)
+        refs.append(ref)
+      materials.append(ref_index[key])
+    else:
+      materials.append(-1)
+    names.append(p.get("name", ""))
+    positions.extend(p["transform"]["position"])
+    rotations.extend(p["transform"]["rotation"])
+    params = [p["geometry"][key] for key, _ in _GEOMETRY_LAYOUT[kind]]
+    geometry.extend(params + [0.0] * (3 - len(params)))
+    if len(p["geometry"]) > len(params):  # e.g. segment hints
+      layout = {key for key, _ in _GEOMETRY_LAYOUT[kind]}
+      geometry_extra[str(i)] = {k: v for k, v in p["geometry"].items() if k not in layout}
+
+  meta = json.dumps({
+    "name": data.get("name", ""),
+    "upAxis": data.get("upAxis", "Y"),
+    "types": list(_TYPE_NAMES),
+    "geometryLayout": {t: [k for k, _ in layout] for t, layout in _GEOMETRY_LAYOUT.items()},
+    "materialRefs": refs,
+    "materials": data.get("materials", []),
+    "names": names,
+    "geometryExtra": geometry_extra,
+    "extra": {k: v for k, v in data.items() if k not in _BASE_KEYS},
+  }, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+  body = bytearray(b"\0" * _HEADER.size)
+  offsets = []
+  for chunk in (meta, bytes(types), _i32(materials), _f32(positions), _f32(rotations), _f32(geometry)):
+    _pad4(body)
+    offsets.append(len(body))
+    body.extend(chunk)
+  flags = FLAG_Y_UP if data.get("upAxis", "Y").upper() == "Y" else 0
+  _HEADER.pack_into(body, 0, MAGIC, VERSION, flags, len(prims),
+                    offsets[0], len(meta), *offsets[1:])
+  return bytes(body)
+
+###############################################################################
+# Reference reader                                                            #
+###############################################################################
+
+def _columns(buf: bytes, off: int, code: str, n: int) -> array:
+  col = array(code)
+  col.frombytes(buf[off:off + n * col.itemsize])
+  if sys.byteorder != "little":
+    col.byteswap()
+  return col
+
+
+def decode(buf: bytes) -> Dict[str, Any]:
+  """Decode `.qryb` bytes into the same dict shape `convert()` returns.
+
+  Numbers come back at float32 precision.
+  """
+  magic, version, flags, n, meta_off, meta_len, type_off, mat_off, pos_off, rot_off, geo_off = \
+    _HEADER.unpack_from(buf, 0)
+  if magic != MAGIC:
+    raise ValueError("Not a .qryb file")
+  if version != VERSION:
+    raise ValueError(f"Unsupported .qryb version {version}")
+  meta = json.loads(bytes(buf[meta_off:meta_off + meta_len]).decode("utf-8"))
+  types = buf[type_off:type_off + n]
+  materials = _columns(buf, mat_off, "i", n)
+  positions = _columns(buf, pos_off, "f", n * 3)
+  rotations = _columns(buf, rot_off, "f", n * 3)
+  geometry = _columns(buf, geo_off, "f", n * 3)
+
+  extra_geometry = meta.get("geometryExtra", {})
+  prims = []
+  for i in range(n):
+    kind = meta["types"][types[i]]
+    prim = {
+      "type": kind,
+      "name": meta["names"][i],
+      "geometry": {key: geometry[i*3 + j] for j, key in enumerate(meta["geometryLayout"][kind])},
+      "transform": {
+        "position": list(positions[i*3:i*3 + 3]),
+        "rotation": list(rotations[i*3:i*3 + 3]),
+      }
+    }
+    prim["geometry"].update(extra_geometry.get(str(i), ()))
+    if materials[i] >= 0:
+      prim.update(meta["materialRefs"][materials[i]])
+    prims.append(prim)
+
+  result = {"name": meta["name"], "upAxis": "Y" if flags & FLAG_Y_UP else "Z", "primitives": prims}
+  result.update(meta.get("extra", {}))
+  if meta["materials"]:
+    result["materials"] = meta["materials"]
+  return result
+
+
+def write_binary(data: Dict[str, Any], path: str | Path) -> None:
+  with atomic_writer(path, "wb") as fh:
+    fh.write(encode(data))
+
+
+def read_binary(path: str | Path) -> Dict[str, Any]:
+  return decode(Path(path).read_bytes())
+
+###############################################################################
+# Round-trip check                                                            #
+###############################################################################
+
+def roundtrip_mismatches(data: Dict[str, Any]) -> List[str]:
+  """Compare `data` with `decode(encode(data))` at float32 precision."""
+  back = decode(encode(data))
+  problems = []
+
+  def same(a: Any, b: Any, where: str) -> None:
+    if isinstance(a, float) or isinstance(b, float):
+      if not math.isclose(a, b, rel_tol=1e-6, abs_tol=1e-6):
+        problems.append(f"{where}: {a!r} != {b!r}")
+    elif isinstance(a, dict) and isinstance(b, dict):
+      if list(a) != list(b):
+        problems.append(f"{where}: keys {list(a)} != {list(b)}")
+      for k in a.keys() & b.keys():
+        same(a[k], b[k], f"{where}.{k}")
+    elif isinstance(a, list) and isinstance(b, list):
+      if len(a) != len(b):
+        problems.append(f"{where}: length {len(a)} != {len(b)}")
+      for i, (x, y) in enumerate(zip(a, b)):
+        same(x, y, f"{where}[{i}]")
+    elif a != b:
+      problems.append(f"{where}: {a!r} != {b!r}")
+
+  same(data, back, "$")
+  return problems
+
+###############################################################################
+# CLI                                                                         #
+###############################################################################
+
+def main(argv: List[str] | None = None) -> int:
+  parser = argparse.ArgumentParser(description="cad2qryleth .qryb tools")
+  sub = parser.add_subparsers(dest="cmd", required=True)
+  dec = sub.add_parser("decode", help="Print a .qryb file as JSON")
+  dec.add_argument("file")
+  chk = sub.add_parser("check", help="Convert scripts and verify the JSON ↔ binary round trip")
+  chk.add_argument("input", nargs="+", help="Scripts, directories or globs")
+  ns = parser.parse_args(argv)
+
+  if ns.cmd == "decode":
+    print(json.dumps(read_binary(ns.file), indent=2))
+    return 0
+
+  from batch import collect_inputs
+  failed = 0
+  for src in collect_inputs(ns.input):
+    try:
+      data = convert(src.read_text(encoding="utf-8"), name=src.stem)
+    except Exception as exc:
+      print(f"  skip  {src}: {type(exc).__name__}: {exc}")
+      continue
+    problems = roundtrip_mismatches(data)
+    size_json = len(json.dumps(data, indent=2).encode("utf-8"))
+    size_bin = len(encode(data))
+    if problems:
+      failed += 1
+      print(f"  FAIL  {src}: {problems[0]} (+{len(problems) - 1} more)")
+    else:
+      print(f"  ok    {src}: {size_json} B json -> {size_bin} B binary")
+  return 1 if failed else 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
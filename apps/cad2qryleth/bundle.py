@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Multi-object bundle format (`.qryp`)
+====================================
+Packs many conversions into one file for scene libraries: object
+materials are stored once in a shared table and an index maps every
+object name to the byte range of its JSON, so a reader can `mmap` the
+bundle and decode a single object without touching the others.
+
+Layout, little-endian:
+
+```
+offset  type      field
+0       char[4]   magic "QRYP"
+4       uint16    version (1)
+6       uint16    flags (0)
+8       uint32    object count N
+12      uint64    index offset      20  uint64  index length (UTF-8 JSON)
+28      uint64    materials offset  36  uint64  materials length (UTF-8 JSON)
+44      ...       objects, one compact JSON document each
+```
+
+Every object is the converter output with its `materials` list replaced by
+the material UUIDs; the table holds each object material once (object
+material UUIDs are content hashes, so equal materials share one).  The
+index is a JSON list of `{"name", "offset", "length", "primitives"}` in
+pack order (`primitives` as counted by `converter.primitive_count`).  `BundleReader.read()` returns exactly what `convert()`
+returned for that object.
+
+```bash
+python converter.py input/ --bundle library.qryp    # batch-convert and pack
+python bundle.py pack library.qryp input/ "output/*.json"
+python bundle.py list library.qryp
+python bundle.py extract library.qryp Dog -o Dog.json
+python bundle.py extract library.qryp --all --out-dir objects/
+```
+"""
+from __future__ import annotations
+import argparse
+import mmap
+import struct
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List
+
+from converter import atomic_writer, dump, encode_json, loads, primitive_count, quantize
+
+MAGIC = b"QRYP"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sHHI4Q")
+
+###############################################################################
+# Writing                                                                     #
+###############################################################################
+
+class BundleWriter:
+  """Streams objects into a bundle; the file appears atomically on `close()`.
+
+  ```python
+  with BundleWriter("library.qryp") as bundle:
+    for data in results:
+      bundle.add(data)
+  ```
+  """
+
+  def __init__(self, path: str | Path) -> None:
+    self.path = Path(path)
+    self._target = atomic_writer(self.path, "wb")
+    self._fh = self._target.__enter__()
+    self._fh.write(b"\0" * _HEADER.size)
+    self._index: List[Dict[str, Any]] = []
+    self._names: set[str] = set()
+    self._materials: Dict[str, Dict[str, Any]] = {}
+    self.material_refs = 0  # object material entries before deduplication
+
+  def add(self, data: Dict[str, Any], name: str | None = None) -> None:
+    """Append one `convert()` result, stored under `name` (default: its own)."""
+    name = name or data.get("name", "")
+    if name in self._names:
+      raise ValueError(f"Duplicate object name in bundle: {name!r}")
+    stored = dict(data)
+    if "materials" in data:
+      uuids = []
+      for m in data["materials"]:
+        known = self._materials.setdefault(m["uuid"], m)
+        if known != m:
+          raise ValueError(f"Conflicting definitions of material {m['uuid']}")
+        uuids.append(m["uuid"])
+      stored["materials"] = uuids
+      self.material_refs += len(uuids)
+    offset = self._fh.tell()
+    length = dump(stored, self._fh, compact=True)
+    self._names.add(name)
+    self._index.append({"name": name, "offset": offset, "length": length,
+                        "primitives": primitive_count(data)})
+
+  def close(self) -> None:
+    """Write the material table and index and publish the file."""
+    if self._fh is None:
+      return
+    mat_off = self._fh.tell()
+    mat_len = dump(list(self._materials.values()), self._fh, compact=True)
+    index_off = self._fh.tell()
+    index_len = dump(self._index, self._fh, compact=True)
+    self._fh.seek(0)
+    self._fh.write(_HEADER.pack(MAGIC, VERSION, 0, len(self._index),
+                                index_off, index_len, mat_off, mat_len))
+    self._fh = None
+    self._target.__exit__(None, None, None)
+
+  def abort(self, exc: BaseException | None = None) -> None:
+    """Discard the partially written bundle."""
+    if self._fh is not None:
+      self._fh = None
+      exc = exc or RuntimeError("bundle aborted")
+      self._target.__exit__(type(exc), exc, exc.__traceback__)
+
+  @property
+  def materials(self) -> int:
+    """Number of distinct object materials so far."""
+    return len(self._materials)
+
+  def __len__(self) -> int:
+    return len(self._index)
+
+  def __enter__(self) -> BundleWriter:
+    return self
+
+  def __exit__(self, exc_type, exc, tb) -> None:
+    if exc_type is None:
+      self.close()
+    else:
+      self.abort(exc)
+
+
+def write_bundle(objects: Iterable[Dict[str, Any]], path: str | Path) -> None:
+  """Pack `convert()` results into a bundle at `path`."""
+  with BundleWriter(path) as bundle:
+    for data in objects:
+      bundle.add(data)
+
+###############################################################################
+# Reading                                                                     #
+###############################################################################
+
+class BundleReader:
+  """Random access to the objects of a bundle through `mmap`.
+
+  Opening a bundle parses only its header and index; the material table is
+  decoded on first use and every `read()` decodes just that object.
+  """
+
+  def __init__(self, path: str | Path) -> None:
+    self.path = Path(path)
+    with open(self.path, "rb") as fh:
+      self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+      if len(self._mm) < _HEADER.size:
+        raise ValueError("Not a .qryp bundle")
+      magic, version, _, count, index_off, index_len, mat_off, mat_len = _HEADER.unpack_from(self._mm, 0)
+      if magic != MAGIC:
+        raise ValueError("Not a .qryp bundle")
+      if version != VERSION:
+        raise ValueError(f"Unsupported .qryp version {version}")
+      self.index = {e["name"]: e for e in loads(self._mm[index_off:index_off + index_len])}
+      if len(self.index) != count:
+        raise ValueError("Corrupt .qryp index")
+    except BaseException:
+      self._mm.close()
+      raise
+    self._material_range = (mat_off, mat_off + mat_len)
+    self._materials: Dict[str, Dict[str, Any]] | None = None
+
+  @property
+  def materials(self) -> Dict[str, Dict[str, Any]]:
+    """Shared object material table, keyed by UUID."""
+    if self._materials is None:
+      start, end = self._material_range
+      self._materials = {m["uuid"]: m for m in loads(self._mm[start:end])}
+    return self._materials
+
+  def names(self) -> List[str]:
+    return list(self.index)
+
+  def raw(self, name: str) -> bytes:
+    """The stored JSON of `name` (materials as UUIDs)."""
+    entry = self.index[name]
+    return self._mm[entry["offset"]:entry["offset"] + entry["length"]]
+
+  def read(self, name: str) -> Dict[str, Any]:
+    """The object `name` exactly as `convert()` produced it."""
+    data = loads(self.raw(name))
+    if "materials" in data:
+      table = self.materials
+      data["materials"] = [table[uuid] for uuid in data["materials"]]
+    return data
+
+  def close(self) -> None:
+    self._mm.close()
+
+  def __contains__(self, name: object) -> bool:
+    return name in self.index
+
+  def __iter__(self) -> Iterator[str]:
+    return iter(self.index)
+
+  def __len__(self) -> int:
+    return len(self.index)
+
+  def __enter__(self) -> BundleReader:
+    return self
+
+  def __exit__(self, *exc: Any) -> None:
+    self.close()
+
+
+def read_bundle(path: str | Path, name: str) -> Dict[str, Any]:
+  """Read a single object from the bundle at `path`."""
+  with BundleReader(path) as bundle:
+    return bundle.read(name)
+
+###############################################################################
+# CLI                                                                         #
+###############################################################################
+
+def _pack(ns: argparse.Namespace) -> int:
+  from batch import collect_outputs
+  from cache import ConversionCache, cached_convert
+  cache = None if ns.no_cache else ConversionCache()
+  failed = 0
+  with BundleWriter(ns.bundle) as bundle:
+    for src, name in collect_outputs(ns.input).items():
+      try:
+        if src.suffix == ".json":
+          data = loads(src.read_bytes())
+        else:
+          data, _ = cached_convert(src.read_text(encoding="utf-8"), cache, name=src.stem, up_axis=ns.up)
+          if ns.precision is not None:
+            quantize(data, ns.precision)
+        bundle.add(data, name=name if "/" in name else None)  # a/Chair vs b/Chair
+      except (Exception, SystemExit) as exc:  # scripts may call sys.exit()
+        failed += 1
+        print(f"  FAIL  {src}: {type(exc).__name__}: {exc}", file=sys.stderr)
+        continue
+      print(f"  ok    {src} -> {name if '/' in name else data.get('name', '')} "
+            f"({primitive_count(data)} primitives)")
+  print(f"{ns.bundle}: {len(bundle)} objects, {bundle.materials} materials "
+        f"({bundle.material_refs} before deduplication)")
+  return 1 if failed else 0
+
+
+def _list(ns: argparse.Namespace) -> int:
+  with BundleReader(ns.bundle) as bundle:
+    print(f"{'name':<32} {'primitives':>10} {'bytes':>10}")
+    for e in bundle.index.values():
+      print(f"{e['name']:<32} {e['primitives']:>10} {e['length']:>10}")
+    print(f"{len(bundle)} objects, {len(bundle.materials)} shared materials")
+  return 0
+
+
+def _extract(ns: argparse.Namespace) -> int:
+  with BundleReader(ns.bundle) as bundle:
+    names = bundle.names() if ns.all else ns.names
+    missing = [n for n in names if n not in bundle]
+    if missing:
+      print(f"Not in {ns.bundle}: {', '.join(missing)}", file=sys.stderr)
+      return 1
+    if not ns.output and not ns.out_dir and len(names) == 1:
+      sys.stdout.buffer.write(encode_json(bundle.read(names[0]), compact=ns.compact) + b"\n")
+      return 0
+    if ns.output:
+      if len(names) != 1:
+        print("-o/--output takes a single object; use --out-dir", file=sys.stderr)
+        return 1
+      targets = {names[0]: Path(ns.output)}
+    else:
+      out_dir = Path(ns.out_dir or ".")
+      out_dir.mkdir(parents=True, exist_ok=True)
+      targets = {n: out_dir / f"{n}.json" for n in names}
+    for name, path in targets.items():
+      path.parent.mkdir(parents=True, exist_ok=True)  # `a/Chair` from a nested batch
+      with atomic_writer(path, "wb") as fh:
+        dump(bundle.read(name), fh, compact=ns.compact)
+      print(f"  {name} -> {path}")
+  return 0
+
+
+def main(argv: List[str] | None = None) -> int:
+  parser = argparse.ArgumentParser(description="cad2qryleth .qryp bundle tools")
+  sub = parser.add_subparsers(dest="cmd", required=True)
+  pack = sub.add_parser("pack", help="Convert scripts (or read *.json outputs) into a bundle")
+  pack.add_argument("bundle", help="Bundle file to write")
+  pack.add_argument("input", nargs="+", help="Scripts, directories, globs or converted *.json files")
+  pack.add_argument("--up", choices=["y", "z"], default="y", help="Target up-axis for scripts (default: y)")
+  pack.add_argument("--precision", type=int, metavar="N", help="Round converted scripts to N decimals")
+  pack.add_argument("--no-cache", action="store_true", help="Bypass the conversion cache")
+  lst = sub.add_parser("list", help="List the objects of a bundle")
+  lst.add_argument("bundle")
+  ext = sub.add_parser("extract", help="Write objects of a bundle as JSON")
+  ext.add_argument("bundle")
+  ext.add_argument("names", nargs="*", help="Object names")
+  ext.add_argument("--all", action="store_true", help="Extract every object")
+  ext.add_argument("-o", "--output", help="Output file for a single object (stdout if omitted)")
+  ext.add_argument("--out-dir", help="Directory for <name>.json files")
+  ext.add_argument("--compact", action="store_true", help="Write JSON without indentation")
+  ns = parser.parse_args(argv)
+
+  if ns.cmd == "pack":
+    return _pack(ns)
+  if ns.cmd == "list":
+    return _list(ns)
+  if not ns.names and not ns.all:
+    parser.error("extract needs object names or --all")
+  return _extract(ns)
+
+
+if __name__ == "__main__":
+  sys.exit(main())
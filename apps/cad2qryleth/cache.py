@@ -0,0 +1,141 @@
+"""
+Content-addressed conversion cache
+==================================
+Sits in front of `converter.convert()`: a conversion is keyed on the script
+bytes, every conversion option (`name`, `up_axis`, ...) and a fingerprint of
+the converter source itself, so editing the converter invalidates old
+entries automatically.  A hit returns the stored JSON without executing the
+script.
+
+Entries live as `<key>.json` files under `.cache/` next to this module.  The
+directory is bounded by size; the least recently used entries (by mtime,
+refreshed on every hit) are evicted first, down to 7/8 of the bound.  Each
+cache object keeps a running total of the directory size and only rescans
+it when that total crosses the bound or after `max_bytes / 8` of its own
+writes (other processes may be writing too), so a `put` is not a directory
+listing.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+from converter import ConversionStats, atomic_writer, convert, dump, loads
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().with_name(".cache")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Files whose contents take part in the converter fingerprint.
+_FINGERPRINT_SOURCES = ("converter.py", "evaluator.py", "global_materials.json")
+
+
+def converter_fingerprint() -> str:
+  """Short hash of the converter sources; changes whenever the code does."""
+  h = hashlib.sha256()
+  here = Path(__file__).resolve().parent
+  for name in _FINGERPRINT_SOURCES:
+    h.update(name.encode())
+    h.update((here / name).read_bytes())
+  return h.hexdigest()[:16]
+
+
+class ConversionCache:
+  """Size-bounded on-disk LRU cache of conversion results."""
+
+  def __init__(self, root: str | Path = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+    self.root = Path(root)
+    self.max_bytes = max_bytes
+    self._fingerprint = converter_fingerprint()
+    self._size: int | None = None  # bytes under `root` at the last scan
+    self._unscanned = 0  # bytes written by this object since then
+
+  # ------------------------------------------------------------------
+  def key(self, src: str, **options: Any) -> str:
+    payload = json.dumps({
+      "converter": self._fingerprint,
+      "source": hashlib.sha256(src.encode("utf-8")).hexdigest(),
+      "options": options,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+  def _path(self, key: str) -> Path:
+    return self.root / f"{key}.json"
+
+  # ------------------------------------------------------------------
+  def get(self, key: str) -> Dict[str, Any] | None:
+    path = self._path(key)
+    try:
+      data = loads(path.read_bytes())
+    except (OSError, ValueError):
+      return None
+    try:
+      os.utime(path)  # mark as recently used
+    except OSError:
+      pass
+    return data
+
+  def put(self, key: str, data: Dict[str, Any]) -> None:
+    self.root.mkdir(parents=True, exist_ok=True)
+    with atomic_writer(self._path(key), "wb") as fh:
+      dump(data, fh, compact=True)
+      self._unscanned += fh.tell()
+    if (self._size is None or self._size + self._unscanned > self.max_bytes
+        or self._unscanned > self.max_bytes // 8):
+      self._evict()
+
+  def clear(self) -> int:
+    """Remove every entry; returns the number of files deleted."""
+    removed = 0
+    for path in self.root.glob("*.json"):
+      path.unlink(missing_ok=True)
+      removed += 1
+    self._size, self._unscanned = 0, 0
+    return removed
+
+  # ------------------------------------------------------------------
+  def _evict(self) -> None:
+    """Rescan the directory; past `max_bytes`, drop the oldest entries down
+    to 7/8 of it so that the next rescan is `max_bytes / 8` of writes away."""
+    entries = []
+    total = 0
+    for path in self.root.glob("*.json"):
+      try:
+        st = path.stat()
+      except FileNotFoundError:  # evicted concurrently by another worker
+        continue
+      entries.append((st.st_mtime, st.st_size, path))
+      total += st.st_size
+    entries.sort()
+    target = self.max_bytes if total <= self.max_bytes else self.max_bytes - self.max_bytes // 8
+    for _, size, path in entries:
+      if total <= target:
+        break
+      path.unlink(missing_ok=True)
+      total -= size
+    self._size, self._unscanned = total, 0
+
+
+def cached_convert(src: str, cache: ConversionCache | None, *, stats: ConversionStats | None = None,
+                   **options: Any) -> Tuple[Dict[str, Any], bool]:
+  """`convert(src, **options)` through `cache`; returns `(data, hit)`.
+
+  With `cache=None` this is a plain conversion.  `stats` also records the
+  cache lookup (`cache` phase, `cacheHits`/`cacheMisses`).
+  """
+  if cache is None:
+    return convert(src, stats=stats, **options), False
+  phase = stats.phase if stats is not None else lambda name: nullcontext()
+  key = cache.key(src, **options)
+  with phase("cache"):
+    data = cache.get(key)
+  if stats is not None:
+    stats.count("cacheHits" if data is not None else "cacheMisses")
+  if data is not None:
+    return data, True
+  data = convert(src, stats=stats, **options)
+  with phase("cache"):
+    cache.put(key, data)
+  return data, False
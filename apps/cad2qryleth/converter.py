@@ -11,6 +11,7 @@ Quick start
 -----------
 ```bash
 python cad_to_three_json.py Logo.py -o logo.json --name Logo
+python converter.py input/ -j 8            # batch: whole folder → output/
 ```
 
 Highlights
@@ -21,15 +22,74 @@ Highlights
   `primitive_cone_add`) so `import bpy` works.
 * Axis swap Z‑up → Y‑up (disable with `--up z`).
 * Cylinders are exported with `openEnded=true` to mimic Blender wireframe.
+* Batch mode (directories / globs) converts across a process pool; see
+  `batch.py`.
+* `--format binary` writes the typed-array friendly `.qryb` layout
+  (`binary.py`).
+* `--bundle PATH` packs a batch into one `.qryp` file with a shared
+  material table and a random-access index (`bundle.py`).
+* `--cull` drops primitives fully buried inside opaque ones.
+* `--merge-boxes` merges touching same-material axis-aligned boxes
+  (greedy meshing) and reports the draw calls saved.
+* `--lod low|medium|high` sizes cylinder/cone/torus segment counts to each
+  primitive's share of the object; `--lod-levels N` adds coarser levels.
+* `--arrays` stores loop-generated instance transforms as linear, grid
+  and radial array descriptors.
+* `--mirror` finds the dominant symmetry plane and emits one half plus
+  mirror references.
+* `--cost` estimates triangles, vertices and draw calls; `--budget N`
+  lowers segment counts and drops tiny primitives until the object fits.
+* `--bvh` adds root bounds, a bounding sphere and a flattened BVH.
+* Centring uses exact, rotation-aware bounds; `--prim-bounds` emits them
+  per primitive.
+* `--precision N` rounds float noise away and `--compact` drops
+  indentation; the size change is reported per file.
+* JSON goes straight to the output file through `orjson` when it is
+  installed (identical bytes to the stdlib encoder); `--json-backend`
+  picks the encoder.
+* `--sandbox` runs the script in a worker process with CPU/memory limits
+  (`sandbox.py`); `--max-prims N` caps runaway generators.  Straight-line
+  scripts skip the worker: they are evaluated from their AST without
+  `exec`, in-process under the evaluator's own step and CPU budgets
+  (`evaluator.py`).
+* `--stream ndjson|json` writes primitives incrementally with flat memory
+  (two passes over the script: bounds first, then output).
+* `--watch` re-converts scripts as they are saved (`watch.py`); outputs are
+  always written atomically.
+* `server.py` keeps warm workers behind a localhost HTTP endpoint;
+  `--server URL` sends the conversion there.
+* `--stats` / `--stats-file` report per-phase timings and counters
+  (`ConversionStats`; JSON or a Prometheus textfile).
+* Results are cached on disk by script content and options (`cache.py`);
+  `--no-cache` / `--clear-cache` control it.
 """
 from __future__ import annotations
 import types
 import math
 import json
+import operator
+import os
+import random
 import sys
+import tempfile
 import argparse
+import functools
+import hashlib
+import re
+import time
+from contextlib import contextmanager, nullcontext
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, TextIO, Tuple
+
+try:  # optional: vectorised primitive store for very large scripts
+  import numpy as np
+except ImportError:
+  np = None
+
+try:  # optional: several times faster JSON encoding/decoding
+  import orjson
+except ImportError:
+  orjson = None
 
 ###############################################################################
 # Sandbox & capture                                                           #
@@ -37,11 +97,50 @@ from typing import Any, Dict, List, Tuple
 
 _PRIMITIVES = ("cylinder", "uv_sphere", "sphere", "cube", "torus", "cone", "plane")
 
+class SandboxError(RuntimeError):
+  """Script execution failed outside the script's own code (see `sandbox.py`)."""
+
+  def to_dict(self) -> Dict[str, Any]:
+    return {"type": type(self).__name__, "message": str(self)}
+
+class ScriptError(SandboxError):
+  """The script raised; the message is `"<ExceptionType>: <message>"`."""
+
+class ScriptLimitError(SandboxError):
+  """The script breached a resource limit.
+
+  `limit` is one of `"cpu_time"` (s), `"wall_time"` (s), `"memory"` (MiB)
+  or `"primitives"`; `value` is the configured limit and `primitives` the
+  number captured before the script was stopped.
+  """
+
+  def __init__(self, limit: str, value: Any, primitives: int = 0) -> None:
+    super().__init__(f"script exceeded the {limit} limit ({value})")
+    self.limit, self.value, self.primitives = limit, value, primitives
+
+  def to_dict(self) -> Dict[str, Any]:
+    return {**super().to_dict(), "limit": self.limit, "value": self.value,
+            "primitives": self.primitives}
+
 class _CaptureContext:
-  """Captures all `bpy.ops.mesh.primitive_*_add` calls at runtime."""
+  """Captures all `bpy.ops.mesh.primitive_*_add` calls at runtime.
 
-  def __init__(self) -> None:
+  By default records are collected in `primitives`.  With `on_primitive`
+  each record is handed to the callback instead and not retained; since
+  scripts rename/scale/materialise an object *after* adding it, a record is
+  delivered when the next primitive is added (or the script ends).
+
+  Adding more than `max_primitives` primitives raises `ScriptLimitError`
+  (also after the script ends, should it swallow the exception).
+  """
+
+  def __init__(self, on_primitive: Callable[[Dict[str, Any]], None] | None = None,
+               max_primitives: int | None = None) -> None:
     self.primitives: List[Dict[str, Any]] = []
+    self._on_primitive = on_primitive
+    self._pending: Dict[str, Any] | None = None
+    self._max_primitives = max_primitives
+    self._count = 0
 
     # ------------------------------------------------------------------
     # create stub `bpy` module
@@ -84,19 +183,98 @@ class _CaptureContext:
   # ------------------------------------------------------------------
   def _make_stub(self, prim_key: str):
     def _stub(**kwargs):
+      self._count += 1
+      if self._max_primitives is not None and self._count > self._max_primitives:
+        raise ScriptLimitError("primitives", self._max_primitives, self._count - 1)
       kwargs.setdefault("location", (0.0, 0.0, 0.0))
       kwargs.setdefault("rotation", (0.0, 0.0, 0.0))
       # create dummy object so script may rename/materialise it
       obj = types.SimpleNamespace(name="", data=types.SimpleNamespace(materials=[]), scale=[1.0, 1.0, 1.0], rotation_euler=[0.0, 0.0, 0.0])
       self.bpy.context.object = obj
-      self.primitives.append({"__prim": prim_key, "__obj": obj, **kwargs})
+      rec = {"__prim": prim_key, "__obj": obj, **kwargs}
+      if self._on_primitive is None:
+        self.primitives.append(rec)
+      else:
+        self._flush()
+        self._pending = rec
     return _stub
 
+  def _flush(self) -> None:
+    if self._pending is not None:
+      rec, self._pending = self._pending, None
+      self._on_primitive(rec)
+
   # ------------------------------------------------------------------
   def run(self, source: str) -> List[Dict[str, Any]]:
     exec(source, {"bpy": self.bpy, "math": math})
+    return self.finish()
+
+  def finish(self) -> List[Dict[str, Any]]:
+    """Complete a run: enforce the primitive limit, deliver the last record."""
+    if self._max_primitives is not None and self._count > self._max_primitives:
+      raise ScriptLimitError("primitives", self._max_primitives, self._max_primitives)
+    if self._on_primitive is not None:
+      self._flush()
     return self.primitives
 
+def _capture(src: str, on_primitive: Callable[[Dict[str, Any]], None] | None = None, *,
+             static_eval: bool | None = None, sandbox: bool = False, cpu_limit: float | None = 30.0,
+             memory_limit: int | None = 1024, max_primitives: int | None = None,
+             stats: ConversionStats | None = None) -> List[Dict[str, Any]]:
+  """Run `src` and capture its primitives.
+
+  With `static_eval` the script is first interpreted from its AST
+  (`evaluator.py`), in-process and within the evaluator's own step and CPU
+  budgets, which needs neither `exec` nor a worker process.  Only if that
+  meets something it cannot evaluate, runs out of budget or the script
+  fails does the script run through `exec` — in-process
+  (`_CaptureContext`) or, with `sandbox=True`, in a resource-limited worker
+  process (`sandbox.run_sandboxed`).  `static_eval=None` means "with the
+  sandbox only": in-process, plain `exec` is faster and no less safe.
+
+  Returns the captured records, or `[]` when `on_primitive` consumes them.
+  `cpu_limit` (s) and `memory_limit` (MiB) only apply to the sandbox.  The
+  path that produced the records is noted in `stats.info["capture"]`.
+  """
+  if static_eval is None:
+    static_eval = sandbox
+  if static_eval:
+    from evaluator import evaluate
+    delivered = 0
+    def deliver(rec: Dict[str, Any]) -> None:
+      nonlocal delivered
+      delivered += 1
+      on_primitive(rec)
+    ctx = _CaptureContext(deliver if on_primitive else None, max_primitives=max_primitives)
+    try:
+      evaluate(src, ctx.bpy)
+      if stats is not None:
+        stats.info["capture"] = "static"
+      return ctx.finish()
+    except ScriptLimitError:
+      raise
+    except Exception:
+      pass
+    if delivered:
+      # the exec run repeats the records already handed out; skip them
+      consumer, skip = on_primitive, delivered
+      def on_primitive(rec: Dict[str, Any]) -> None:
+        nonlocal skip
+        if skip:
+          skip -= 1
+        else:
+          consumer(rec)
+
+  if stats is not None:
+    stats.info["capture"] = "sandbox" if sandbox else "exec"
+  if not sandbox:
+    return _CaptureContext(on_primitive, max_primitives=max_primitives).run(src)
+  from sandbox import run_sandboxed
+  recs: List[Dict[str, Any]] = []
+  run_sandboxed(src, on_primitive or recs.append, cpu_limit=cpu_limit,
+                memory_limit=memory_limit, max_primitives=max_primitives)
+  return recs
+
 ###############################################################################
 # Conversion helpers                                                          #
 ###############################################################################
@@ -116,63 +294,127 @@ def _get_object_color(obj) -> tuple[str, float] | None:
     return _rgb_to_hex(r, g, b), a
   return None
 
-# Global material mappings - UUID constants should match the ones in globalMaterials.ts
-GLOBAL_MATERIAL_MAPPINGS = {
-  "#8B4513": "global-material-wood-001",    # Дерево (коричневый)
-  "#7D7D7D": "global-material-metal-001",   # Металл (серый металлик)
-  "#654321": "global-material-earth-001",   # Земля (темно-коричневый)
-  "#708090": "global-material-stone-001",   # Камень (серый камень)
-  "#FFFFFF": "global-material-plastic-001", # Пластик (белый) - более подходящий для белого цвета
-  "#FFD700": "global-material-gold-001",    # Золото
-  "#B87333": "global-material-copper-001",  # Медь
-  "#2F2F2F": "global-material-rubber-001",  # Резина (темно-серая)
-  "#F5F5DC": "global-material-ceramic-001", # Керамика (бежевый)
-}
+# Global materials are generated from the front end's globalMaterials.ts by
+# sync_materials.py; the JSON is the converter's only copy of that table.
+GLOBAL_MATERIALS_FILE = Path(__file__).resolve().with_name("global_materials.json")
 
-def _color_distance(color1: str, color2: str) -> float:
-  """Calculate RGB distance between two hex colors."""
-  def hex_to_rgb(hex_color):
-    hex_color = hex_color.lstrip('#')
-    return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-  
-  rgb1 = hex_to_rgb(color1)
-  rgb2 = hex_to_rgb(color2)
-  
-  # Simple Euclidean distance in RGB space
-  return sum((a - b) ** 2 for a, b in zip(rgb1, rgb2)) ** 0.5
+# CIE76 colour difference (ΔE) under which a colour snaps to a global material
+GLOBAL_MATERIAL_MAX_DELTA_E = 8.0
+
+@functools.lru_cache(maxsize=None)
+def _global_materials() -> Tuple[Dict[str, Any], ...]:
+  data = json.loads(GLOBAL_MATERIALS_FILE.read_text(encoding="utf-8"))
+  return tuple(data["materials"])
+
+@functools.lru_cache(maxsize=None)
+def _transparent_global_materials() -> frozenset:
+  return frozenset(m["uuid"] for m in _global_materials()
+                   if m.get("transparent") or m.get("opacity", 1) < 1)
+
+def _hex_to_lab(color_hex: str) -> Tuple[float, float, float]:
+  """sRGB hex colour → CIELAB (D65 white point)."""
+  h = color_hex.lstrip("#")
+  rgb = []
+  for i in (0, 2, 4):
+    c = int(h[i:i+2], 16) / 255
+    rgb.append(c / 12.92 if c <= 0.04045 else ((c + 0.055) / 1.055) ** 2.4)
+  r, g, b = rgb
+  xyz = (
+    (0.4124564*r + 0.3575761*g + 0.1804375*b) / 0.95047,
+    (0.2126729*r + 0.7151522*g + 0.0721750*b) / 1.00000,
+    (0.0193339*r + 0.1191920*g + 0.9503041*b) / 1.08883,
+  )
+  fx, fy, fz = (t ** (1/3) if t > 216/24389 else (24389/27 * t + 16) / 116 for t in xyz)
+  return 116*fy - 16, 500*(fx - fy), 200*(fy - fz)
+
+class _PaletteIndex:
+  """Global material colours on a CIELAB grid whose cell equals the match
+  radius, so a lookup only visits the 27 cells around the query colour
+  however large the palette grows."""
+
+  def __init__(self, materials, radius: float) -> None:
+    self.radius = radius
+    self.cells: Dict[tuple, List[Tuple[int, tuple, str]]] = {}
+    for order, m in enumerate(materials):
+      lab = _hex_to_lab(m["color"])
+      self.cells.setdefault(self._cell(lab), []).append((order, lab, m["uuid"]))
 
+  def _cell(self, lab) -> tuple:
+    return tuple(math.floor(v / self.radius) for v in lab)
+
+  def nearest(self, color_hex: str) -> str | None:
+    """UUID of the closest colour within `radius` (earliest entry on ties)."""
+    lab = _hex_to_lab(color_hex)
+    cx, cy, cz = self._cell(lab)
+    best = None
+    for dx in (-1, 0, 1):
+      for dy in (-1, 0, 1):
+        for dz in (-1, 0, 1):
+          for order, other, uuid in self.cells.get((cx+dx, cy+dy, cz+dz), ()):
+            key = (math.dist(lab, other), order)
+            if key[0] < self.radius and (best is None or key < best[0]):
+              best = (key, uuid)
+    return best[1] if best else None
+
+@functools.lru_cache(maxsize=None)
+def _palette_index() -> _PaletteIndex:
+  # transparent materials (glass) are never picked by colour alone
+  opaque = [m for m in _global_materials() if m["uuid"] not in _transparent_global_materials()]
+  return _PaletteIndex(opaque, GLOBAL_MATERIAL_MAX_DELTA_E)
+
+@functools.lru_cache(maxsize=None)
 def _find_matching_global_material(color_hex: str) -> str | None:
-  """Find matching global material UUID for a given color."""
+  """Find matching global material UUID for a given color (memoized)."""
   if not color_hex:
     return None
-  
-  color_upper = color_hex.upper()
-  
-  # Exact match first
-  if color_upper in GLOBAL_MATERIAL_MAPPINGS:
-    return GLOBAL_MATERIAL_MAPPINGS[color_upper]
-  
-  # Find closest color match within tolerance (RGB distance < 20)
-  closest_color = None
-  min_distance = float('inf')
-  
-  for global_color, uuid in GLOBAL_MATERIAL_MAPPINGS.items():
-    distance = _color_distance(color_upper, global_color)
-    if distance < min_distance:
-      min_distance = distance
-      closest_color = uuid
-  
-  # Return closest match if within reasonable tolerance
-  if min_distance < 20:  # Adjust tolerance as needed
-    return closest_color
-  
-  return None
+  return _palette_index().nearest(color_hex)
+
+class _MaterialRegistry:
+  """Object materials of one conversion, deduplicated through a dict keyed
+  on each material's canonical JSON.
+
+  UUIDs are derived from that fingerprint, so converting the same script
+  twice yields byte-identical output.  `materials` keeps first-use order.
+  With `stats`, material matching is timed as its `materials` phase.
+  """
+
+  def __init__(self, stats: ConversionStats | None = None) -> None:
+    self.stats = stats
+    self.materials: List[Dict[str, Any]] = []
+    self._uuids: Dict[str, str] = {}
+    self._aliases: Dict[Any, str] = {}
+
+  def lookup(self, alias: Any) -> str | None:
+    """UUID previously registered under `alias`, if any."""
+    return self._aliases.get(alias)
+
+  def add(self, material: Dict[str, Any], alias: Any = None) -> str:
+    """Register `material` (without `uuid`) and return its UUID.
+
+    `alias` is a cheap key that fully determines `material`; repeated
+    primitives then skip building and serialising it (see `lookup`).
+    """
+    key = json.dumps(material, sort_keys=True, separators=(",", ":"))
+    uuid = self._uuids.get(key)
+    if uuid is None:
+      uuid = f"object-material-{hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]}"
+      self._uuids[key] = uuid
+      self.materials.append({**material, "uuid": uuid})
+    if alias is not None:
+      self._aliases[alias] = uuid
+    return uuid
 
-def _get_material_data(obj, object_materials: list) -> dict:
+def _get_material_data(obj, registry: _MaterialRegistry) -> dict:
   """
   Extract material data from object and determine material references.
   Returns dict with material info for the primitive.
   """
+  if registry.stats is not None:
+    with registry.stats.phase("materials"):
+      return _material_data(obj, registry)
+  return _material_data(obj, registry)
+
+def _material_data(obj, registry: _MaterialRegistry) -> dict:
   color_data = _get_object_color(obj)
   if not color_data:
     return {}
@@ -183,6 +425,10 @@ def _get_material_data(obj, object_materials: list) -> dict:
   global_material_uuid = _find_matching_global_material(color)
   if global_material_uuid:
     return {"globalMaterialUuid": global_material_uuid}
+
+  uuid = registry.lookup((color, alpha))
+  if uuid is not None:
+    return {"objectMaterialUuid": uuid}
   
   # Create object-level material for custom colors
   material_name = f"Material_{color[1:]}"  # Remove # from hex
@@ -203,24 +449,7 @@ def _get_material_data(obj, object_materials: list) -> dict:
     "isGlobal": False,
     "description": f"Auto-generated material from CAD import with color {color} and opacity {alpha}"
   }
-  
-  # Check if this material already exists in object materials
-  existing_material = None
-  for mat in object_materials:
-    if mat.get("name") == material_name:
-      existing_material = mat
-      break
-  
-  if not existing_material:
-    # Generate UUID for new material (simplified UUID generation)
-    import time
-    import random
-    material_uuid = f"object-material-{int(time.time())}-{random.randint(1000, 9999)}"
-    object_material["uuid"] = material_uuid
-    object_materials.append(object_material)
-    return {"objectMaterialUuid": material_uuid}
-  else:
-    return {"objectMaterialUuid": existing_material["uuid"]}
+  return {"objectMaterialUuid": registry.add(object_material, alias=(color, alpha))}
 
 def _create_object_materials_list(primitives_data: list) -> list:
   """Extract all unique object materials from primitives data."""
@@ -231,132 +460,90 @@ def _create_object_materials_list(primitives_data: list) -> list:
       del prim_data["temp_material"]  # Clean up temporary data
   return materials
 
-def _prim_to_schema(rec: Dict[str, Any], object_materials: list) -> Dict[str, Any]:
-  kind = rec["__prim"]
-  loc  = list(rec["location"])
-  rot  = list(rec["rotation"])
-  scale = rec["__obj"].scale
-  color_data = _get_object_color(rec["__obj"])
-  color = color_data[0] if color_data else None
-
-  # Common structure for new format
-  result = {
-    "type": "",
-    "name": rec["__obj"].name or "",
-    "geometry": {},
-    "transform": {
-      "position": loc,
-      "rotation": rot,
-    }
-  }
+# Geometry keys per exported type.  The second item selects the scale factor
+# applied to the raw Blender parameter: 0/1/2 = scale x/y/z, 3 = max(x, y),
+# 4 = max(x, y, z).
+_GEOMETRY_LAYOUT: Dict[str, Tuple[Tuple[str, int], ...]] = {
+  "sphere":   (("radius", 4),),
+  "cylinder": (("radiusTop", 3), ("radiusBottom", 3), ("height", 2)),
+  "box":      (("width", 0), ("height", 2), ("depth", 1)),
+  "torus":    (("majorRadius", 3), ("minorRadius", 3)),
+  "cone":     (("radius", 3), ("height", 2)),  # Note: using radius instead of radiusTop/radiusBottom for cone
+  "plane":    (("width", 0), ("height", 1)),
+}
 
-  # Add material data using new system
-  material_data = _get_material_data(rec["__obj"], object_materials)
-  result.update(material_data)
+def _raw_geometry(rec: Dict[str, Any]) -> Tuple[str, Tuple[float, ...]]:
+  """Exported type and unscaled geometry parameters of a capture record."""
+  kind = rec["__prim"]
 
   if kind in ("sphere", "uv_sphere"):
-    result["type"] = "sphere"
-    result["name"] = result["name"] or "sphere"
-    result["geometry"] = {
-      "radius": float(rec.get("radius", 1)) * max(scale),
-    }
-    return result
+    return "sphere", (float(rec.get("radius", 1)),)
 
   if kind == "cylinder":
     r = float(rec.get("radius", 1))
     h = float(rec.get("depth", 1))
-    result["type"] = "cylinder"
-    result["name"] = result["name"] or "cylinder"
-    result["geometry"] = {
-      "radiusTop": r * max(scale[0], scale[1]),
-      "radiusBottom": r * max(scale[0], scale[1]),
-      "height": h * scale[2],
-    }
-    return result
+    return "cylinder", (r, r, h)
 
   if kind == "cube":
     s = float(rec.get("size", 1))
-    result["type"] = "box"
-    result["name"] = result["name"] or "box"
-    result["geometry"] = {
-      "width": s * scale[0],
-      "height": s * scale[2],
-      "depth": s * scale[1],
-    }
-    return result
+    return "box", (s, s, s)
 
   if kind == "torus":
-    result["type"] = "torus"
-    result["name"] = result["name"] or "torus"
-    result["geometry"] = {
-      "majorRadius": float(rec.get("major_radius", 1)) * max(scale[0], scale[1]),
-      "minorRadius": float(rec.get("minor_radius", 0.25)) * max(scale[0], scale[1]),
-    }
-    return result
+    return "torus", (float(rec.get("major_radius", 1)), float(rec.get("minor_radius", 0.25)))
 
   if kind == "cone":
     radius_bottom = float(rec.get("radius1", rec.get("radius", 1)))
-    radius_top    = float(rec.get("radius2", 0.0))  # cone tip – default 0
     height        = float(rec.get("depth", 1))
-    result["type"] = "cone"
-    result["name"] = result["name"] or "cone"
-    result["geometry"] = {
-      "radius": radius_bottom * max(scale[0], scale[1]),  # Note: using radius instead of radiusTop/radiusBottom for cone
-      "height": height * scale[2],
-    }
-    return result
+    return "cone", (radius_bottom, height)  # cone tip (radius2) is always 0
 
   if kind == "plane":
     s = float(rec.get("size", 2.0))  # Blender plane default size is 2.0
-    result["type"] = "plane"
-    result["name"] = result["name"] or "plane"
-    result["geometry"] = {
-      "width": s * scale[0],
-      "height": s * scale[1],
-    }
-    return result
+    return "plane", (s, s)
 
   raise ValueError(f"Unsupported primitive: {kind}")
 
-# ---------------------------------------------------------------------------
-# BBox utilities, centring, axis swap                                         #
-# ---------------------------------------------------------------------------
+def _scale_factors(scale) -> Tuple[float, ...]:
+  """Scale factors addressed by the indices in `_GEOMETRY_LAYOUT`."""
+  sx, sy, sz = scale
+  return (sx, sy, sz, max(sx, sy), max(sx, sy, sz))
 
-def _bbox(p: Dict[str, Any]):
-  x, y, z = p["transform"]["position"]
-  t = p["type"]
-  g = p["geometry"]
-  
-  if t == "sphere":
-    r = g["radius"]
-    return [x - r, y - r, z - r], [x + r, y + r, z + r]
-  if t == "cylinder":
-    r = max(g.get("radiusTop", 0), g.get("radiusBottom", 0))
-    h = g["height"] / 2
-    return [x - r, y - r, z - h], [x + r, y + r, z + h]
-  if t == "cone":
-    r = g["radius"]
-    h = g["height"] / 2
-    return [x - r, y - r, z - h], [x + r, y + r, z + h]
-  if t == "box":
-    w, h, d = g["width"]/2, g["height"]/2, g["depth"]/2
-    return [x - w, y - d, z - h], [x + w, y + d, z + h]
-  if t == "torus":
-    r = g["majorRadius"] + g["minorRadius"]
-    return [x - r, y - r, z - r], [x + r, y + r, z + r]
-  if t == "plane":
-    w, h = g["width"]/2, g["height"]/2
-    return [x - w, y - h, z], [x + w, y + h, z]  # plane has no depth
-  return [x-0.5]*3, [x+0.5]*3
+def _prim_to_schema(rec: Dict[str, Any], registry: _MaterialRegistry) -> Dict[str, Any]:
+  obj = rec["__obj"]
+
+  # Common structure for new format
+  result = {
+    "type": "",
+    "name": obj.name or "",
+    "geometry": {},
+    "transform": {
+      "position": [float(v) for v in rec["location"]],
+      "rotation": [float(v) for v in rec["rotation"]],
+    }
+  }
+
+  # Add material data using new system
+  material_data = _get_material_data(obj, registry)
+  result.update(material_data)
+
+  kind, raw = _raw_geometry(rec)
+  factors = _scale_factors(obj.scale)
+  result["type"] = kind
+  result["name"] = result["name"] or kind
+  result["geometry"] = {key: v * factors[f] for (key, f), v in zip(_GEOMETRY_LAYOUT[kind], raw)}
+  return result
 
+# ---------------------------------------------------------------------------
+# Centring, axis swap                                                         #
+# ---------------------------------------------------------------------------
 
-def _centre(prims: List[Dict[str, Any]]):
+def _centre(prims: List[Dict[str, Any]], up: str):
+  """Move the AABB centre of `prims` (in the `up` frame) to the origin."""
   if not prims:
     return
   lo = [float("inf")]*3
   hi = [float("-inf")]*3
   for p in prims:
-    bmin, bmax = _bbox(p)
+    bmin, bmax = _bbox(p, up)
     for i in range(3):
       lo[i] = min(lo[i], bmin[i])
       hi[i] = max(hi[i], bmax[i])
@@ -372,55 +559,1998 @@ def _z_to_y(prims: List[Dict[str, Any]]):
     rx,ry,rz = p["transform"]["rotation"]
     p["transform"]["rotation"] = [rx, rz, ry]
 
+# ---------------------------------------------------------------------------
+# Oriented shapes                                                             #
+# ---------------------------------------------------------------------------
+# Solids in the output frame.  Y-up output follows three.js conventions
+# (XYZ Euler = Rx·Ry·Rz; box width/height/depth on x/y/z; cylinder and cone
+# axis along y), Z-up output follows Blender (XYZ Euler = Rz·Ry·Rx; box depth
+# on y and height on z; axis along z).  Torus and plane lie in the local xy
+# plane in both.
+
+def _matmul(a, b):
+  return [[sum(a[i][k] * b[k][j] for k in range(3)) for j in range(3)] for i in range(3)]
+
+def _rotation_matrix(rotation, up: str):
+  rx, ry, rz = rotation
+  cx, sx = math.cos(rx), math.sin(rx)
+  cy, sy = math.cos(ry), math.sin(ry)
+  cz, sz = math.cos(rz), math.sin(rz)
+  mx = [[1, 0, 0], [0, cx, -sx], [0, sx, cx]]
+  my = [[cy, 0, sy], [0, 1, 0], [-sy, 0, cy]]
+  mz = [[cz, -sz, 0], [sz, cz, 0], [0, 0, 1]]
+  if up.lower() == "y":
+    return _matmul(_matmul(mx, my), mz)
+  return _matmul(_matmul(mz, my), mx)
+
+def _shape(p: Dict[str, Any], up: str) -> Tuple[str, tuple, Tuple[float, float, float]]:
+  """Local solid of `p`: `(kind, params, local half extents)`.
+
+  Kinds: `box` (hx, hy, hz), `sphere` (r,), `frustum` (axis, half height,
+  top radius, bottom radius), `torus` (R, r), `plane` (hx, hy).
+  """
+  t, g = p["type"], p["geometry"]
+  axis = 1 if up.lower() == "y" else 2
+  if t == "sphere":
+    r = g["radius"]
+    return "sphere", (r,), (r, r, r)
+  if t == "box":
+    hx, hy, hz = g["width"]/2, g["height"]/2, g["depth"]/2
+    he = (hx, hy, hz) if axis == 1 else (hx, hz, hy)
+    return "box", he, he
+  if t in ("cylinder", "cone"):
+    hh = g["height"]/2
+    rt, rb = (g["radiusTop"], g["radiusBottom"]) if t == "cylinder" else (0.0, g["radius"])
+    r = max(rt, rb)
+    he = [r, r, r]
+    he[axis] = hh
+    return "frustum", (axis, hh, rt, rb), tuple(he)
+  if t == "torus":
+    R, r = g["majorRadius"], g["minorRadius"]
+    return "torus", (R, r), (R + r, R + r, r)
+  if t == "plane":
+    return "plane", (g["width"]/2, g["height"]/2), (g["width"]/2, g["height"]/2, 0.0)
+  raise ValueError(f"Unsupported primitive: {t}")
+
+def _shape_volume(kind: str, params: tuple) -> float:
+  if kind == "box":
+    return 8 * params[0] * params[1] * params[2]
+  if kind == "sphere":
+    return 4 / 3 * math.pi * params[0] ** 3
+  if kind == "frustum":
+    _, hh, rt, rb = params
+    return math.pi * 2 * hh * (rt*rt + rt*rb + rb*rb) / 3
+  if kind == "torus":
+    return 2 * math.pi ** 2 * params[0] * params[1] ** 2
+  return 0.0
+
+def _obb_corners(c, m, he) -> List[List[float]]:
+  """World-space corners of the oriented box `c + m·(±he)`."""
+  corners = []
+  for sx in (-1, 1):
+    for sy in (-1, 1):
+      for sz in (-1, 1):
+        l = (sx * he[0], sy * he[1], sz * he[2])
+        corners.append([c[i] + m[i][0]*l[0] + m[i][1]*l[1] + m[i][2]*l[2] for i in range(3)])
+  return corners
+
+def _solid_contains(kind: str, params: tuple, c, m, point, pad: float) -> bool:
+  """True if the ball `(point, pad)` lies inside the convex solid at `c`/`m`."""
+  d = [point[i] - c[i] for i in range(3)]
+  q = [m[0][j]*d[0] + m[1][j]*d[1] + m[2][j]*d[2] for j in range(3)]  # world → local
+  if kind == "box":
+    return all(abs(q[i]) + pad <= params[i] for i in range(3))
+  if kind == "sphere":
+    return math.sqrt(q[0]**2 + q[1]**2 + q[2]**2) + pad <= params[0]
+  if kind == "frustum":
+    axis, hh, rt, rb = params
+    h = q[axis]
+    if abs(h) + pad > hh:
+      return False
+    radial = math.sqrt(sum(q[i]**2 for i in range(3) if i != axis))
+    def radius_at(y: float) -> float:
+      return rb + (rt - rb) * (y + hh) / (2 * hh) if hh > 0 else min(rt, rb)
+    return radial + pad <= min(radius_at(h - pad), radius_at(h + pad))
+  return False  # torus / plane never enclose anything
+
+def _bbox(p: Dict[str, Any], up: str) -> Tuple[List[float], List[float]]:
+  """Exact world AABB of `p` in the `up` frame, accounting for its rotation.
+
+  Boxes and planes project their oriented half extents; a cylinder or cone
+  is the hull of its two end discs, and a disc of radius `r` with unit
+  normal `u` spans `r·sqrt(1 - u_i²)` along world axis `i` (the torus is
+  its centre circle swept by the tube radius).  `_bounds_np` is the
+  vectorized twin.
+  """
+  kind, params, he = _shape(p, up)
+  c = p["transform"]["position"]
+  if kind == "sphere":
+    r = params[0]
+    return [c[i] - r for i in range(3)], [c[i] + r for i in range(3)]
+  m = _rotation_matrix(p["transform"]["rotation"], up)
+  lo, hi = [], []
+  for i in range(3):
+    if kind == "frustum":
+      axis, hh, rt, rb = params
+      u = m[i][axis]
+      s = math.sqrt(max(0.0, 1 - u*u))
+      lo.append(c[i] + min(hh*u - rt*s, -hh*u - rb*s))
+      hi.append(c[i] + max(hh*u + rt*s, -hh*u + rb*s))
+      continue
+    if kind == "torus":
+      n = m[i][2]
+      ext = params[0] * math.sqrt(max(0.0, 1 - n*n)) + params[1]
+    else:  # box, plane
+      ext = abs(m[i][0])*he[0] + abs(m[i][1])*he[1] + abs(m[i][2])*he[2]
+    lo.append(c[i] - ext)
+    hi.append(c[i] + ext)
+  return lo, hi
+
+def _primitive_bounds(prims: List[Dict[str, Any]], up: str) -> List[Tuple[List[float], List[float]]]:
+  """`_bbox` of every primitive, vectorized when numpy is available."""
+  if np is None or not prims:
+    return [_bbox(p, up) for p in prims]
+  codes = np.array([_TYPE_CODES[p["type"]] for p in prims], dtype=np.uint8)
+  geometry = np.zeros((len(prims), 3))
+  for i, p in enumerate(prims):
+    params = [p["geometry"][key] for key, _ in _GEOMETRY_LAYOUT[p["type"]]]
+    geometry[i, :len(params)] = params
+  lo, hi = _bounds_np(codes, np.array([p["transform"]["position"] for p in prims], dtype=float),
+                      np.array([p["transform"]["rotation"] for p in prims], dtype=float), geometry, up)
+  return list(zip(lo.tolist(), hi.tolist()))
+
+def _bounding_radius(p: Dict[str, Any], up: str) -> float:
+  """Radius of a sphere around `p`'s position enclosing the primitive."""
+  kind, params, he = _shape(p, up)
+  if kind == "sphere":
+    return params[0]
+  return math.sqrt(he[0]**2 + he[1]**2 + he[2]**2)
+
+# ---------------------------------------------------------------------------
+# Containment culling                                                         #
+# ---------------------------------------------------------------------------
+
+def _is_opaque(p: Dict[str, Any], materials_by_uuid: Dict[str, Dict[str, Any]]) -> bool:
+  if p.get("globalMaterialUuid") in _transparent_global_materials():
+    return False
+  mat = materials_by_uuid.get(p.get("objectMaterialUuid"))
+  if mat is not None:
+    props = mat.get("properties", {})
+    return not props.get("transparent") and props.get("opacity", 1) >= 1
+  return True
+
+def _cull_contained(prims: List[Dict[str, Any]], object_materials: list,
+                    up: str) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+  """Drop primitives fully enclosed by an opaque box/sphere/cylinder/cone.
+
+  Candidate enclosers come from a uniform grid over the primitives' AABBs,
+  so the pass stays near-linear for tens of thousands of primitives.  The
+  enclosed primitive is tested conservatively — spheres exactly, everything
+  else through the corners of its oriented box — so nothing visible is ever
+  removed.  Returns `(kept, removed)` where `removed` lists
+  `{"name", "type", "insideOf"}` records.
+  """
+  if len(prims) < 2:
+    return prims, []
+  materials_by_uuid = {m.get("uuid"): m for m in object_materials}
+
+  info = []
+  for p in prims:
+    kind, params, he = _shape(p, up)
+    c = p["transform"]["position"]
+    m = _rotation_matrix(p["transform"]["rotation"], up)
+    if kind == "sphere":
+      points, pad = [c], params[0]
+    else:
+      points, pad = _obb_corners(c, m, he), 0.0
+    lo, hi = _bbox(p, up)
+    info.append((kind, params, c, m, points, pad, lo, hi, _shape_volume(kind, params)))
+
+  sizes = sorted(max(hi[i] - lo[i] for i in range(3)) for *_, lo, hi, _ in info)
+  cell = max(sizes[len(sizes) // 2] * 2, 1e-9)
+  def cell_of(v):
+    return tuple(math.floor(x / cell) for x in v)
+
+  grid: Dict[tuple, List[int]] = {}
+  large: List[int] = []
+  for j, (kind, params, c, m, points, pad, lo, hi, vol) in enumerate(info):
+    if kind not in ("box", "sphere", "frustum") or vol <= 0 or not _is_opaque(prims[j], materials_by_uuid):
+      continue
+    a, b = cell_of(lo), cell_of(hi)
+    if (b[0]-a[0]+1) * (b[1]-a[1]+1) * (b[2]-a[2]+1) > 512:
+      large.append(j)
+      continue
+    for x in range(a[0], b[0] + 1):
+      for y in range(a[1], b[1] + 1):
+        for z in range(a[2], b[2] + 1):
+          grid.setdefault((x, y, z), []).append(j)
+
+  removed_at: Dict[int, int] = {}
+  for i, (_, _, _, _, points, pad, lo, hi, vol) in enumerate(info):
+    centre = [(lo[k] + hi[k]) / 2 for k in range(3)]
+    for j in grid.get(cell_of(centre), []) + large:
+      if j == i:
+        continue
+      okind, oparams, oc, om, _, _, olo, ohi, ovol = info[j]
+      # never let two identical primitives remove each other
+      if ovol < vol or (ovol == vol and j > i):
+        continue
+      if any(lo[k] < olo[k] or hi[k] > ohi[k] for k in range(3)):
+        continue
+      if all(_solid_contains(okind, oparams, oc, om, pt, pad) for pt in points):
+        removed_at[i] = j
+        break
+
+  kept = [p for i, p in enumerate(prims) if i not in removed_at]
+  removed = [{"name": prims[i]["name"], "type": prims[i]["type"], "insideOf": prims[j]["name"]}
+             for i, j in sorted(removed_at.items())]
+  return kept, removed
+
+# ---------------------------------------------------------------------------
+# Box merging                                                                 #
+# ---------------------------------------------------------------------------
+
+_AXIS_EPS = 1e-9  # rotation matrix entries this close to 0/±1 count as exact
+
+def _axis_aligned_extent(p: Dict[str, Any], up: str) -> Tuple[List[float], List[float]] | None:
+  """World AABB of box `p` if its rotation is a multiple of 90° per axis."""
+  _, _, he = _shape(p, up)
+  rotation = p["transform"]["rotation"]
+  if not any(rotation):  # the common case; same result as the matrix below
+    ext = he
+  else:
+    m = _rotation_matrix(rotation, up)
+    if any(min(abs(v), abs(abs(v) - 1)) > _AXIS_EPS for row in m for v in row):
+      return None
+    ext = [abs(m[i][0])*he[0] + abs(m[i][1])*he[1] + abs(m[i][2])*he[2] for i in range(3)]
+  c = p["transform"]["position"]
+  return [c[i] - ext[i] for i in range(3)], [c[i] + ext[i] for i in range(3)]
+
+def _merge_boxes(prims: List[Dict[str, Any]], object_materials: list, up: str,
+                 tolerance: float = 1e-6) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+  """Greedily merge touching or overlapping axis-aligned boxes.
+
+  Two opaque boxes with the same material merge when they span the same
+  interval on two axes (within `tolerance`) and touch or overlap on the
+  third, so the union is exactly the merged box and the silhouette does
+  not change.  Boxes rotated by multiples of 90° count as axis-aligned;
+  transparent ones never merge (their inner faces are visible).  Merging
+  sweeps the three axes until nothing changes, like greedy meshing.  The
+  merged box replaces the first of its parts.  Returns `(prims, merges)`
+  where `merges` lists `{"name", "parts"}` records.
+  """
+  materials_by_uuid = {m.get("uuid"): m for m in object_materials}
+  boxes: Dict[int, List[Any]] = {}  # index -> [lo, hi, parts]
+  for i, p in enumerate(prims):
+    if p["type"] != "box" or not _is_opaque(p, materials_by_uuid):
+      continue
+    extent = _axis_aligned_extent(p, up)
+    if extent is not None:
+      boxes[i] = [extent[0], extent[1], [i]]
+  if len(boxes) < 2:
+    return prims, []
+
+  def q(v: float) -> float:
+    return round(v / tolerance) if tolerance > 0 else v
+
+  changed = True
+  while changed:
+    changed = False
+    for axis in range(3):
+      a, b = (k for k in range(3) if k != axis)
+      groups: Dict[tuple, List[int]] = {}
+      for i, (lo, hi, _) in boxes.items():
+        key = (tuple(prims[i].get(k) for k in _MATERIAL_KEYS), q(lo[a]), q(hi[a]), q(lo[b]), q(hi[b]))
+        groups.setdefault(key, []).append(i)
+      for members in groups.values():
+        if len(members) < 2:
+          continue
+        members.sort(key=lambda i: boxes[i][0][axis])
+        keep = members[0]
+        for i in members[1:]:
+          lo, hi, parts = boxes[i]
+          if lo[axis] > boxes[keep][1][axis] + tolerance:
+            keep = i
+            continue
+          # the earlier primitive survives
+          if i < keep:
+            keep, i = i, keep
+            boxes[keep][0][axis] = min(boxes[keep][0][axis], boxes[i][0][axis])
+          boxes[keep][1][axis] = max(boxes[keep][1][axis], boxes[i][1][axis])
+          boxes[keep][2].extend(boxes.pop(i)[2])
+          changed = True
+
+  merges = []
+  dropped = set()
+  for i, (lo, hi, parts) in boxes.items():
+    if len(parts) < 2:
+      continue
+    parts.sort()
+    ext = [hi[k] - lo[k] for k in range(3)]
+    geometry = ({"width": ext[0], "height": ext[1], "depth": ext[2]} if up.lower() == "y"
+                else {"width": ext[0], "height": ext[2], "depth": ext[1]})
+    prims[i] = {**prims[i], "geometry": geometry,
+                "transform": {"position": [(lo[k] + hi[k]) / 2 for k in range(3)], "rotation": [0.0, 0.0, 0.0]}}
+    dropped.update(parts[1:])
+    merges.append({"name": prims[i]["name"], "parts": [prims[j]["name"] for j in parts]})
+  return [p for i, p in enumerate(prims) if i not in dropped], merges
+
+# ---------------------------------------------------------------------------
+# Bounding volume hierarchy                                                   #
+# ---------------------------------------------------------------------------
+
+_BVH_NODE_STRIDE = 8
+
+def _build_bvh(boxes: List[Tuple[List[float], List[float]]], leaf_size: int = 4) -> Dict[str, Any]:
+  """Median-split BVH over `boxes`, flattened depth-first.
+
+  Every node is `_BVH_NODE_STRIDE` numbers in `nodes`:
+  `minX, minY, minZ, maxX, maxY, maxZ, a, b`.  Leaves have `b > 0` and
+  reference `primIndices[a : a + b]`; inner nodes have `b == 0`, their left
+  child is the next node and `a` is the index of the right child.
+  """
+  nodes: List[List[float]] = []
+  order: List[int] = []
+  centre = [[(lo[k] + hi[k]) / 2 for k in range(3)] for lo, hi in boxes]
+
+  def build(items: List[int]) -> int:
+    idx = len(nodes)
+    nodes.append([])
+    lo = [min(boxes[i][0][k] for i in items) for k in range(3)]
+    hi = [max(boxes[i][1][k] for i in items) for k in range(3)]
+    if len(items) <= leaf_size:
+      nodes[idx] = lo + hi + [len(order), len(items)]
+      order.extend(items)
+      return idx
+    spread = [max(centre[i][k] for i in items) - min(centre[i][k] for i in items) for k in range(3)]
+    axis = spread.index(max(spread))
+    items = sorted(items, key=lambda i: centre[i][axis])
+    half = len(items) // 2
+    build(items[:half])
+    right = build(items[half:])
+    nodes[idx] = lo + hi + [right, 0]
+    return idx
+
+  if boxes:
+    build(list(range(len(boxes))))
+  return {
+    "nodeStride": _BVH_NODE_STRIDE,
+    "nodes": [v for node in nodes for v in node],
+    "primIndices": order,
+  }
+
+def _object_bounds(prims: List[Dict[str, Any]], boxes, up: str) -> Dict[str, Any]:
+  """Root AABB plus a bounding sphere centred on it."""
+  lo = [min(b[0][k] for b in boxes) for k in range(3)]
+  hi = [max(b[1][k] for b in boxes) for k in range(3)]
+  c = [(lo[k] + hi[k]) / 2 for k in range(3)]
+  radius = max(math.dist(c, p["transform"]["position"]) + _bounding_radius(p, up) for p in prims)
+  # the AABB's half diagonal is also an upper bound; keep the tighter one
+  radius = min(radius, math.dist(c, hi))
+  return {"min": lo, "max": hi, "sphere": {"center": c, "radius": radius}}
+
+# ---------------------------------------------------------------------------
+# Vectorized bounds (numpy)                                                   #
+# ---------------------------------------------------------------------------
+
+def _matmul_np(a, b):
+  # spelled out so the sums round exactly like `_matmul`
+  out = np.empty_like(a)
+  for i in range(3):
+    for j in range(3):
+      out[:, i, j] = a[:, i, 0]*b[:, 0, j] + a[:, i, 1]*b[:, 1, j] + a[:, i, 2]*b[:, 2, j]
+  return out
+
+def _rotation_matrices(rotation, up: str):
+  """`_rotation_matrix` for an `(N, 3)` array of Euler angles."""
+  n = len(rotation)
+  cos, sin = np.cos(rotation), np.sin(rotation)
+  mx, my, mz = (np.zeros((n, 3, 3)) for _ in range(3))
+  mx[:, 0, 0] = my[:, 1, 1] = mz[:, 2, 2] = 1
+  mx[:, 1, 1], mx[:, 1, 2], mx[:, 2, 1], mx[:, 2, 2] = cos[:, 0], -sin[:, 0], sin[:, 0], cos[:, 0]
+  my[:, 0, 0], my[:, 0, 2], my[:, 2, 0], my[:, 2, 2] = cos[:, 1], sin[:, 1], -sin[:, 1], cos[:, 1]
+  mz[:, 0, 0], mz[:, 0, 1], mz[:, 1, 0], mz[:, 1, 1] = cos[:, 2], -sin[:, 2], sin[:, 2], cos[:, 2]
+  if up.lower() == "y":
+    return _matmul_np(_matmul_np(mx, my), mz)
+  return _matmul_np(_matmul_np(mz, my), mx)
+
+def _bounds_np(type_code, position, rotation, geometry, up: str):
+  """Exact AABBs `(lo, hi)` of `(N, …)` primitive columns; mirrors `_bbox`."""
+  m = _rotation_matrices(rotation, up)
+  axis = 1 if up.lower() == "y" else 2
+  lo, hi = position.copy(), position.copy()
+  for code, t in enumerate(_TYPE_NAMES):
+    sel = type_code == code
+    if not sel.any():
+      continue
+    a, b, c = geometry[sel, 0, None], geometry[sel, 1, None], geometry[sel, 2, None]
+    ms = m[sel]
+    if t == "sphere":
+      lo[sel] -= a
+      hi[sel] += a
+      continue
+    if t in ("cylinder", "cone"):
+      rt, rb, hh = (a, b, c / 2) if t == "cylinder" else (0.0, a, b / 2)
+      u = ms[:, :, axis]
+      s = np.sqrt(np.maximum(0.0, 1 - u*u))
+      lo[sel] += np.minimum(hh*u - rt*s, -hh*u - rb*s)
+      hi[sel] += np.maximum(hh*u + rt*s, -hh*u + rb*s)
+      continue
+    if t == "torus":
+      n = ms[:, :, 2]
+      ext = a * np.sqrt(np.maximum(0.0, 1 - n*n)) + b
+    else:
+      if t == "box":
+        he = (a / 2, b / 2, c / 2) if axis == 1 else (a / 2, c / 2, b / 2)
+      else:  # plane
+        he = (a / 2, b / 2, 0.0)
+      am = np.abs(ms)
+      ext = am[:, :, 0]*he[0] + am[:, :, 1]*he[1] + am[:, :, 2]*he[2]
+    lo[sel] -= ext
+    hi[sel] += ext
+  return lo, hi
+
+# ---------------------------------------------------------------------------
+# Columnar store (numpy)                                                      #
+# ---------------------------------------------------------------------------
+
+_TYPE_NAMES = tuple(_GEOMETRY_LAYOUT)
+_TYPE_CODES = {t: i for i, t in enumerate(_TYPE_NAMES)}
+
+class _PrimitiveColumns:
+  """Column-oriented primitive store, used when numpy is installed.
+
+  Transforms, scale and geometry live in float64 arrays with one row per
+  primitive, so scaling, bounds, centring and the axis swap are single array
+  operations instead of per-primitive dict rebuilding.  Schema dicts are
+  only materialised by `to_schema()`.  Results are bit-identical to the
+  `_prim_to_schema` / `_z_to_y` / `_centre` path.
+  """
+
+  def __init__(self, recs: List[Dict[str, Any]], registry: _MaterialRegistry) -> None:
+    n = len(recs)
+    self.type_code = np.empty(n, dtype=np.uint8)
+    self.position = np.empty((n, 3))
+    self.rotation = np.empty((n, 3))
+    self.scale = np.empty((n, 3))
+    raw = np.zeros((n, 3))  # unscaled Blender parameters, padded with 0
+    self.names: List[str] = []
+    self.materials: List[Dict[str, Any]] = []
+    for i, rec in enumerate(recs):
+      obj = rec["__obj"]
+      self.materials.append(_get_material_data(obj, registry))
+      kind, params = _raw_geometry(rec)
+      self.type_code[i] = _TYPE_CODES[kind]
+      raw[i, :len(params)] = params
+      self.position[i] = rec["location"]
+      self.rotation[i] = rec["rotation"]
+      self.scale[i] = obj.scale
+      self.names.append(obj.name or kind)
+
+    s = self.scale
+    factors = np.column_stack([s, np.maximum(s[:, 0], s[:, 1]), s.max(axis=1)])
+    index = np.array([[f for _, f in _GEOMETRY_LAYOUT[t]] + [0] * (3 - len(_GEOMETRY_LAYOUT[t]))
+                      for t in _TYPE_NAMES])[self.type_code]
+    self.geometry = raw * np.take_along_axis(factors, index, axis=1)
+
+  # ------------------------------------------------------------------
+  def bounds(self, up: str):
+    """Exact per-primitive AABBs `(lo, hi)` in the `up` frame (see `_bbox`)."""
+    return _bounds_np(self.type_code, self.position, self.rotation, self.geometry, up)
+
+  def centre(self, up: str) -> None:
+    if not len(self.type_code):
+      return
+    lo, hi = self.bounds(up)
+    self.position -= (lo.min(axis=0) + hi.max(axis=0)) / 2
+
+  def z_to_y(self) -> None:
+    self.position = self.position[:, [0, 2, 1]]
+    self.rotation = self.rotation[:, [0, 2, 1]]
+
+  # ------------------------------------------------------------------
+  def to_schema(self) -> List[Dict[str, Any]]:
+    positions = self.position.tolist()
+    rotations = self.rotation.tolist()
+    geometry = self.geometry.tolist()
+    prims = []
+    for i, code in enumerate(self.type_code.tolist()):
+      kind = _TYPE_NAMES[code]
+      prim = {
+        "type": kind,
+        "name": self.names[i],
+        "geometry": {key: geometry[i][j] for j, (key, _) in enumerate(_GEOMETRY_LAYOUT[kind])},
+        "transform": {
+          "position": positions[i],
+          "rotation": rotations[i],
+        }
+      }
+      prim.update(self.materials[i])
+      prims.append(prim)
+    return prims
+
+# ---------------------------------------------------------------------------
+# Instancing                                                                  #
+# ---------------------------------------------------------------------------
+
+_MATERIAL_KEYS = ("globalMaterialUuid", "objectMaterialUuid")
+
+def _detect_instances(prims: List[Dict[str, Any]], *, tolerance: float = 1e-6,
+                      min_count: int = 2) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+  """Split `prims` into plain primitives and instanced batches.
+
+  Primitives with the same type, material and geometry (each value compared
+  on a `tolerance` grid) that differ only in transform become one batch —
+  the geometry of the first member plus an `instances` array of
+  `{position, rotation}` transforms — as soon as at least `min_count` of
+  them exist.  Returns `(remaining, batches)`, both in original order.
+  """
+  def q(v: float) -> float:
+    return round(v / tolerance) if tolerance > 0 else v
+
+  groups: Dict[tuple, List[int]] = {}
+  for i, p in enumerate(prims):
+    key = (p["type"],
+           tuple((k, q(v)) for k, v in p["geometry"].items()),
+           tuple(p.get(k) for k in _MATERIAL_KEYS))
+    groups.setdefault(key, []).append(i)
+
+  batched: set = set()
+  batches = []
+  for members in groups.values():
+    if len(members) < max(min_count, 2):
+      continue
+    first = prims[members[0]]
+    batch = {
+      "type": first["type"],
+      "name": first["name"],
+      "geometry": dict(first["geometry"]),
+    }
+    batch.update({k: first[k] for k in _MATERIAL_KEYS if k in first})
+    batch["instances"] = [prims[i]["transform"] for i in members]
+    batch["names"] = [prims[i]["name"] for i in members]
+    batches.append((members[0], batch))
+    batched.update(members)
+
+  remaining = [p for i, p in enumerate(prims) if i not in batched]
+  return remaining, [b for _, b in sorted(batches, key=lambda item: item[0])]
+
+# ---------------------------------------------------------------------------
+# Array patterns                                                              #
+# ---------------------------------------------------------------------------
+# Loop-generated instances usually follow a progression in script order:
+# `linear` (start + k·step), `grid` (two nested linear steps) or `radial`
+# (positions turned by k·angle about an axis through `center`).  A batch
+# keeps the other transforms in `instances`; its arrays expand after them.
+
+def _flat(t: Dict[str, Any]) -> Tuple[float, ...]:
+  return (*t["position"], *t["rotation"])
+
+def _transform(v) -> Dict[str, Any]:
+  return {"position": list(v[:3]), "rotation": list(v[3:])}
+
+def _close(a, b, tolerance: float) -> bool:
+  return max(map(abs, map(operator.sub, a, b))) <= tolerance
+
+def _along(start, step, k: float) -> List[float]:
+  """`start + k·step`."""
+  return [s + k * d for s, d in zip(start, step)]
+
+def _on_line(t, start, step, k: float, tolerance: float) -> bool:
+  """`_close(t, _along(start, step, k))`, stopping at the first miss."""
+  for x, s, d in zip(t, start, step):
+    if abs(x - s - k * d) > tolerance:
+      return False
+  return True
+
+def _linear_run(ts: List[tuple], i: int, tolerance: float) -> Tuple[int, tuple]:
+  """Length and step of the linear progression starting at `ts[i]`."""
+  if i + 1 >= len(ts):
+    return 1, ()
+  start = ts[i]
+  step = tuple(map(operator.sub, ts[i + 1], start))
+  n = 2
+  while i + n < len(ts) and _on_line(ts[i + n], start, step, n, tolerance):
+    n += 1
+  return n, step
+
+def _grid_rows(ts: List[tuple], i: int, cols: int, inner: tuple, tolerance: float) -> Tuple[int, tuple]:
+  """Rows of `cols` instances repeating the row at `ts[i]` by a constant step."""
+  if i + 2 * cols > len(ts) or not _on_line(ts[i + cols + 1], ts[i + cols], inner, 1, tolerance):
+    return 1, ()
+  start = ts[i]
+  outer = tuple(map(operator.sub, ts[i + cols], start))
+  rows = 1
+  while i + (rows + 1) * cols <= len(ts):
+    row = _along(start, outer, rows)
+    if not all(_on_line(ts[i + rows * cols + c], row, inner, c, tolerance) for c in range(cols)):
+      break
+    rows += 1
+  return rows, outer
+
+def _turn(v: List[float], axis: int, angle: float) -> List[float]:
+  """`v` rotated by `angle` (right-handed) about coordinate axis `axis`."""
+  u, w = (axis + 1) % 3, (axis + 2) % 3
+  c, s = math.cos(angle), math.sin(angle)
+  out = list(v)
+  out[u], out[w] = v[u] * c - v[w] * s, v[u] * s + v[w] * c
+  return out
+
+def _radial_run(ts: List[tuple], i: int, tolerance: float) -> Tuple[int, Dict[str, Any] | None]:
+  """Longest ring of equal angular steps about an x/y/z-parallel axis at `ts[i]`."""
+  if i + 2 >= len(ts):
+    return 1, None
+  a, b, c = ts[i], ts[i + 1], ts[i + 2]
+  # equal angular steps need a constant rotation step and equal chords
+  if (abs(c[3] - 2 * b[3] + a[3]) > 2 * tolerance or abs(c[4] - 2 * b[4] + a[4]) > 2 * tolerance
+      or abs(c[5] - 2 * b[5] + a[5]) > 2 * tolerance):
+    return 1, None
+  p0, p1, p2 = a[:3], b[:3], c[:3]
+  if abs(math.dist(p0, p1) - math.dist(p1, p2)) > 2 * tolerance:
+    return 1, None
+  rotation = a[3:]
+  step = tuple(map(operator.sub, b[3:], rotation))
+  best = (1, None)
+  for axis in range(3):
+    if abs(p1[axis] - p0[axis]) > tolerance or abs(p2[axis] - p0[axis]) > tolerance:
+      continue
+    u, w = (axis + 1) % 3, (axis + 2) % 3
+    # circumcentre of the three points in the (u, w) plane
+    ax, ay, bx, by, cx, cy = p0[u], p0[w], p1[u], p1[w], p2[u], p2[w]
+    det = 2 * (ax * (by - cy) + bx * (cy - ay) + cx * (ay - by))
+    if abs(det) <= tolerance:
+      continue  # collinear: a linear run
+    a2, b2, c2 = ax * ax + ay * ay, bx * bx + by * by, cx * cx + cy * cy
+    center = [0.0, 0.0, 0.0]
+    center[axis] = p0[axis]
+    center[u] = (a2 * (by - cy) + b2 * (cy - ay) + c2 * (ay - by)) / det
+    center[w] = (a2 * (cx - bx) + b2 * (ax - cx) + c2 * (bx - ax)) / det
+    angle = (math.atan2(by - center[w], bx - center[u]) - math.atan2(ay - center[w], ax - center[u]))
+    angle = math.remainder(angle, math.tau)
+    offset = [a - c for a, c in zip(p0, center)]
+    n = 1
+    while i + n < len(ts):
+      pos = [c + d for c, d in zip(center, _turn(offset, axis, n * angle))]
+      if not _close(ts[i + n], pos + _along(rotation, step, n), tolerance):
+        break
+      n += 1
+    if n > best[0]:
+      best = (n, {"center": center, "axis": "xyz"[axis], "step": {"angle": angle, "rotation": list(step)}})
+  return best
+
+def _detect_arrays(instances: List[Dict[str, Any]], *, tolerance: float = 1e-6,
+                   min_count: int = 3) -> Tuple[List[Dict[str, Any]], List[int]]:
+  """Find array patterns among consecutive `instances`.
+
+  Scans in order and at every instance takes the progression covering the
+  most of those that follow: a grid (at least 2×2), a linear run of at
+  least `min_count` or a radial ring of at least `max(min_count, 4)` (any
+  three equally spaced points lie on a circle).  Every expanded transform
+  is within `tolerance` of the original.  Returns `(arrays, order)`:
+  `order` lists the instance indices as they expand — those left in
+  `instances` first, then every array in turn.
+  """
+  ts = [_flat(t) for t in instances]
+  arrays, covered, rest = [], [], []
+  i = 0
+  while i < len(ts):
+    cols, inner = _linear_run(ts, i, tolerance)
+    rows, outer = _grid_rows(ts, i, cols, inner, tolerance) if cols >= 2 else (1, ())
+    # three collinear points are never on a ring
+    ring, radial = _radial_run(ts, i, tolerance) if cols < 3 else (1, None)
+    if rows >= 2 and rows * cols >= max(ring, min_count):
+      n = rows * cols
+      arrays.append({"pattern": "grid", "count": [rows, cols], "start": _transform(ts[i]),
+                     "step": [_transform(outer), _transform(inner)]})
+    elif cols >= min_count and cols >= ring:
+      n = cols
+      arrays.append({"pattern": "linear", "count": n, "start": _transform(ts[i]), "step": _transform(inner)})
+    elif ring >= max(min_count, 4):
+      n = ring
+      arrays.append({"pattern": "radial", "count": n, "start": _transform(ts[i]), **radial})
+    else:
+      rest.append(i)
+      i += 1
+      continue
+    covered.extend(range(i, i + n))
+    i += n
+  return arrays, rest + covered
+
+def _expand_array(a: Dict[str, Any]) -> List[Dict[str, Any]]:
+  start = _flat(a["start"])
+  if a["pattern"] == "linear":
+    step = _flat(a["step"])
+    return [_transform(_along(start, step, k)) for k in range(a["count"])]
+  if a["pattern"] == "grid":
+    (rows, cols), (outer, inner) = a["count"], [_flat(s) for s in a["step"]]
+    return [_transform(_along(_along(start, outer, r), inner, c))
+            for r in range(rows) for c in range(cols)]
+  axis = "xyz".index(a["axis"])
+  center, offset = a["center"], [p - c for p, c in zip(start[:3], a["center"])]
+  angle, step = a["step"]["angle"], a["step"]["rotation"]
+  return [{"position": [c + d for c, d in zip(center, _turn(offset, axis, k * angle))],
+           "rotation": _along(start[3:], step, k)}
+          for k in range(a["count"])]
+
+def _array_size(a: Dict[str, Any]) -> int:
+  return math.prod(a["count"]) if a["pattern"] == "grid" else a["count"]
+
+def _with_arrays(batch: Dict[str, Any], arrays: List[Dict[str, Any]]) -> Dict[str, Any]:
+  """`batch` (instances in expansion order) with `arrays` replacing the
+  transforms they cover."""
+  covered = sum(map(_array_size, arrays))
+  out = {k: v for k, v in batch.items() if k != "names"}
+  out["instances"] = batch["instances"][:len(batch["instances"]) - covered]
+  out["arrays"] = arrays
+  if "names" in batch:
+    out["names"] = batch["names"]
+  return out
+
+def expand_arrays(data: Dict[str, Any]) -> Dict[str, Any]:
+  """Replace the `arrays` of every instanced batch in `data` by the
+  transforms they describe, appended to `instances` (in place).  This is
+  what a loader does with `convert(..., arrays=True)` output.  Returns
+  `data`."""
+  for b in data.get("instancedPrimitives", ()):
+    for a in b.pop("arrays", ()):
+      b["instances"].extend(_expand_array(a))
+  return data
+
+# ---------------------------------------------------------------------------
+# Mirror symmetry                                                             #
+# ---------------------------------------------------------------------------
+# Every primitive is symmetric under some reflection of its local frame
+# (planes render double-sided), so the mirror image of a primitive is the
+# same primitive with a reflected position and a proper rotation.  Objects
+# are centred on their bounds, so candidate planes pass through the origin.
+
+def _signature(p: Dict[str, Any], up: str) -> Tuple[List[List[float]], ...]:
+  """World points fixing the solid of `p`; the points of each group may
+  match in any order."""
+  kind, params, he = _shape(p, up)
+  c = p["transform"]["position"]
+  m = _rotation_matrix(p["transform"]["rotation"], up)
+  def at(l):
+    return [c[i] + m[i][0]*l[0] + m[i][1]*l[1] + m[i][2]*l[2] for i in range(3)]
+  if kind == "box":
+    return (_obb_corners(c, m, he),)
+  if kind == "frustum":
+    axis, hh, rt, rb = params
+    top, bottom = [0.0] * 3, [0.0] * 3
+    top[axis], bottom[axis] = hh, -hh
+    return ([at(top), at(bottom)],) if rt == rb else ([at(top)], [at(bottom)])
+  if kind == "torus":
+    return ([at((0, 0, params[0])), at((0, 0, -params[0]))],)
+  if kind == "plane":
+    hx, hy = params
+    return ([at((sx * hx, sy * hy, 0)) for sx in (-1, 1) for sy in (-1, 1)],)
+  return ([list(c)],)
+
+def _same_points(a: Tuple[List[List[float]], ...], b: Tuple[List[List[float]], ...],
+                 tolerance: float) -> bool:
+  for ga, gb in zip(a, b):
+    rest = list(gb)
+    for pt in ga:
+      hit = next((k for k, q in enumerate(rest) if _close(pt, q, tolerance)), None)
+      if hit is None:
+        return False
+      rest.pop(hit)
+  return True
+
+def _reflect(points: Tuple[List[List[float]], ...], axis: int):
+  return tuple([[-v if i == axis else v for i, v in enumerate(pt)] for pt in g] for g in points)
+
+def _euler(m, up: str) -> List[float]:
+  """XYZ Euler angles of rotation matrix `m` (inverse of `_rotation_matrix`)."""
+  if up.lower() == "y":  # Rx·Ry·Rz
+    cy = math.hypot(m[0][0], m[0][1])
+    y = math.atan2(m[0][2], cy)
+    if cy > 1e-12:
+      return [math.atan2(-m[1][2], m[2][2]), y, math.atan2(-m[0][1], m[0][0])]
+    return [math.atan2(m[2][1], m[1][1]), y, 0.0]  # gimbal lock
+  cy = math.hypot(m[2][1], m[2][2])  # Rz·Ry·Rx
+  y = math.atan2(-m[2][0], cy)
+  if cy > 1e-12:
+    return [math.atan2(m[2][1], m[2][2]), y, math.atan2(m[1][0], m[0][0])]
+  return [0.0, y, math.atan2(-m[0][1], m[1][1])]
+
+def _mirrored_rotation(p: Dict[str, Any], axis: int, up: str) -> List[float]:
+  """Rotation of the mirror image of `p` across a plane normal to `axis`.
+
+  The image is `S·R·shape`; for a local reflection `L` leaving the shape
+  unchanged, `S·R·L` is a proper rotation.  With `L = S` that is just the
+  Euler angles off `axis` negated; cones (and cylinders with unequal
+  radii) mirrored along their own axis take another `L`.
+  """
+  kind, params, _ = _shape(p, up)
+  r = p["transform"]["rotation"]
+  if kind != "frustum" or params[0] != axis or params[2] == params[3]:
+    return [v if i == axis else -v for i, v in enumerate(r)]
+  m = _rotation_matrix(r, up)
+  local = (axis + 1) % 3
+  m = [[(-v if i == axis else v) * (-1 if j == local else 1) for j, v in enumerate(row)]
+       for i, row in enumerate(m)]
+  return _euler(m, up)
+
+def _mirror(p: Dict[str, Any], axis: int, up: str, name: str) -> Dict[str, Any]:
+  """Plain primitive that is the mirror image of `p` (a primitive or an
+  instance unit) across the plane through the origin normal to `axis`."""
+  position = list(p["transform"]["position"])
+  position[axis] = -position[axis]
+  out = {"type": p["type"], "name": name, "geometry": dict(p["geometry"]),
+         "transform": {"position": position, "rotation": _mirrored_rotation(p, axis, up)}}
+  out.update({k: p[k] for k in _MATERIAL_KEYS if k in p})
+  return out
+
+def _detect_mirror(units: List[Tuple[Dict[str, Any], Dict[str, Any]]], up: str,
+                   tolerance: float = 1e-6) -> Tuple[int, List[Tuple[int, int]]] | None:
+  """Dominant symmetry plane of `units` and the pairs mirrored across it.
+
+  `units` are `(primitive or batch, transform)` pairs.  Candidates are the
+  planes through the origin normal to x, y and z; the one pairing the most
+  units wins (the first on ties).  Two units pair when type, geometry and
+  material match and the solid of one reflects onto the other within
+  `tolerance`; units on the plane pair with nothing.  Returns
+  `(axis, [(source, mirrored)])` with `source < mirrored`, or `None`
+  without any pair.
+  """
+  if len(units) < 2:
+    return None
+  scale = 1 / tolerance if tolerance > 0 else 1.0
+  # units keyed by type, geometry, material and position on the tolerance grid
+  kinds: Dict[int, tuple] = {}
+  keys, cells = [], []
+  buckets: Dict[tuple, List[int]] = {}
+  for i, (p, t) in enumerate(units):
+    kind = kinds.get(id(p))
+    if kind is None:
+      kind = kinds[id(p)] = (p["type"], tuple((k, round(v * scale)) for k, v in p["geometry"].items()),
+                             tuple(p.get(k) for k in _MATERIAL_KEYS))
+    cell = [round(v * scale) for v in t["position"]]
+    keys.append(kind)
+    cells.append(cell)
+    buckets.setdefault((kind, *cell), []).append(i)
+  signatures: Dict[int, tuple] = {}
+  def signature(i: int):
+    if i not in signatures:
+      p, t = units[i]
+      signatures[i] = _signature({**p, "transform": t}, up)
+    return signatures[i]
+
+  best = None
+  for axis in range(3):
+    paired: set = set()
+    pairs = []
+    for i, cell in enumerate(cells):
+      if i in paired:
+        continue
+      image = list(cell)
+      image[axis] = -image[axis]
+      for j in buckets.get((keys[i], *image), ()):
+        if j > i and j not in paired and _same_points(_reflect(signature(i), axis), signature(j), tolerance):
+          pairs.append((i, j))
+          paired.update((i, j))
+          break
+    if pairs and (best is None or len(pairs) > len(best[1])):
+      best = (axis, pairs)
+  return best
+
+def expand_mirrors(data: Dict[str, Any]) -> Dict[str, Any]:
+  """Append the primitives listed in `mirroredPrimitives` to `primitives`
+  as plain primitives, expanding `arrays` first (in place).  This is what a
+  loader does with `convert(..., mirror=True)` output.  Returns `data`."""
+  expand_arrays(data)
+  refs = data.pop("mirroredPrimitives", None)
+  if not refs:
+    return data
+  prims = data["primitives"]
+  units = prims + [{**b, "transform": t} for b in data.get("instancedPrimitives", ())
+                   for t in b["instances"]]
+  axis = "xyz".index(data["symmetry"]["axis"])
+  # mirrored primitives are numbered between the primitives and the instances
+  copies = [_mirror(units[r["source"] if r["source"] < len(prims) else r["source"] - len(refs)],
+                    axis, data["upAxis"], r["name"]) for r in refs]
+  prims.extend(copies)
+  return data
+
+def primitive_count(data: Dict[str, Any]) -> int:
+  """Number of primitives `data` renders: plain, mirrored and instanced
+  ones, with `arrays` counted as expanded."""
+  return (len(data["primitives"]) + len(data.get("mirroredPrimitives", ()))
+          + sum(len(b["instances"]) + sum(map(_array_size, b.get("arrays", ())))
+                for b in data.get("instancedPrimitives", ())))
+
+# ---------------------------------------------------------------------------
+# Segment hints (LOD)                                                         #
+# ---------------------------------------------------------------------------
+
+# (field, front-end default, minimum) per type; the defaults are those of
+# `shared/r3f/primitives/*3D.tsx` (spheres are always 32×16 there)
+_SEGMENT_FIELDS = {
+  "cylinder": (("radialSegments", 16, 6),),
+  "cone":     (("radialSegments", 16, 6),),
+  "torus":    (("radialSegments", 16, 4), ("tubularSegments", 32, 8)),
+}
+
+# quality -> (allowed gap between a circle and its polygon, as a fraction of
+# the object's diagonal; segment cap as a multiple of the front-end default)
+LOD_PRESETS = {"low": (0.01, 1), "medium": (0.004, 1), "high": (0.0015, 2)}
+
+def _circle_radii(p: Dict[str, Any]) -> Tuple[float, ...]:
+  """Radius of the circle each `_SEGMENT_FIELDS` entry of `p` tessellates."""
+  g = p["geometry"]
+  if p["type"] == "cylinder":
+    return (max(g["radiusTop"], g["radiusBottom"]),)
+  if p["type"] == "cone":
+    return (g["radius"],)
+  return (g["minorRadius"], g["majorRadius"] + g["minorRadius"])  # tube, ring
+
+def _segment_count(radius: float, error: float, minimum: int, cap: int) -> int:
+  """Fewest sides keeping a polygon within `error` of a circle of `radius`."""
+  if radius <= error:
+    return minimum
+  if error <= 0:
+    return cap
+  n = math.ceil(math.pi / math.acos(1 - error / radius))
+  return max(minimum, min(n, cap))
+
+def _segments(p: Dict[str, Any], error: float, cap_factor: int) -> Dict[str, int]:
+  return {key: _segment_count(r, error, minimum, default * cap_factor)
+          for (key, default, minimum), r in zip(_SEGMENT_FIELDS[p["type"]], _circle_radii(p))}
+
+def _set_segments(p: Dict[str, Any], segments: Dict[str, int]) -> bool:
+  """Store `segments` in `p`'s geometry, leaving out front-end defaults."""
+  g = p["geometry"]
+  for key, default, _ in _SEGMENT_FIELDS[p["type"]]:
+    if segments[key] != default:
+      g[key] = segments[key]
+    else:
+      g.pop(key, None)
+  return any(key in g for key, _, _ in _SEGMENT_FIELDS[p["type"]])
+
+def _object_size(prims: List[Dict[str, Any]], batches: List[Dict[str, Any]], up: str) -> float:
+  """Diagonal of the AABB of `prims` and every instance of `batches`."""
+  flat = prims + [{**b, "transform": t} for b in batches for t in b["instances"]]
+  if not flat:
+    return 0.0
+  boxes = _primitive_bounds(flat, up)
+  return math.dist([min(b[0][k] for b in boxes) for k in range(3)],
+                   [max(b[1][k] for b in boxes) for k in range(3)])
+
+def _segment_hints(prims: List[Dict[str, Any]], batches: List[Dict[str, Any]], up: str,
+                   quality: str = "medium", levels: int = 1, scale: float = 1,
+                   size: float | None = None) -> Tuple[int, List[Dict[str, Any]]]:
+  """Add `radialSegments`/`tubularSegments` to cylinders, cones and tori.
+
+  Each circle gets the fewest segments whose polygon stays within the
+  `quality` preset's tolerance of the true circle, measured against the
+  object's diagonal, so thin branches drop to a handful of sides while
+  large parts keep the front end's default (or, with `"high"`, up to twice
+  that).  Values equal to the default are left out.  Geometry of `prims`
+  and instanced `batches` is updated in place.  `scale` multiplies the
+  tolerance (used by `_fit_budget`); `size` is the object's diagonal if
+  already known.
+
+  `levels > 1` also returns coarser LOD levels: level `k` doubles the
+  tolerance `k` times, which looks the same once the object is drawn at
+  `sizeFactor = 0.5**k` of its size, and lists only the geometry fields
+  that differ from level 0 by index into `primitives` /
+  `instancedPrimitives`.  Returns `(primitives with hints, levels)`.
+  """
+  tolerance, cap_factor = LOD_PRESETS[quality]
+  tolerance *= scale
+  targets = [(key, [(i, p) for i, p in enumerate(items) if p["type"] in _SEGMENT_FIELDS])
+             for key, items in (("primitives", prims), ("instancedPrimitives", batches))]
+  if not any(items for _, items in targets):
+    return 0, []
+  if size is None:
+    size = _object_size(prims, batches, up)
+
+  hinted = 0
+  base: Dict[int, Dict[str, int]] = {}
+  for _, items in targets:
+    for _, p in items:
+      segments = _segments(p, tolerance * size, cap_factor)
+      base[id(p)] = segments
+      hinted += _set_segments(p, segments)
+
+  lods = []
+  for k in range(1, levels):
+    level: Dict[str, Any] = {"sizeFactor": 0.5 ** k}
+    for key, items in targets:
+      overrides = {}
+      for i, p in items:
+        coarse = _segments(p, tolerance * size * 2 ** k, cap_factor)
+        changed = {f: v for f, v in coarse.items() if v != base[id(p)][f]}
+        if changed:
+          overrides[str(i)] = changed
+      if overrides:
+        level[key] = overrides
+    lods.append(level)
+  return hinted, lods
+
+# ---------------------------------------------------------------------------
+# Render cost & budget                                                        #
+# ---------------------------------------------------------------------------
+
+_COST_KEYS = ("triangles", "vertices", "drawCalls")
+
+def _tessellation(p: Dict[str, Any]) -> Tuple[int, int]:
+  """`(vertices, triangles)` of the three.js geometry the front end builds
+  for `p`: default arguments unless the geometry carries segment counts."""
+  t, g = p["type"], p["geometry"]
+  if t == "box":
+    return 24, 12
+  if t == "sphere":  # SphereGeometry(r, 32, 16)
+    return 33 * 17, 32 * 30
+  if t == "plane":
+    return 4, 2
+  if t == "torus":
+    radial, tubular = g.get("radialSegments", 16), g.get("tubularSegments", 32)
+    return (radial + 1) * (tubular + 1), 2 * radial * tubular
+  # CylinderGeometry / ConeGeometry: one height segment, closed ends
+  n = g.get("radialSegments", 16)
+  ends = (1 if g.get("radiusTop", 0) > 0 else 0) + (1 if g.get("radiusBottom", g.get("radius", 0)) > 0 else 0)
+  return 2 * (n + 1) + ends * (2 * n + 1), 2 * n * ends  # side + caps
+
+def _render_cost(prims: List[Dict[str, Any]], batches: List[Dict[str, Any]]) -> Dict[str, int]:
+  """Triangles, vertices and draw calls to render the object: one draw call
+  per primitive and per instanced batch; instances count their geometry
+  each."""
+  vertices = triangles = 0
+  for p in prims:
+    v, t = _tessellation(p)
+    vertices += v
+    triangles += t
+  for b in batches:
+    v, t = _tessellation(b)
+    vertices += v * len(b["instances"])
+    triangles += t * len(b["instances"])
+  return {"triangles": triangles, "vertices": vertices, "drawCalls": len(prims) + len(batches)}
+
+def _within(cost: Dict[str, int], budget: Dict[str, int]) -> bool:
+  return all(cost[k] <= v for k, v in budget.items())
+
+def parse_budget(spec: str | int | Dict[str, int]) -> Dict[str, int]:
+  """`20000` (triangles) or `"triangles=20000,drawCalls=50"` → budget dict."""
+  if isinstance(spec, dict):
+    budget = dict(spec)
+  elif isinstance(spec, int) or str(spec).strip().isdigit():
+    budget = {"triangles": int(spec)}
+  else:
+    budget = {}
+    for part in str(spec).split(","):
+      key, _, value = part.partition("=")
+      budget[key.strip()] = int(value)
+  unknown = set(budget) - set(_COST_KEYS)
+  if unknown or not budget:
+    raise ValueError(f"Budget keys must be among {', '.join(_COST_KEYS)}: {spec!r}")
+  if any(v < 0 for v in budget.values()):
+    raise ValueError(f"Budget values must not be negative: {spec!r}")
+  return budget
+
+# primitives never dropped to meet a budget: larger than this share of the
+# object's diagonal
+_BUDGET_MAX_DROP = 0.05
+# segment reduction stops at this multiple of the preset tolerance
+_BUDGET_MAX_SCALE = 1024
+
+def format_cost(cost: Dict[str, Any]) -> str:
+  """`"1,104 triangles, 801 vertices, 3 draw calls (budget 2,000 triangles: fits)"`."""
+  text = f"{cost['triangles']:,} triangles, {cost['vertices']:,} vertices, {cost['drawCalls']:,} draw calls"
+  if "budget" in cost:
+    limits = ", ".join(f"{v:,} {k}" for k, v in cost["budget"].items())
+    before = cost["beforeBudget"]
+    text += (f" (budget {limits}: {'fits' if cost['withinBudget'] else 'over'}; "
+             f"was {before['triangles']:,} triangles, {before['drawCalls']:,} draw calls)")
+  return text
+
+def _fit_budget(prims: List[Dict[str, Any]], batches: List[Dict[str, Any]], up: str,
+                budget: Dict[str, int], quality: str | None = None):
+  """Reduce the object until `_render_cost` fits `budget`.
+
+  First the segment tolerance of `quality` (default `"medium"`) is doubled
+  step by step (see `_segment_hints`) until the cost fits or every circle
+  is at its minimum.  Then primitives and instances are dropped smallest
+  first, but only those under `_BUDGET_MAX_DROP` of the object's diagonal,
+  so the silhouette survives; an object may therefore stay over budget.
+  Returns `(prims, batches, scale, dropped)`: `scale` is the tolerance
+  multiple applied (`None` if segments were left alone) and `dropped` lists
+  `{"name", "type"}` records.
+  """
+  cost = _render_cost(prims, batches)
+  if _within(cost, budget):
+    return prims, batches, None, []
+  size = _object_size(prims, batches, up)
+  round_prims = [p for p in prims + batches if p["type"] in _SEGMENT_FIELDS]
+
+  scale = None
+  if round_prims and set(budget) != {"drawCalls"}:  # segments never save draw calls
+    minimum = [{key: m for key, _, m in _SEGMENT_FIELDS[p["type"]]} for p in round_prims]
+    # with a quality preset level 0 is already applied; start one step coarser
+    scale = 1 if quality is None else 2
+    while True:
+      _segment_hints(prims, batches, up, quality or "medium", scale=scale, size=size)
+      cost = _render_cost(prims, batches)
+      floor = all(all(p["geometry"].get(k, -1) == v for k, v in m.items())
+                  for p, m in zip(round_prims, minimum))
+      if _within(cost, budget) or floor or scale >= _BUDGET_MAX_SCALE:
+        break
+      scale *= 2
+
+  dropped = []
+  if not _within(cost, budget) and size > 0:
+    # (relative size, order, primitive index or (batch, instance))
+    units = [(2 * _bounding_radius(p, up) / size, i, i, None) for i, p in enumerate(prims)]
+    units += [(2 * _bounding_radius(b, up) / size, len(prims) + j, j, k)
+              for j, b in enumerate(batches) for k in range(len(b["instances"]))]
+    units.sort()
+    drop_prims, drop_instances = set(), {}
+    for rel, _, i, k in units:
+      if rel >= _BUDGET_MAX_DROP or _within(cost, budget):
+        break
+      if k is None:
+        p = prims[i]
+        drop_prims.add(i)
+        cost["drawCalls"] -= 1
+        name = p["name"]
+      else:
+        p = batches[i]
+        gone = drop_instances.setdefault(i, set())
+        gone.add(k)
+        if len(gone) == len(p["instances"]):
+          cost["drawCalls"] -= 1
+        name = p["names"][k] if "names" in p else p["name"]
+      v, t = _tessellation(p)
+      cost["vertices"] -= v
+      cost["triangles"] -= t
+      dropped.append({"name": name, "type": p["type"]})
+    prims = [p for i, p in enumerate(prims) if i not in drop_prims]
+    kept_batches = []
+    for j, b in enumerate(batches):
+      gone = drop_instances.get(j)
+      if gone:
+        keep = [k for k in range(len(b["instances"])) if k not in gone]
+        if not keep:
+          continue
+        b = {**b, "instances": [b["instances"][k] for k in keep]}
+        if "names" in b:
+          b["names"] = [b["names"][k] for k in keep]
+      kept_batches.append(b)
+    batches = kept_batches
+  return prims, batches, scale, dropped
+
+# ---------------------------------------------------------------------------
+# Quantization                                                                #
+# ---------------------------------------------------------------------------
+
+def _quantize_value(v: float, precision: int) -> float | int:
+  r = round(v, precision) + 0.0  # + 0.0 folds -0.0 into 0.0
+  return int(r) if r.is_integer() and abs(r) < 1e15 else r
+
+def _quantize_transform(t: Dict[str, Any], precision: int) -> None:
+  for key in ("position", "rotation", "scale"):
+    if key in t:
+      t[key] = [_quantize_value(v, precision) for v in t[key]]
+
+def _extra_digits(multiple: float) -> int:
+  return max(0, math.ceil(math.log10(multiple))) if multiple > 1 else 0
+
+def _quantize_array(a: Dict[str, Any], precision: int) -> None:
+  # a step is applied up to count - 1 times, so it keeps log10(count) more
+  # decimals: expanded members stay within a unit of the last decimal of
+  # their exact transforms however long the array is
+  if a["pattern"] == "grid":
+    for step, n in zip(a["step"], a["count"]):
+      _quantize_transform(step, precision + _extra_digits(n - 1))
+  elif a["pattern"] == "linear":
+    _quantize_transform(a["step"], precision + _extra_digits(a["count"] - 1))
+  else:
+    # an angle error moves the members by radius × (count - 1) × error; the
+    # center enters every position twice (center + turned offset)
+    radius = math.dist(a["start"]["position"], a["center"])
+    a["center"] = [_quantize_value(v, precision + 1) for v in a["center"]]
+    a["step"]["angle"] = _quantize_value(a["step"]["angle"],
+                                         precision + _extra_digits(max(radius, 1) * (a["count"] - 1)))
+    _quantize_transform(a["step"], precision + _extra_digits(a["count"] - 1))
+  _quantize_transform(a["start"], precision)
+
+def _quantize_bound(v: float, precision: int, upper: bool) -> float | int:
+  # rounded outwards and widened by one step so bounds still enclose the
+  # primitives after their own rounding
+  scale = 10 ** precision
+  v = (math.ceil(v * scale) + 1) / scale if upper else (math.floor(v * scale) - 1) / scale
+  return _quantize_value(v, precision)
+
+def _quantize_box_list(values: List[float], stride: int, precision: int) -> List[Any]:
+  """Quantize a flat `[min xyz, max xyz, ...]` list with `stride` numbers per entry."""
+  return [_quantize_bound(v, precision, i % stride >= 3) if i % stride < 6 else v
+          for i, v in enumerate(values)]
+
+def quantize(data: Dict[str, Any], precision: int) -> Dict[str, Any]:
+  """Round positions, rotations and geometry to `precision` decimals in place.
+
+  Loop arithmetic in the input scripts leaves float noise such as
+  `0.30000000000000004`; rounding it away (and writing whole numbers as
+  integers) makes the JSON several times smaller.  Returns `data`.
+  """
+  for p in data["primitives"] + data.get("instancedPrimitives", []):
+    p["geometry"] = {k: _quantize_value(v, precision) for k, v in p["geometry"].items()}
+    if "transform" in p:
+      _quantize_transform(p["transform"], precision)
+    for t in p.get("instances", ()):
+      _quantize_transform(t, precision)
+    for a in p.get("arrays", ()):
+      _quantize_array(a, precision)
+  if "bounds" in data:
+    b = data["bounds"]
+    b["min"] = [_quantize_bound(v, precision, False) for v in b["min"]]
+    b["max"] = [_quantize_bound(v, precision, True) for v in b["max"]]
+    sphere = b["sphere"]
+    sphere["center"] = [_quantize_value(v, precision) for v in sphere["center"]]
+    sphere["radius"] = _quantize_bound(sphere["radius"] + 2 / 10 ** precision, precision, True)
+  if "bvh" in data:
+    data["bvh"]["nodes"] = _quantize_box_list(data["bvh"]["nodes"], data["bvh"]["nodeStride"], precision)
+  if "primitiveBounds" in data:
+    data["primitiveBounds"] = _quantize_box_list(data["primitiveBounds"], 6, precision)
+  return data
+
+def size_report(raw_size: int, size: int) -> str:
+  """`"5773 B -> 1620 B (-71.9%)"` style summary of an output size change."""
+  change = (size - raw_size) / raw_size * 100 if raw_size else 0.0
+  return f"{raw_size} B -> {size} B ({change:+.1f}%)"
+
+###############################################################################
+# Serialization                                                               #
+###############################################################################
+
+# Every backend produces exactly what `json.dumps` does: pretty (`indent=2`)
+# or compact (no whitespace), ASCII-only.  orjson agrees with it except for
+# a few float spellings (`1e-7`/`1e16` vs `1e-07`/`1e+16`, `0.00001` vs
+# `1e-05`), non-ASCII text and NaN/infinity (`null`); output that may
+# contain any of these is re-encoded with the stdlib.
+_ORJSON_EXPONENT = re.compile(rb"e[-+1-9]")
+_NUMBER_CHARS = frozenset(b"-.0123456789")
+_VALUE_STARTS = frozenset(b"[,: \n")
+
+def _at_value(blob: bytes, i: int) -> bool:
+  """True unless `blob[i]` lies inside a string (false positives are fine)."""
+  while i and blob[i - 1] in _NUMBER_CHARS:
+    i -= 1
+  return not i or blob[i - 1] in _VALUE_STARTS
+
+def _orjson_diverges(blob: bytes) -> bool:
+  # json.dumps escapes non-ASCII and DEL (0x7f); orjson writes them raw
+  if not blob.isascii() or b"\x7f" in blob:
+    return True
+  for m in _ORJSON_EXPONENT.finditer(blob):  # mostly hex digits of material UUIDs
+    i = m.start()
+    if blob[i + 1] == 0x2D and blob[i + 3:i + 4].isdigit():  # `e-17` is spelled alike
+      continue
+    if i and blob[i - 1] in _NUMBER_CHARS and _at_value(blob, i):
+      return True
+  for literal in (b"0.0000", b"null"):
+    i = blob.find(literal)
+    while i >= 0:
+      if _at_value(blob, i):
+        return True
+      i = blob.find(literal, i + 1)
+  return False
+
+def _encode_stdlib(data: Any, compact: bool) -> bytes:
+  if compact:
+    return json.dumps(data, separators=(",", ":")).encode("ascii")
+  return json.dumps(data, indent=2).encode("ascii")
+
+def _encode_orjson(data: Any, compact: bool) -> bytes:
+  try:
+    blob = orjson.dumps(data, option=0 if compact else orjson.OPT_INDENT_2)
+  except TypeError:  # integers beyond 64 bits, non-string keys
+    return _encode_stdlib(data, compact)
+  if _orjson_diverges(blob):
+    return _encode_stdlib(data, compact)
+  return blob
+
+# name -> encode(data, compact) -> bytes; the first available one is the default
+JSON_BACKENDS: Dict[str, Callable[[Any, bool], bytes]] = {}
+if orjson is not None:
+  JSON_BACKENDS["orjson"] = _encode_orjson
+JSON_BACKENDS["stdlib"] = _encode_stdlib
+
+def encode_json(data: Any, *, compact: bool = False, backend: str | None = None) -> bytes:
+  """Serialize converter output to bytes: `indent=2` or compact (no
+  whitespace).  `backend` names an entry of `JSON_BACKENDS` (the fastest
+  installed one by default); all of them give identical output."""
+  if backend is None:
+    backend = next(iter(JSON_BACKENDS))
+  elif backend not in JSON_BACKENDS:
+    raise ValueError(f"Unknown JSON backend: {backend} (available: {', '.join(JSON_BACKENDS)})")
+  return JSON_BACKENDS[backend](data, compact)
+
+def dumps(data: Any, *, compact: bool = False, backend: str | None = None) -> str:
+  """`encode_json` as a string."""
+  return encode_json(data, compact=compact, backend=backend).decode("ascii")
+
+def dump(data: Any, fh: BinaryIO, *, compact: bool = False, backend: str | None = None) -> int:
+  """Write `encode_json(data)` to the binary file `fh`; returns the byte count."""
+  blob = encode_json(data, compact=compact, backend=backend)
+  fh.write(blob)
+  return len(blob)
+
+def loads(blob: bytes | str) -> Any:
+  """Parse JSON with orjson when installed (same result as `json.loads`)."""
+  if orjson is not None:
+    try:
+      return orjson.loads(blob)
+    except orjson.JSONDecodeError:  # e.g. integers beyond 64 bits
+      pass
+  return json.loads(blob)
+
+###############################################################################
+# Instrumentation                                                             #
+###############################################################################
+
+class ConversionStats:
+  """Opt-in per-phase timings and counters of a conversion.
+
+  Pass an instance as `convert(..., stats=...)` (or to `cached_convert`,
+  `run_batch`) and it is filled in place.  `phases` maps a phase name to
+  accumulated wall-clock and CPU seconds plus the number of times it ran;
+  `counters` holds integer counts, `info` short descriptive values.  Phases
+  may nest: `materials` is part of `schema`.
+  """
+
+  def __init__(self) -> None:
+    self.phases: Dict[str, Dict[str, float]] = {}
+    self.counters: Dict[str, int] = {}
+    self.info: Dict[str, str] = {}
+
+  @contextmanager
+  def phase(self, name: str) -> Iterator[None]:
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+      yield
+    finally:
+      entry = self.phases.setdefault(name, {"wall": 0.0, "cpu": 0.0, "calls": 0})
+      entry["wall"] += time.perf_counter() - wall
+      entry["cpu"] += time.process_time() - cpu
+      entry["calls"] += 1
+
+  def count(self, name: str, n: int = 1) -> None:
+    self.counters[name] = self.counters.get(name, 0) + n
+
+  def merge(self, other: "ConversionStats | Dict[str, Any]") -> None:
+    """Add another run's numbers (an instance or its `to_dict()`)."""
+    other = other.to_dict() if isinstance(other, ConversionStats) else other
+    for name, entry in other["phases"].items():
+      mine = self.phases.setdefault(name, {"wall": 0.0, "cpu": 0.0, "calls": 0})
+      for key in mine:
+        mine[key] += entry[key]
+    for name, n in other["counters"].items():
+      self.count(name, n)
+    self.info.update(other.get("info", {}))
+
+  # ------------------------------------------------------------------
+  def to_dict(self) -> Dict[str, Any]:
+    return {"phases": {k: dict(v) for k, v in self.phases.items()},
+            "counters": dict(self.counters), "info": dict(self.info)}
+
+  @classmethod
+  def from_dict(cls, data: Dict[str, Any]) -> "ConversionStats":
+    stats = cls()
+    stats.merge(data)
+    return stats
+
+  def format(self) -> str:
+    """Human-readable table (what `--stats` prints)."""
+    total = sum(e["wall"] for k, e in self.phases.items() if k != "materials")
+    lines = [f"{'phase':<12} {'wall ms':>10} {'cpu ms':>10} {'share':>7}"]
+    for name, e in self.phases.items():
+      share = e["wall"] / total * 100 if total else 0.0
+      lines.append(f"{name:<12} {e['wall'] * 1e3:>10.2f} {e['cpu'] * 1e3:>10.2f} {share:>6.1f}%")
+    lines += [f"{name}: {n}" for name, n in self.counters.items()]
+    lines += [f"{name}: {v}" for name, v in self.info.items()]
+    return "\n".join(lines)
+
+  def to_prometheus(self, prefix: str = "cad2qryleth") -> str:
+    """Prometheus text exposition format, e.g. for node_exporter's textfile collector."""
+    lines = [f"# HELP {prefix}_phase_seconds Wall-clock seconds spent per conversion phase.",
+             f"# TYPE {prefix}_phase_seconds gauge"]
+    lines += [f'{prefix}_phase_seconds{{phase="{k}"}} {e["wall"]:.6f}' for k, e in self.phases.items()]
+    lines += [f"# HELP {prefix}_phase_cpu_seconds CPU seconds spent per conversion phase.",
+              f"# TYPE {prefix}_phase_cpu_seconds gauge"]
+    lines += [f'{prefix}_phase_cpu_seconds{{phase="{k}"}} {e["cpu"]:.6f}' for k, e in self.phases.items()]
+    for name, n in self.counters.items():
+      metric = prefix + "_" + "".join("_" + c.lower() if c.isupper() else c for c in name)
+      lines += [f"# TYPE {metric} gauge", f"{metric} {n}"]
+    return "\n".join(lines) + "\n"
+
+  def write(self, path: str | Path, **extra: Any) -> None:
+    """Write `path` atomically: Prometheus text for `*.prom`, JSON otherwise.
+
+    `extra` keys are added to the JSON document only.
+    """
+    if str(path).endswith(".prom"):
+      write_text_atomic(path, self.to_prometheus())
+    else:
+      write_text_atomic(path, json.dumps({**self.to_dict(), **extra}, indent=2) + "\n")
+
 ###############################################################################
 # Public API                                                                  #
 ###############################################################################
 
-def convert(src: str, *, name: str = "ImportedObject", up_axis: str = "Y") -> Dict[str, Any]:
-  ctx = _CaptureContext()
-  recs = ctx.run(src)
+def convert(src: str, *, name: str = "ImportedObject", up_axis: str = "Y",
+            instancing: bool = False, instance_tolerance: float = 1e-6,
+            instance_min: int = 2, precision: int | None = None,
+            cull_hidden: bool = False, merge_boxes: bool = False,
+            merge_tolerance: float = 1e-6, bvh: bool = False,
+            bvh_leaf_size: int = 4, primitive_bounds: bool = False,
+            lod_quality: str | None = None, lod_levels: int = 1,
+            arrays: bool = False, array_tolerance: float = 1e-6,
+            mirror: bool = False, mirror_tolerance: float = 1e-6,
+            render_cost: bool = False, budget: str | int | Dict[str, int] | None = None,
+            static_eval: bool | None = None, sandbox: bool = False, cpu_limit: float | None = 30.0,
+            memory_limit: int | None = 1024, max_primitives: int | None = None,
+            stats: ConversionStats | None = None) -> Dict[str, Any]:
+  """Convert a Blender script into the Qryleth object dict.
+
+  With `instancing=True` primitives that differ only in transform are moved
+  from `primitives` into `instancedPrimitives` batches (see
+  `_detect_instances`); `arrays=True` then describes loop-generated
+  progressions of their transforms as compact `arrays` (see
+  `_detect_arrays` and `expand_arrays`).  `mirror=True` finds the
+  dominant symmetry plane and replaces the mirrored half of each pair by a
+  `mirroredPrimitives` reference to the other (see `_detect_mirror` and
+  `expand_mirrors`).  `precision` rounds all numbers to that many
+  decimals (see `quantize`).  `cull_hidden=True` removes primitives fully
+  enclosed by opaque ones and lists them in `culledPrimitives` (see
+  `_cull_contained`).  `merge_boxes=True` merges touching same-material
+  axis-aligned boxes (within `merge_tolerance`) and lists them in
+  `mergedBoxes` (see `_merge_boxes`).  `bvh=True` adds the object's `bounds` (root AABB
+  and bounding sphere) and a flattened `bvh` (see `_build_bvh`); BVH leaf
+  indices address `primitives`, then `mirroredPrimitives`, then every
+  instance of every `instancedPrimitives` batch (arrays expanded), in
+  order.  `primitive_bounds=True` adds
+  `primitiveBounds`, the exact AABB of each of those primitives as a flat
+  `minX, minY, minZ, maxX, maxY, maxZ` list (see `_bbox`).
+  `lod_quality` (a `LOD_PRESETS` name) adds segment counts to cylinders,
+  cones and tori from their size relative to the object; `lod_levels > 1`
+  adds that many minus one coarser levels as `lods` (see `_segment_hints`).
+  `render_cost=True` adds `renderCost`, the estimated triangles, vertices
+  and draw calls (see `_render_cost`).  `budget` (see `parse_budget`)
+  implies it: segment counts are lowered and small primitives dropped
+  until the object fits, the dropped ones are listed in
+  `droppedPrimitives` (see `_fit_budget`).
+
+  `sandbox=True` executes the script in a separate process limited to
+  `cpu_limit` seconds and `memory_limit` MiB; `max_primitives` caps the
+  capture either way.  A breach raises `ScriptLimitError`.  With the
+  sandbox, scripts the AST evaluator understands within its budgets never
+  reach `exec` or a worker process unless `static_eval=False` (see
+  `_capture`).
+
+  `stats` (a `ConversionStats`) receives per-phase timings and counts.
+  """
+  phase = stats.phase if stats is not None else lambda name: nullcontext()
+  with phase("capture"):
+    recs = _capture(src, static_eval=static_eval, sandbox=sandbox, cpu_limit=cpu_limit,
+                    memory_limit=memory_limit, max_primitives=max_primitives, stats=stats)
   
-  # Create list to collect object materials during conversion
-  object_materials = []
+  # Collect object materials during conversion
+  registry = _MaterialRegistry(stats)
+  object_materials = registry.materials
   
   # Convert primitives with material system support
-  prims = [_prim_to_schema(r, object_materials) for r in recs]
-  _centre(prims)
-  if up_axis.lower() == "y":
-    _z_to_y(prims)
+  if np is not None:
+    with phase("schema"):
+      store = _PrimitiveColumns(recs, registry)
+    with phase("transform"):
+      if up_axis.lower() == "y":
+        store.z_to_y()
+      store.centre(up_axis)
+    with phase("schema"):
+      prims = store.to_schema()
+  else:
+    with phase("schema"):
+      prims = [_prim_to_schema(r, registry) for r in recs]
+    with phase("transform"):
+      if up_axis.lower() == "y":
+        _z_to_y(prims)
+      _centre(prims, up_axis)
   
+  culled = []
+  if cull_hidden:
+    with phase("cull"):
+      prims, culled = _cull_contained(prims, object_materials, up_axis)
+
+  merges = []
+  if merge_boxes:
+    with phase("merge"):
+      prims, merges = _merge_boxes(prims, object_materials, up_axis, merge_tolerance)
+
+  batches = []
+  if instancing:
+    with phase("instancing"):
+      prims, batches = _detect_instances(prims, tolerance=instance_tolerance, min_count=instance_min)
+
+  hinted, lods = 0, []
+  if lod_quality is not None:
+    with phase("lod"):
+      hinted, lods = _segment_hints(prims, batches, up_axis, lod_quality, lod_levels)
+
+  cost = None
+  dropped = []
+  if render_cost or budget is not None:
+    with phase("budget"):
+      if budget is not None:
+        budget = parse_budget(budget)
+        before = _render_cost(prims, batches)
+        prims, batches, scale, dropped = _fit_budget(prims, batches, up_axis, budget, lod_quality)
+        if (scale is not None or dropped) and lod_quality is not None and lod_levels > 1:
+          # coarser levels relative to the reduced object
+          _, lods = _segment_hints(prims, batches, up_axis, lod_quality, lod_levels, scale=scale or 1)
+        hinted = sum(any(k in p["geometry"] for k, _, _ in _SEGMENT_FIELDS[p["type"]])
+                     for p in prims + batches if p["type"] in _SEGMENT_FIELDS)
+      cost = _render_cost(prims, batches)
+      if budget is not None:
+        cost.update(budget=budget, withinBudget=_within(cost, budget), beforeBudget=before)
+
+  symmetry = None
+  mirrors: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []  # (source transform, copy)
+  if mirror:
+    with phase("mirror"):
+      units = [(p, p["transform"]) for p in prims] + [(b, t) for b in batches for t in b["instances"]]
+      found = _detect_mirror(units, up_axis, mirror_tolerance)
+      if found:
+        axis, pairs = found
+        symmetry = {"axis": "xyz"[axis]}
+        names = [p["name"] for p in prims] + [n for b in batches
+                                              for n in b.get("names", [b["name"]] * len(b["instances"]))]
+        gone = {id(units[j][1]) for _, j in pairs}
+        mirrors = [(units[i][1], _mirror({**units[i][0], "transform": units[i][1]}, axis, up_axis, names[j]))
+                   for i, j in sorted(pairs, key=lambda pair: pair[1])]
+        kept = [i for i, p in enumerate(prims) if id(p["transform"]) not in gone]
+        prims = [prims[i] for i in kept]
+        # LOD overrides address `primitives` by index; batches only lose instances
+        renumber = {str(i): str(n) for n, i in enumerate(kept)}
+        for level in lods:
+          if "primitives" in level:
+            level["primitives"] = {renumber[i]: v for i, v in level["primitives"].items() if i in renumber}
+            if not level["primitives"]:
+              del level["primitives"]
+        for k, b in enumerate(batches):
+          keep = [n for n, t in enumerate(b["instances"]) if id(t) not in gone]
+          if len(keep) < len(b["instances"]):
+            batches[k] = b = {**b, "instances": [b["instances"][n] for n in keep]}
+            if "names" in b:
+              b["names"] = [b["names"][n] for n in keep]
+
+  patterns: Dict[int, List[Dict[str, Any]]] = {}
+  if arrays and batches:
+    with phase("arrays"):
+      for j, b in enumerate(batches):
+        found, order = _detect_arrays(b["instances"], tolerance=array_tolerance)
+        if found:
+          # instances in expansion order, so BVH indices stay valid
+          batches[j] = b = {**b, "instances": [b["instances"][k] for k in order]}
+          if "names" in b:
+            b["names"] = [b["names"][k] for k in order]
+          patterns[j] = found
+
+  hierarchy = None
+  boxes = []
+  if bvh or primitive_bounds:
+    with phase("bounds"):
+      # mirrored primitives and instances are indexed after the plain ones
+      flat = prims + [c for _, c in mirrors] + [{**b, "transform": t} for b in batches for t in b["instances"]]
+      boxes = _primitive_bounds(flat, up_axis)
+      if bvh and flat:
+        hierarchy = (_object_bounds(flat, boxes, up_axis), _build_bvh(boxes, bvh_leaf_size))
+
   # Build result with new material system
   result = {
     "name": name, 
     "upAxis": up_axis.upper(), 
     "primitives": prims
   }
+  if batches:
+    result["instancedPrimitives"] = batches
+  if patterns:
+    result["instancedPrimitives"] = [_with_arrays(b, patterns[j]) if j in patterns else b
+                                     for j, b in enumerate(batches)]
+  if symmetry:
+    index = {id(p["transform"]): i for i, p in enumerate(prims)}
+    start = len(prims) + len(mirrors)
+    index.update((id(t), start + k) for k, t in enumerate(t for b in batches for t in b["instances"]))
+    result["symmetry"] = symmetry
+    result["mirroredPrimitives"] = [{"source": index[id(t)], "name": c["name"]} for t, c in mirrors]
+  if culled:
+    result["culledPrimitives"] = culled
+  if merges:
+    result["mergedBoxes"] = merges
+  if lods:
+    result["lods"] = lods
+  if dropped:
+    result["droppedPrimitives"] = dropped
+  if cost is not None:
+    result["renderCost"] = cost
+  if hierarchy:
+    result["bounds"], result["bvh"] = hierarchy
+  if primitive_bounds:
+    result["primitiveBounds"] = [v for lo, hi in boxes for v in lo + hi]
   
   # Add object materials if any were created
   if object_materials:
     result["materials"] = object_materials
-  
+
+  if precision is not None:
+    with phase("quantize"):
+      quantize(result, precision)
+
+  if stats is not None:
+    stats.count("primitives", len(recs))
+    stats.count("outputPrimitives", primitive_count(result))
+    stats.count("globalMaterialPrimitives", sum("globalMaterialUuid" in p for p in prims)
+                + sum(len(b["instances"]) for b in batches if "globalMaterialUuid" in b))
+    stats.count("objectMaterials", len(object_materials))
+    stats.count("instancedBatches", len(batches))
+    stats.count("arrays", sum(map(len, patterns.values())))
+    stats.count("mirrored", len(mirrors))
+    stats.count("culled", len(culled))
+    stats.count("mergedBoxes", sum(len(m["parts"]) - 1 for m in merges))
+    stats.count("segmentHints", hinted)
+    stats.count("dropped", len(dropped))
+    if cost is not None:
+      for key in _COST_KEYS:
+        stats.count(key, cost[key])
   return result
 
+def convert_stream(src: str, out: TextIO, *, name: str = "ImportedObject", up_axis: str = "Y",
+                   fmt: str = "ndjson", **limits: Any) -> int:
+  """Convert `src` writing primitives to `out` one by one; returns their count.
+
+  Memory stays flat regardless of how many primitives the script emits: the
+  script runs twice — the first pass only accumulates global bounds and the
+  material table, the second centres each primitive and writes it out
+  immediately.  The state of the `random` module is restored between the
+  passes, so scripts using it still see the same sequence.
+
+  `fmt="ndjson"` writes a header line (`name`, `upAxis`, `materials`,
+  `primitiveCount`) followed by one primitive per line; `fmt="json"` writes
+  the same document as `convert()` as compact JSON (no spaces after `,` and
+  `:`), one primitive per line.
+  `limits` are the sandbox arguments of `_capture`.
+  """
+  if fmt not in ("ndjson", "json"):
+    raise ValueError(f"Unsupported stream format: {fmt}")
+
+  registry = _MaterialRegistry()
+  object_materials = registry.materials
+  lo = [float("inf")]*3
+  hi = [float("-inf")]*3
+  count = 0
+
+  def measure(rec: Dict[str, Any]) -> None:
+    nonlocal count
+    p = _prim_to_schema(rec, registry)
+    if up_axis.lower() == "y":
+      _z_to_y([p])
+    bmin, bmax = _bbox(p, up_axis)
+    for i in range(3):
+      lo[i] = min(lo[i], bmin[i])
+      hi[i] = max(hi[i], bmax[i])
+    count += 1
+
+  rng_state = random.getstate()
+  _capture(src, measure, **limits)
+  mid = [(a+b)/2 for a,b in zip(lo,hi)]
+
+  header: Dict[str, Any] = {"name": name, "upAxis": up_axis.upper()}
+  if fmt == "ndjson":
+    if object_materials:
+      header["materials"] = object_materials
+    header["primitiveCount"] = count
+    out.write(json.dumps(header) + "\n")
+  else:
+    out.write(json.dumps(header, separators=(",", ":"))[:-1] + ',"primitives":[')
+
+  written = 0
+  def emit(rec: Dict[str, Any]) -> None:
+    nonlocal written
+    # materials were all registered in pass 1, so the table is complete
+    p = _prim_to_schema(rec, registry)
+    if up_axis.lower() == "y":
+      _z_to_y([p])
+    p["transform"]["position"] = [p["transform"]["position"][i]-mid[i] for i in range(3)]
+    if fmt == "ndjson":
+      out.write(json.dumps(p) + "\n")
+    else:
+      out.write(("\n" if not written else ",\n") + json.dumps(p, separators=(",", ":")))
+    written += 1
+
+  random.setstate(rng_state)
+  _capture(src, emit, **limits)
+  if written != count:
+    raise RuntimeError(f"Script is not deterministic: {count} primitives in pass 1, {written} in pass 2")
+
+  if fmt == "json":
+    out.write("\n]")
+    if object_materials:
+      out.write(',"materials":' + json.dumps(object_materials, separators=(",", ":")))
+    out.write("}\n")
+  return written
+
+@contextmanager
+def atomic_writer(path: str | Path, mode: str = "w") -> Iterator[Any]:
+  """Open `path` for writing so readers never observe a half-written file.
+
+  The data goes to a temporary file in the same directory which replaces
+  `path` in a single `os.replace` once the block exits successfully.  Use
+  `mode="wb"` for binary output.
+  """
+  path = Path(path)
+  fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+  try:
+    with os.fdopen(fd, mode, encoding=None if "b" in mode else "utf-8") as fh:
+      yield fh
+    os.replace(tmp, path)
+  except BaseException:
+    Path(tmp).unlink(missing_ok=True)
+    raise
+
+def write_text_atomic(path: str | Path, text: str) -> None:
+  """Write `text` to `path` atomically (see `atomic_writer`)."""
+  with atomic_writer(path) as fh:
+    fh.write(text)
+
 ###############################################################################
 # CLI                                                                         #
 ###############################################################################
 
-if __name__ == "__main__":
+def _is_batch(inputs: List[str]) -> bool:
+  """True if the CLI inputs name more than a single script file."""
+  if len(inputs) > 1:
+    return True
+  arg = inputs[0]
+  return Path(arg).is_dir() or any(ch in arg for ch in "*?[")
+
+
+def _report_stats(stats: ConversionStats, ns: argparse.Namespace, **extra: Any) -> None:
+  if ns.stats:
+    print(stats.format(), file=sys.stderr)
+  if ns.stats_file:
+    stats.write(ns.stats_file, **extra)
+
+
+def main(argv: List[str] | None = None) -> int:
   parser = argparse.ArgumentParser(description="Blender‑CAD ➜ Three.js JSON (sandbox exec)")
-  parser.add_argument("input", help="Blender‑Python *.py file")
+  parser.add_argument("input", nargs="*", help="Blender‑Python *.py file(s), directories or glob patterns")
   parser.add_argument("-o", "--output", help="Write JSON to file (stdout if omitted)")
   parser.add_argument("--name", help="Override object name (defaults to filename)")
   parser.add_argument("--up", choices=["y","z"], default="y", help="Target up‑axis (default: y)")
-  ns = parser.parse_args()
+  parser.add_argument("--out-dir", default="output", help="Batch mode: directory for JSON files (default: output)")
+  parser.add_argument("-j", "--jobs", type=int, help="Batch mode: worker processes (default: CPU count)")
+  parser.add_argument("--format", choices=["json", "binary"], default="json", help="Output format: JSON or compact .qryb binary (binary.py)")
+  parser.add_argument("--bundle", metavar="PATH", help="Also pack all converted objects into one .qryp bundle (bundle.py)")
+  parser.add_argument("--stream", choices=["ndjson", "json"], help="Write primitives incrementally with flat memory (two-pass; no cache)")
+  parser.add_argument("--watch", action="store_true", help="Keep running and re-convert scripts as they change (writes to --out-dir)")
+  parser.add_argument("--instance", action="store_true", help="Emit primitives differing only in transform as instanced batches")
+  parser.add_argument("--instance-tolerance", type=float, default=1e-6, help="Geometry comparison tolerance for --instance (default: 1e-6)")
+  parser.add_argument("--instance-min", type=int, default=2, help="Minimum batch size for --instance (default: 2)")
+  parser.add_argument("--arrays", action="store_true", help="Describe linear/grid/radial progressions of instances as arrays (implies --instance)")
+  parser.add_argument("--array-tolerance", type=float, default=1e-6, help="Transform comparison tolerance for --arrays (default: 1e-6)")
+  parser.add_argument("--mirror", action="store_true", help="Emit one half of a mirror-symmetric object plus references to mirror it")
+  parser.add_argument("--mirror-tolerance", type=float, default=1e-6, help="Position comparison tolerance for --mirror (default: 1e-6)")
+  parser.add_argument("--cull", action="store_true", help="Drop primitives fully hidden inside opaque primitives")
+  parser.add_argument("--merge-boxes", action="store_true", help="Merge touching same-material axis-aligned boxes into larger boxes")
+  parser.add_argument("--merge-tolerance", type=float, default=1e-6, help="Extent comparison tolerance for --merge-boxes (default: 1e-6)")
+  parser.add_argument("--bvh", action="store_true", help="Emit root bounds/bounding sphere and a flattened BVH")
+  parser.add_argument("--prim-bounds", action="store_true", help="Emit the exact AABB of every primitive")
+  parser.add_argument("--lod", choices=list(LOD_PRESETS), help="Add segment counts to cylinders, cones and tori by size (quality preset)")
+  parser.add_argument("--lod-levels", type=int, default=1, metavar="N", help="--lod: also emit N-1 coarser LOD levels (default: 1)")
+  parser.add_argument("--cost", action="store_true", help="Emit the estimated triangles, vertices and draw calls (renderCost)")
+  parser.add_argument("--budget", metavar="SPEC", help="Reduce the object to a render budget: N triangles or e.g. triangles=20000,drawCalls=50 (implies --cost)")
+  parser.add_argument("--precision", type=int, metavar="N", help="Round positions, rotations and geometry to N decimals")
+  parser.add_argument("--compact", action="store_true", help="Write JSON without indentation")
+  parser.add_argument("--pretty", dest="compact", action="store_false", help="Write indented JSON (the default; overrides --compact)")
+  parser.add_argument("--json-backend", choices=list(JSON_BACKENDS), help=f"JSON encoder (default: {next(iter(JSON_BACKENDS))}; the output is identical)")
+  parser.add_argument("--no-static", action="store_true", help="--sandbox: always start the worker instead of evaluating the script's AST first")
+  parser.add_argument("--sandbox", action="store_true", help="Execute the script in a resource-limited worker process (sandbox.py)")
+  parser.add_argument("--cpu-limit", type=float, default=30.0, metavar="S", help="--sandbox: CPU seconds per script (default: 30)")
+  parser.add_argument("--mem-limit", type=int, default=1024, metavar="MIB", help="--sandbox: address-space limit in MiB (default: 1024)")
+  parser.add_argument("--max-prims", type=int, metavar="N", help="Abort scripts that add more than N primitives")
+  parser.add_argument("--stats", action="store_true", help="Print per-phase timings and counters to stderr")
+  parser.add_argument("--stats-file", metavar="PATH", help="Write timings and counters to PATH (Prometheus text for *.prom, JSON otherwise)")
+  parser.add_argument("--server", metavar="URL", help="Convert on a running server.py daemon instead of in-process")
+  parser.add_argument("--no-cache", action="store_true", help="Always re-run the script, bypassing the conversion cache")
+  parser.add_argument("--clear-cache", action="store_true", help="Empty the conversion cache before converting")
+  parser.add_argument("--cache-dir", help="Conversion cache directory (default: .cache next to converter.py)")
+  parser.add_argument("--cache-size", type=int, default=256, help="Cache size limit in MiB (default: 256)")
+  ns = parser.parse_args(argv)
 
-  code = Path(ns.input).read_text(encoding="utf-8")
-  obj_name = ns.name or Path(ns.input).stem
+  from cache import ConversionCache, DEFAULT_CACHE_DIR, cached_convert
+  # run as a script, cache.py and sandbox.py raise the `converter` module's
+  # classes rather than `__main__`'s
+  from converter import SandboxError as ImportedSandboxError
+  cache_dir = ns.cache_dir or DEFAULT_CACHE_DIR
+  cache_bytes = ns.cache_size * 1024 * 1024
+  if ns.clear_cache:
+    removed = ConversionCache(cache_dir, cache_bytes).clear()
+    print(f"Cleared {removed} cached conversion(s) from {cache_dir}", file=sys.stderr)
+  if not ns.input:
+    if ns.clear_cache:
+      return 0
+    parser.error("the following arguments are required: input")
+  cache = None if ns.no_cache else ConversionCache(cache_dir, cache_bytes)
 
-  data = convert(code, name=obj_name, up_axis=ns.up)
-  js = json.dumps(data, indent=2)
+  # script execution limits, shared by convert() and convert_stream()
+  limits: Dict[str, Any] = {}
+  if ns.no_static:
+    limits["static_eval"] = False
+  if ns.sandbox:
+    limits.update(sandbox=True, cpu_limit=ns.cpu_limit, memory_limit=ns.mem_limit)
+  if ns.max_prims is not None:
+    limits["max_primitives"] = ns.max_prims
 
-  if ns.output:
-    Path(ns.output).write_text(js, encoding="utf-8")
-  else:
-    print(js)
+  # keyword arguments of convert() besides `name`
+  options: Dict[str, Any] = {"up_axis": ns.up, **limits}
+  if ns.cull:
+    options["cull_hidden"] = True
+  if ns.merge_boxes:
+    options.update(merge_boxes=True, merge_tolerance=ns.merge_tolerance)
+  if ns.bvh:
+    options["bvh"] = True
+  if ns.prim_bounds:
+    options["primitive_bounds"] = True
+  if ns.lod:
+    options.update(lod_quality=ns.lod, lod_levels=ns.lod_levels)
+  elif ns.lod_levels != 1:
+    parser.error("--lod-levels requires --lod")
+  if ns.cost:
+    options["render_cost"] = True
+  if ns.budget is not None:
+    try:
+      options["budget"] = parse_budget(ns.budget)
+    except ValueError as exc:
+      parser.error(f"--budget: {exc}")
+  if ns.mirror:
+    options.update(mirror=True, mirror_tolerance=ns.mirror_tolerance)
+  if ns.arrays:
+    ns.instance = True
+    options.update(arrays=True, array_tolerance=ns.array_tolerance)
+  if ns.instance:
+    options.update(instancing=True, instance_tolerance=ns.instance_tolerance,
+                   instance_min=ns.instance_min)
+
+  batch_mode = ns.bundle is not None or _is_batch(ns.input)
+  if ns.watch or batch_mode:
+    if ns.output or ns.name:
+      parser.error("-o/--output and --name apply to a single input; use --out-dir in batch/watch mode")
+  if ns.server and (ns.watch or batch_mode):
+    parser.error("--server converts a single input")
+  if ns.stream and (ns.server or ns.watch or batch_mode):
+    parser.error("--stream converts a single local input")
+  if ns.bundle and (ns.watch or ns.format != "json"):
+    parser.error("--bundle packs JSON batch output")
+  if ns.stream and ns.format != "json":
+    parser.error("--stream writes JSON only")
+  if ns.stream and (set(options) != {"up_axis", *limits} or ns.precision is not None):
+    parser.error("--stream does not support post-processing passes")
+  stats = ConversionStats() if ns.stats or ns.stats_file else None
+  if stats and (ns.stream or ns.watch):
+    parser.error("--stats/--stats-file do not apply to --stream or --watch")
+  if ns.watch:
+    from watch import watch
+    watch(ns.input, out_dir=ns.out_dir, options=options, cache=cache, fmt=ns.format,
+          precision=ns.precision, compact=ns.compact, json_backend=ns.json_backend)
+    return 0
+  if batch_mode:
+    from batch import run_batch, print_summary
+    results = run_batch(ns.input, out_dir=ns.out_dir, jobs=ns.jobs, options=options, cache=cache,
+                        fmt=ns.format, precision=ns.precision, compact=ns.compact,
+                        json_backend=ns.json_backend, stats=stats)
+    print_summary(results)
+    if ns.bundle:
+      from bundle import BundleWriter
+      with BundleWriter(ns.bundle) as bundle:
+        for r in results:
+          if r.ok:
+            # `a/Chair`, like the output path, so same-named scripts don't clash
+            name = r.output.relative_to(ns.out_dir).with_suffix("").as_posix()
+            bundle.add(loads(r.output.read_bytes()), name=name)
+      print(f"{ns.bundle}: {len(bundle)} objects, {bundle.materials} materials "
+            f"({bundle.material_refs} before deduplication)")
+    if stats:
+      _report_stats(stats, ns, files={str(r.source): r.stats for r in results})
+    return 0 if results and all(r.ok for r in results) else 1
+
+  src_path = Path(ns.input[0])
+  code = src_path.read_text(encoding="utf-8")
+  obj_name = ns.name or src_path.stem
+
+  try:
+    if ns.stream:
+      if ns.output:
+        with atomic_writer(ns.output) as fh:
+          convert_stream(code, fh, name=obj_name, up_axis=ns.up, fmt=ns.stream, **limits)
+      else:
+        convert_stream(code, sys.stdout, name=obj_name, up_axis=ns.up, fmt=ns.stream, **limits)
+      return 0
+
+    if ns.server:
+      from server import RemoteConversionError, convert_remote
+      try:
+        with stats.phase("remote") if stats else nullcontext():
+          data = convert_remote(ns.server, code, name=obj_name, **options)
+      except RemoteConversionError as exc:
+        print(json.dumps({"source": str(src_path), **exc.to_dict()}), file=sys.stderr)
+        return 2
+      except OSError as exc:  # URLError: server down, refused, timed out
+        print(json.dumps({"source": str(src_path), "type": type(exc).__name__,
+                          "message": str(getattr(exc, "reason", exc))}), file=sys.stderr)
+        return 2
+    else:
+      data, _ = cached_convert(code, cache, name=obj_name, stats=stats, **options)
+  except (SandboxError, ImportedSandboxError) as exc:
+    print(json.dumps({"source": str(src_path), **exc.to_dict()}), file=sys.stderr)
+    return 2
+  # quantize here rather than in convert() so the saving can be reported
+  raw_size = None
+  if ns.precision is not None or ns.compact:
+    raw_size = len(encode_json(data, backend=ns.json_backend))
+  if ns.precision is not None:
+    with stats.phase("quantize") if stats else nullcontext():
+      quantize(data, ns.precision)
+
+  if ns.format == "binary":
+    from binary import encode
+    with stats.phase("serialize") if stats else nullcontext():
+      blob = encode(data)
+    if ns.output:
+      with atomic_writer(ns.output, "wb") as fh:
+        fh.write(blob)
+    else:
+      sys.stdout.buffer.write(blob)
+    if stats:
+      stats.count("outputBytes", len(blob))
+      _report_stats(stats, ns)
+    return 0
+
+  with stats.phase("serialize") if stats else nullcontext():
+    if ns.output:
+      with atomic_writer(ns.output, "wb") as fh:
+        size = dump(data, fh, compact=ns.compact, backend=ns.json_backend)
+    else:
+      sys.stdout.flush()
+      size = dump(data, sys.stdout.buffer, compact=ns.compact, backend=ns.json_backend)
+      sys.stdout.buffer.write(b"\n")
+  if stats:
+    stats.count("outputBytes", size)
+    _report_stats(stats, ns)
+  if raw_size is not None:
+    print(f"{obj_name}: {size_report(raw_size, size)}", file=sys.stderr)
+  for c in data.get("culledPrimitives", []):
+    print(f"{obj_name}: culled {c['type']} {c['name']!r} (inside {c['insideOf']!r})", file=sys.stderr)
+  if "mergedBoxes" in data:
+    merges = data["mergedBoxes"]
+    parts = sum(len(m["parts"]) for m in merges)
+    print(f"{obj_name}: merged {parts} boxes into {len(merges)} "
+          f"({parts - len(merges)} draw calls saved)", file=sys.stderr)
+  found = [a for b in data.get("instancedPrimitives", []) for a in b.get("arrays", ())]
+  if found:
+    kinds = ", ".join(f"{sum(a['pattern'] == k for a in found)} {k}" for k in ("linear", "grid", "radial")
+                      if any(a["pattern"] == k for a in found))
+    covered = sum(math.prod(a["count"]) if a["pattern"] == "grid" else a["count"] for a in found)
+    print(f"{obj_name}: {covered} instances as {len(found)} arrays ({kinds})", file=sys.stderr)
+  if "symmetry" in data:
+    print(f"{obj_name}: {len(data['mirroredPrimitives'])} primitives mirrored across "
+          f"{data['symmetry']['axis']} = 0", file=sys.stderr)
+  for d in data.get("droppedPrimitives", []):
+    print(f"{obj_name}: dropped {d['type']} {d['name']!r} to meet the budget", file=sys.stderr)
+  if "renderCost" in data:
+    print(f"{obj_name}: {format_cost(data['renderCost'])}", file=sys.stderr)
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
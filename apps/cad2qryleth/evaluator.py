@@ -0,0 +1,782 @@
+"""
+Static evaluator for cad2qryleth input scripts
+==============================================
+Converts the common shape of input script — constants, arithmetic,
+`for ... in range(...)` loops, simple helper functions and
+`bpy.ops.mesh.primitive_*_add` calls — by walking its AST instead of
+handing it to `exec`.
+
+Only a whitelisted subset of Python is interpreted: module-level code and
+plain functions, literals, arithmetic, comparisons, f-strings,
+comprehensions, `math`, a handful of builtins (`range`, `len`, `min`, ...),
+methods of built-in containers and strings, and the `bpy` stubs of the
+capture context.  Attribute names starting with `_` are never touched.
+Anything else raises `StaticEvalError` and the caller falls back to the
+exec path (see `converter._capture`), so scripts never convert differently.
+
+Evaluation is bounded on its own, which is what lets `--sandbox` run it in
+the caller's process and skip the worker: a budget of work units (each
+statement and iteration, plus the elements a call, slice or concatenation
+copies and the widths passed to `str.ljust` and friends) caps memory, a
+CPU deadline caps time, and ints wider than `_MAX_INT_BITS` are refused
+before they are computed.  Running out of either budget is just another
+`StaticEvalError`.
+
+The tree is compiled into nested closures once, before anything runs:
+constructs outside the subset are rejected up front, and evaluation does
+not pay for re-dispatching on node types.
+"""
+from __future__ import annotations
+import ast
+import math
+import operator
+import re
+import sys
+import time
+import types
+from collections.abc import Iterator
+from typing import Any, Callable, Dict, List, Set
+
+# work units (statements, iterations, elements copied) before giving up
+DEFAULT_MAX_STEPS = 1_000_000
+
+# CPU seconds before giving up: scripts that need longer are large enough
+# for exec in a fresh worker (~0.1 s to start, 2-3x faster) to win anyway
+DEFAULT_MAX_SECONDS = 0.2
+
+# longest str/list/tuple an operation may produce
+_MAX_SEQUENCE = 1_000_000
+
+# widest int an operation may produce
+_MAX_INT_BITS = 1 << 14
+
+# work units between looks at the CPU clock
+_CLOCK_EVERY = 10_000
+
+
+class StaticEvalError(Exception):
+  """The script uses something the static evaluator does not interpret."""
+
+
+class _Break(Exception):
+  pass
+
+class _Continue(Exception):
+  pass
+
+class _Return(Exception):
+  def __init__(self, value: Any) -> None:
+    self.value = value
+
+
+_BIN_OPS = {
+  ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+  ast.Div: operator.truediv, ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod,
+  ast.Pow: operator.pow,
+}
+_UNARY_OPS = {ast.UAdd: operator.pos, ast.USub: operator.neg, ast.Not: operator.not_,
+              ast.Invert: operator.invert}
+_COMPARE_OPS = {
+  ast.Eq: operator.eq, ast.NotEq: operator.ne, ast.Lt: operator.lt, ast.LtE: operator.le,
+  ast.Gt: operator.gt, ast.GtE: operator.ge, ast.Is: operator.is_, ast.IsNot: operator.is_not,
+  ast.In: lambda a, b: a in b, ast.NotIn: lambda a, b: a not in b,
+}
+
+_BUILTINS: Dict[str, Any] = {
+  "range": range, "len": len, "abs": abs, "min": min, "max": max, "round": round,
+  "int": int, "float": float, "str": str, "bool": bool, "enumerate": enumerate, "zip": zip,
+  "list": list, "tuple": tuple, "dict": dict, "sum": sum, "sorted": sorted,
+  "reversed": reversed, "True": True, "False": False, "None": None,
+  # script output must not end up in the converter's stdout
+  "print": lambda *args, **kw: print(*args, file=sys.stderr),
+}
+
+# `math` functions whose cost grows with the value of their arguments
+_COSTLY_MATH = {"factorial", "comb", "perm", "prod"}
+
+# containers whose (public) methods scripts may call
+_SAFE_SELF = (list, tuple, dict, set, str, int, float)
+_UNSAFE_METHODS = {
+  "format", "format_map",  # field syntax reaches attributes
+  "translate", "maketrans", "expandtabs",  # output size unrelated to the input's
+}
+# methods allocating as much as their int arguments say
+_WIDTH_METHODS = {"ljust", "rjust", "center", "zfill", "to_bytes"}
+# container methods touching every element of their container
+_COPYING_METHODS = {"copy", "sort", "count", "index", "remove", "reverse", "insert",
+                    "union", "intersection", "difference", "symmetric_difference"}
+_SEQUENCES = (str, list, tuple)
+_SIZED = {str, list, tuple, dict, set, range, type({}.keys()), type({}.values()), type({}.items())}
+_PLAIN = {int, float, bool, type(None)}
+_NUMBERS = (int, float)
+_ITERABLES = (range, list, tuple, str, dict, enumerate, zip, reversed)
+
+
+class _Function:
+  """A `def` from the script; parameters bind into a fresh local scope."""
+
+  def __init__(self, evaluator: "_Evaluator", name: str, params: List[str],
+               defaults: List[Any], body: Callable[[], None]) -> None:
+    self.evaluator = evaluator
+    self.name = name
+    self.params = params
+    self.defaults = dict(zip(params[len(params) - len(defaults):], defaults))
+    self.body = body
+
+  def __call__(self, *args: Any, **kwargs: Any) -> Any:
+    if len(args) > len(self.params):
+      raise TypeError(f"{self.name}() takes {len(self.params)} arguments")
+    scope = dict(self.defaults)
+    scope.update(zip(self.params, args))
+    for key, value in kwargs.items():
+      if key not in self.params:
+        raise TypeError(f"{self.name}() got an unexpected keyword argument {key!r}")
+      scope[key] = value
+    if len(scope) != len(self.params):
+      raise TypeError(f"{self.name}() missing arguments {[p for p in self.params if p not in scope]}")
+    ev = self.evaluator
+    saved, ev.locals = ev.locals, scope
+    try:
+      self.body()
+    except _Return as ret:
+      return ret.value
+    finally:
+      ev.locals = saved
+    return None
+
+
+def _assigned_names(body: List[ast.stmt]) -> Set[str]:
+  """Names a function body binds (its locals), nested scopes excluded."""
+  names: Set[str] = set()
+  todo: List[ast.AST] = list(body)
+  while todo:
+    node = todo.pop()
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+      names.add(node.name)
+      continue
+    if isinstance(node, (ast.Lambda, ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)):
+      continue
+    if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+      names.add(node.id)
+    elif isinstance(node, (ast.Import, ast.ImportFrom)):
+      names.update((a.asname or a.name).split(".")[0] for a in node.names)
+    todo.extend(ast.iter_child_nodes(node))
+  return names
+
+
+def _binop(op: Callable[[Any, Any], Any], a: Any, b: Any) -> Any:
+  """`op(a, b)`, refusing results that would exhaust memory or time."""
+  if isinstance(a, int) and isinstance(b, int):
+    if op is operator.pow and b > 0 and a.bit_length() * b > _MAX_INT_BITS:
+      raise StaticEvalError("integer power too large")
+    if op is operator.mul and a.bit_length() + b.bit_length() > _MAX_INT_BITS:
+      raise StaticEvalError("integer product too large")
+  if op is operator.mod and isinstance(a, str):
+    raise StaticEvalError("%-formatting")
+  if op is operator.mul and isinstance(a, _SEQUENCES) != isinstance(b, _SEQUENCES):
+    seq, n = (a, b) if isinstance(a, _SEQUENCES) else (b, a)
+    if isinstance(n, int) and n * len(seq) > _MAX_SEQUENCE:
+      raise StaticEvalError("sequence too long")
+  if op is operator.add and isinstance(a, _SEQUENCES) and isinstance(b, _SEQUENCES):
+    if len(a) + len(b) > _MAX_SEQUENCE:
+      raise StaticEvalError("sequence too long")
+  return op(a, b)
+
+
+_NOT_CONSTANT = object()
+
+def _fold(node: ast.expr) -> Any:
+  """Value of literal arithmetic and literal tuples (`-1`, `2 * 0.5`,
+  `(0, 0, 0.75)`), or `_NOT_CONSTANT`."""
+  if isinstance(node, ast.Constant):
+    return node.value
+  if isinstance(node, ast.UnaryOp):
+    v = _fold(node.operand)
+    if type(v) in _NUMBERS:
+      return _UNARY_OPS[type(node.op)](v)
+  elif isinstance(node, ast.BinOp) and type(node.op) in _BIN_OPS:
+    a, b = _fold(node.left), _fold(node.right)
+    if type(a) in _NUMBERS and type(b) in _NUMBERS:
+      try:
+        return _binop(_BIN_OPS[type(node.op)], a, b)
+      except (ArithmeticError, StaticEvalError):  # raised at run time, if ever reached
+        pass
+  elif isinstance(node, ast.Tuple) and isinstance(node.ctx, ast.Load):
+    values = tuple(_fold(e) for e in node.elts)
+    if _NOT_CONSTANT not in values:
+      return values
+  return _NOT_CONSTANT
+
+
+class _Evaluator:
+  """Compiles a module's AST into closures over its `globals`/`locals`."""
+
+  def __init__(self, bpy: types.ModuleType, max_steps: int, max_seconds: float) -> None:
+    self.bpy = bpy
+    self.globals: Dict[str, Any] = {"bpy": bpy, "math": math}
+    self.locals: Dict[str, Any] | None = None
+    self.steps = max_steps
+    self.check_at = max(max_steps - _CLOCK_EVERY, 0)
+    self.deadline = time.process_time() + max_seconds
+    self.allowed = {id(v): v for k, v in vars(math).items() if callable(v) and k not in _COSTLY_MATH}
+    self.allowed.update((id(v), v) for v in _BUILTINS.values() if callable(v))
+    self._collect_stubs(bpy)
+    # names local to the function being compiled (None at module level)
+    self._scope: Set[str] | None = None
+
+  def _collect_stubs(self, ns: Any) -> None:
+    for name, value in vars(ns).items():
+      if name.startswith("_"):
+        continue
+      if isinstance(value, (types.SimpleNamespace, types.ModuleType)):
+        self._collect_stubs(value)
+      elif isinstance(value, types.FunctionType):
+        self.allowed[id(value)] = value
+
+  def _charge(self, n: int) -> None:
+    self.steps -= n
+    if self.steps < self.check_at:
+      self._check_budget()
+
+  def _check_budget(self) -> None:
+    if self.steps < 0:
+      raise StaticEvalError("step budget exhausted")
+    if time.process_time() > self.deadline:
+      raise StaticEvalError("time budget exhausted")
+    self.check_at = max(self.steps - _CLOCK_EVERY, 0)
+
+  def _sized(self, value: Any) -> Any:
+    """`value`, charged for its length if it is a new sequence."""
+    if type(value) in _SIZED:
+      self._charge(len(value))
+    return value
+
+  def _metered(self, values: Iterator) -> Iterator:
+    for value in values:
+      self._charge(1)
+      yield value
+
+  def _admit(self, fn: Any, args: List[Any], kwargs: Dict[str, Any]) -> None:
+    """Refuse calls outside the subset and charge the rest, before they run,
+    for the elements they may copy; iterator arguments are charged as they
+    are consumed.  The script's own functions charge their bodies."""
+    if type(fn) is _Function:
+      return
+    if self.allowed.get(id(fn)) is fn:
+      owner, name = None, ""
+      if fn is range:  # lazy; its iterations are charged
+        if len(range(*args)) > DEFAULT_MAX_STEPS * 10:
+          raise StaticEvalError("range too large")
+        return
+    else:
+      owner, name = getattr(fn, "__self__", None), getattr(fn, "__name__", "")
+      if not (isinstance(fn, (types.BuiltinMethodType, types.MethodType))
+              and isinstance(owner, _SAFE_SELF) and not name.startswith("_")
+              and name not in _UNSAFE_METHODS):
+        raise StaticEvalError(f"call of {name or type(fn).__name__}")
+    cost = 0
+    for i, value in enumerate(args):
+      cost += self._arg_cost(value, name, args, i)
+    for key, value in kwargs.items():
+      cost += self._arg_cost(value, name, kwargs, key)
+    if owner is not None:
+      kind = type(owner)
+      if kind is str:
+        cost += len(owner)
+        if name == "join" and args:
+          if type(args[0]) not in (list, tuple):
+            args[0] = list(args[0])
+          cost += len(owner) * len(args[0]) + sum(len(s) for s in args[0] if type(s) is str)
+        elif name == "replace" and len(args) > 1 and type(args[1]) is str:
+          cost += (len(owner) + 1) * len(args[1])
+      elif kind in _SIZED and name in _COPYING_METHODS:
+        cost += len(owner)
+    if cost:
+      self._charge(cost)
+
+  def _arg_cost(self, value: Any, name: str, holder: Any, key: Any) -> int:
+    kind = type(value)
+    if kind in _SIZED:
+      return len(value)
+    if kind in _PLAIN:
+      return max(value, 0) if kind is int and name in _WIDTH_METHODS else 0
+    if isinstance(value, Iterator):
+      holder[key] = self._metered(value)
+    return 0
+
+  @staticmethod
+  def _check_attr(name: str) -> None:
+    if name.startswith("_"):
+      raise StaticEvalError(f"private attribute {name!r}")
+
+  @staticmethod
+  def _iterable(value: Any) -> Any:
+    if not isinstance(value, _ITERABLES):
+      raise StaticEvalError(f"iteration over {type(value).__name__}")
+    return value
+
+  # ------------------------------------------------------------------
+  # names
+  # ------------------------------------------------------------------
+  def load(self, name: str) -> Callable[[], Any]:
+    ev = self
+    if self._scope is not None and name in self._scope:
+      def load_local() -> Any:
+        try:
+          return ev.locals[name]
+        except KeyError:
+          raise UnboundLocalError(f"local variable {name!r} referenced before assignment") from None
+      return load_local
+    has_builtin, builtin = name in _BUILTINS, _BUILTINS.get(name)
+    def load_global() -> Any:
+      try:
+        return ev.globals[name]
+      except KeyError:
+        if has_builtin:
+          return builtin
+        raise StaticEvalError(f"unknown name {name!r}") from None
+    return load_global
+
+  def store(self, target: ast.expr) -> Callable[[Any], None]:
+    ev = self
+    if isinstance(target, ast.Name):
+      name = target.id
+      if self._scope is not None:
+        def store_local(value: Any) -> None:
+          ev.locals[name] = value
+        return store_local
+      def store_global(value: Any) -> None:
+        ev.globals[name] = value
+      return store_global
+    if isinstance(target, (ast.Tuple, ast.List)):
+      if any(isinstance(e, ast.Starred) for e in target.elts):
+        raise StaticEvalError("starred assignment")
+      stores = [self.store(e) for e in target.elts]
+      def store_unpack(value: Any) -> None:
+        values = list(value)
+        if len(values) != len(stores):
+          raise ValueError("unpacking length mismatch")
+        for store, v in zip(stores, values):
+          store(v)
+      return store_unpack
+    if isinstance(target, ast.Attribute):
+      self._check_attr(target.attr)
+      obj, attr = self.expr(target.value), target.attr
+      def store_attr(value: Any) -> None:
+        o = obj()
+        if not isinstance(o, types.SimpleNamespace) and type(o).__module__ not in ("converter", "__main__"):
+          raise StaticEvalError(f"cannot set attributes on {type(o).__name__}")
+        setattr(o, attr, value)
+      return store_attr
+    if isinstance(target, ast.Subscript):
+      obj, key = self.expr(target.value), self.expr(target.slice)
+      def store_item(value: Any) -> None:
+        o = obj()
+        if not isinstance(o, (list, dict)):
+          raise StaticEvalError(f"cannot assign items of {type(o).__name__}")
+        o[key()] = value
+      return store_item
+    raise StaticEvalError(f"unsupported assignment target {type(target).__name__}")
+
+  # ------------------------------------------------------------------
+  # statements
+  # ------------------------------------------------------------------
+  def block(self, body: List[ast.stmt]) -> Callable[[], None]:
+    fns = [self.stmt(node) for node in body]
+    n, charge = len(fns), self._charge
+    if n == 1:
+      only = fns[0]
+      def run_one() -> None:
+        charge(1)
+        only()
+      return run_one
+    def run() -> None:
+      charge(n)
+      for fn in fns:
+        fn()
+    return run
+
+  def stmt(self, node: ast.stmt) -> Callable[[], None]:
+    handler = getattr(self, f"_stmt_{type(node).__name__}", None)
+    if handler is None:
+      raise StaticEvalError(f"unsupported statement {type(node).__name__}")
+    return handler(node)
+
+  def _stmt_Expr(self, node: ast.Expr) -> Callable[[], None]:
+    return self.expr(node.value)
+
+  def _stmt_Pass(self, node: ast.Pass) -> Callable[[], None]:
+    return lambda: None
+
+  def _stmt_Break(self, node: ast.Break) -> Callable[[], None]:
+    def run() -> None:
+      raise _Break()
+    return run
+
+  def _stmt_Continue(self, node: ast.Continue) -> Callable[[], None]:
+    def run() -> None:
+      raise _Continue()
+    return run
+
+  def _stmt_Return(self, node: ast.Return) -> Callable[[], None]:
+    if self._scope is None:
+      raise StaticEvalError("return outside function")
+    value = self.expr(node.value) if node.value is not None else (lambda: None)
+    def run() -> None:
+      raise _Return(value())
+    return run
+
+  def _stmt_Assign(self, node: ast.Assign) -> Callable[[], None]:
+    value = self.expr(node.value)
+    stores = [self.store(t) for t in node.targets]
+    if len(stores) == 1:
+      store = stores[0]
+      return lambda: store(value())
+    def run() -> None:
+      v = value()
+      for store in stores:
+        store(v)
+    return run
+
+  def _stmt_AnnAssign(self, node: ast.AnnAssign) -> Callable[[], None]:
+    if node.value is None:
+      return lambda: None
+    value, store = self.expr(node.value), self.store(node.target)
+    return lambda: store(value())
+
+  def _stmt_AugAssign(self, node: ast.AugAssign) -> Callable[[], None]:
+    op = _BIN_OPS.get(type(node.op))
+    if op is None or not isinstance(node.target, (ast.Name, ast.Attribute, ast.Subscript)):
+      raise StaticEvalError("unsupported augmented assignment")
+    load = ast.copy_location(type(node.target)(**{**vars(node.target), "ctx": ast.Load()}), node.target)
+    current, value, store = self.expr(load), self.expr(node.value), self.store(node.target)
+    sized = self._sized
+    return lambda: store(sized(_binop(op, current(), value())))
+
+  def _stmt_If(self, node: ast.If) -> Callable[[], None]:
+    test, body = self.expr(node.test), self.block(node.body)
+    orelse = self.block(node.orelse) if node.orelse else (lambda: None)
+    def run() -> None:
+      if test():
+        body()
+      else:
+        orelse()
+    return run
+
+  def _stmt_For(self, node: ast.For) -> Callable[[], None]:
+    iterable, store = self.expr(node.iter), self.store(node.target)
+    body = self.block(node.body)
+    orelse = self.block(node.orelse) if node.orelse else (lambda: None)
+    charge, check = self._charge, self._iterable
+    def run() -> None:
+      for value in check(iterable()):
+        charge(1)
+        store(value)
+        try:
+          body()
+        except _Break:
+          return
+        except _Continue:
+          pass
+      orelse()
+    return run
+
+  def _stmt_While(self, node: ast.While) -> Callable[[], None]:
+    test, body = self.expr(node.test), self.block(node.body)
+    orelse = self.block(node.orelse) if node.orelse else (lambda: None)
+    charge = self._charge
+    def run() -> None:
+      while test():
+        charge(1)
+        try:
+          body()
+        except _Break:
+          return
+        except _Continue:
+          pass
+      orelse()
+    return run
+
+  def _stmt_Import(self, node: ast.Import) -> Callable[[], None]:
+    stores = [(self.store(ast.Name(alias.asname or alias.name, ast.Store())), self._module(alias.name))
+              for alias in node.names]
+    def run() -> None:
+      for store, module in stores:
+        store(module)
+    return run
+
+  def _stmt_ImportFrom(self, node: ast.ImportFrom) -> Callable[[], None]:
+    module = self._module(node.module or "")
+    stores = []
+    for alias in node.names:
+      if alias.name == "*":
+        raise StaticEvalError("star import")
+      self._check_attr(alias.name)
+      stores.append((self.store(ast.Name(alias.asname or alias.name, ast.Store())), alias.name))
+    def run() -> None:
+      for store, name in stores:
+        store(getattr(module, name))
+    return run
+
+  def _module(self, name: str) -> Any:
+    if name == "bpy":
+      return self.bpy
+    if name == "math":
+      return math
+    raise StaticEvalError(f"import of {name!r}")
+
+  def _stmt_FunctionDef(self, node: ast.FunctionDef) -> Callable[[], None]:
+    args = node.args
+    if self._scope is not None:
+      raise StaticEvalError("nested function")
+    if args.vararg or args.kwarg or args.posonlyargs or args.kwonlyargs or node.decorator_list:
+      raise StaticEvalError(f"unsupported signature of {node.name}()")
+    if any(isinstance(n, (ast.Global, ast.Nonlocal)) for n in ast.walk(node)):
+      raise StaticEvalError("global/nonlocal declaration")
+    params = [a.arg for a in args.args]
+    defaults = [self.expr(d) for d in args.defaults]
+    self._scope = _assigned_names(node.body) | set(params)
+    try:
+      body = self.block(node.body)
+    finally:
+      self._scope = None
+    store, name, ev = self.store(ast.Name(node.name, ast.Store())), node.name, self
+    return lambda: store(_Function(ev, name, params, [d() for d in defaults], body))
+
+  # ------------------------------------------------------------------
+  # expressions
+  # ------------------------------------------------------------------
+  def expr(self, node: ast.expr) -> Callable[[], Any]:
+    if isinstance(node, (ast.UnaryOp, ast.BinOp, ast.Tuple)):
+      value = _fold(node)
+      if value is not _NOT_CONSTANT:
+        return lambda: value
+    handler = getattr(self, f"_expr_{type(node).__name__}", None)
+    if handler is None:
+      raise StaticEvalError(f"unsupported expression {type(node).__name__}")
+    return handler(node)
+
+  def _expr_Constant(self, node: ast.Constant) -> Callable[[], Any]:
+    value = node.value
+    return lambda: value
+
+  def _expr_Name(self, node: ast.Name) -> Callable[[], Any]:
+    return self.load(node.id)
+
+  def _expr_Attribute(self, node: ast.Attribute) -> Callable[[], Any]:
+    self._check_attr(node.attr)
+    obj, attr = self.expr(node.value), node.attr
+    return lambda: getattr(obj(), attr)
+
+  def _expr_Subscript(self, node: ast.Subscript) -> Callable[[], Any]:
+    obj, key, ev = self.expr(node.value), self.expr(node.slice), self
+    def run() -> Any:
+      o = obj()
+      if not isinstance(o, (list, tuple, str, dict, range)):
+        raise StaticEvalError(f"subscript of {type(o).__name__}")
+      k = key()
+      return ev._sized(o[k]) if type(k) is slice else o[k]
+    return run
+
+  def _expr_Slice(self, node: ast.Slice) -> Callable[[], slice]:
+    none = lambda: None
+    lower, upper, step = (self.expr(n) if n is not None else none
+                          for n in (node.lower, node.upper, node.step))
+    return lambda: slice(lower(), upper(), step())
+
+  def _expr_Index(self, node: Any) -> Callable[[], Any]:  # Python < 3.9
+    return self.expr(node.value)
+
+  def _elements(self, elts: List[ast.expr]) -> List[Callable[[], Any]]:
+    if any(isinstance(e, ast.Starred) for e in elts):
+      raise StaticEvalError("starred expression")
+    return [self.expr(e) for e in elts]
+
+  def _expr_Tuple(self, node: ast.Tuple) -> Callable[[], tuple]:
+    elts = self._elements(node.elts)
+    if len(elts) == 3:  # locations, rotations, scales
+      x, y, z = elts
+      return lambda: (x(), y(), z())
+    return lambda: tuple([e() for e in elts])
+
+  def _expr_List(self, node: ast.List) -> Callable[[], list]:
+    elts = self._elements(node.elts)
+    return lambda: [e() for e in elts]
+
+  def _expr_Set(self, node: ast.Set) -> Callable[[], set]:
+    elts = self._elements(node.elts)
+    return lambda: {e() for e in elts}
+
+  def _expr_Dict(self, node: ast.Dict) -> Callable[[], dict]:
+    if any(k is None for k in node.keys):
+      raise StaticEvalError("dict unpacking")
+    items = [(self.expr(k), self.expr(v)) for k, v in zip(node.keys, node.values)]
+    return lambda: {k(): v() for k, v in items}
+
+  def _expr_BinOp(self, node: ast.BinOp) -> Callable[[], Any]:
+    op = _BIN_OPS.get(type(node.op))
+    if op is None:
+      raise StaticEvalError(f"operator {type(node.op).__name__}")
+    left, right, sized = self.expr(node.left), self.expr(node.right), self._sized
+    if op is operator.add:
+      def checked_add() -> Any:
+        a, b = left(), right()
+        if type(a) in _NUMBERS and type(b) in _NUMBERS:
+          return a + b
+        return sized(_binop(op, a, b))
+      return checked_add
+    if op is operator.mul:
+      def checked_mul() -> Any:
+        a, b = left(), right()
+        ta, tb = type(a), type(b)
+        if ta is float and tb in _NUMBERS or tb is float and ta is int:
+          return a * b
+        if ta is int and tb is int and a.bit_length() + b.bit_length() <= _MAX_INT_BITS:
+          return a * b
+        return sized(_binop(op, a, b))
+      return checked_mul
+    if op is operator.mod:
+      def checked_mod() -> Any:
+        a = left()
+        if type(a) is str:
+          raise StaticEvalError("%-formatting")
+        return a % right()
+      return checked_mod
+    if op is operator.pow:
+      return lambda: _binop(op, left(), right())
+    return lambda: op(left(), right())
+
+  def _expr_UnaryOp(self, node: ast.UnaryOp) -> Callable[[], Any]:
+    op, operand = _UNARY_OPS[type(node.op)], self.expr(node.operand)
+    return lambda: op(operand())
+
+  def _expr_BoolOp(self, node: ast.BoolOp) -> Callable[[], Any]:
+    values = [self.expr(v) for v in node.values]
+    stop_on = not isinstance(node.op, ast.And)  # `and` stops at a falsy value, `or` at a truthy one
+    def run() -> Any:
+      value = None
+      for v in values:
+        value = v()
+        if bool(value) is stop_on:
+          return value
+      return value
+    return run
+
+  def _expr_Compare(self, node: ast.Compare) -> Callable[[], bool]:
+    left = self.expr(node.left)
+    ops = [(_COMPARE_OPS[type(op)], self.expr(c)) for op, c in zip(node.ops, node.comparators)]
+    if len(ops) == 1:
+      (op, right), = ops
+      return lambda: op(left(), right())
+    def run() -> bool:
+      a = left()
+      for op, right in ops:
+        b = right()
+        if not op(a, b):
+          return False
+        a = b
+      return True
+    return run
+
+  def _expr_IfExp(self, node: ast.IfExp) -> Callable[[], Any]:
+    test, body, orelse = self.expr(node.test), self.expr(node.body), self.expr(node.orelse)
+    return lambda: body() if test() else orelse()
+
+  def _expr_JoinedStr(self, node: ast.JoinedStr) -> Callable[[], str]:
+    parts, sized = [self.expr(v) for v in node.values], self._sized
+    return lambda: sized("".join([str(p()) for p in parts]))
+
+  def _expr_FormattedValue(self, node: ast.FormattedValue) -> Callable[[], str]:
+    value = self.expr(node.value)
+    conversion = {ord("s"): str, ord("r"): repr, ord("a"): ascii}.get(node.conversion, lambda v: v)
+    spec = self.expr(node.format_spec) if node.format_spec is not None else (lambda: "")
+    def run() -> str:
+      v, s = conversion(value()), spec()
+      # a width or precision in the spec sizes the output
+      if s and any(int(n) > _MAX_SEQUENCE for n in re.findall(r"\d+", s)):
+        raise StaticEvalError("format width too large")
+      return format(v, s)
+    return run
+
+  def _comprehension(self, node: ast.ListComp | ast.GeneratorExp | ast.SetComp) -> Callable[[], list]:
+    # comprehension variables do not leak, as in Python 3
+    names = {n.id for g in node.generators for n in ast.walk(g.target) if isinstance(n, ast.Name)}
+    outer = self._scope
+    if outer is not None:
+      self._scope = outer | names
+    try:
+      gens = []
+      for gen in node.generators:
+        if gen.is_async:
+          raise StaticEvalError("async comprehension")
+        gens.append((self.expr(gen.iter), self.store(gen.target), [self.expr(c) for c in gen.ifs]))
+      elt = self.expr(node.elt)
+    finally:
+      self._scope = outer
+    ev, charge, check = self, self._charge, self._iterable
+
+    def run() -> list:
+      scope = ev.locals if outer is not None else ev.globals
+      saved = {k: scope[k] for k in names if k in scope}
+      out: list = []
+      def loop(i: int) -> None:
+        if i == len(gens):
+          out.append(elt())
+          return
+        iterable, store, ifs = gens[i]
+        for value in check(iterable()):
+          charge(1)
+          store(value)
+          if all(cond() for cond in ifs):
+            loop(i + 1)
+      try:
+        loop(0)
+      finally:
+        for k in names:
+          scope.pop(k, None)
+        scope.update(saved)
+      return out
+    return run
+
+  def _expr_ListComp(self, node: ast.ListComp) -> Callable[[], list]:
+    return self._comprehension(node)
+
+  def _expr_GeneratorExp(self, node: ast.GeneratorExp) -> Callable[[], list]:
+    return self._comprehension(node)
+
+  def _expr_SetComp(self, node: ast.SetComp) -> Callable[[], set]:
+    run = self._comprehension(node)
+    return lambda: set(run())
+
+  def _expr_Call(self, node: ast.Call) -> Callable[[], Any]:
+    if any(isinstance(a, ast.Starred) for a in node.args) or any(k.arg is None for k in node.keywords):
+      raise StaticEvalError("argument unpacking")
+    fn = self.expr(node.func)
+    args = [self.expr(a) for a in node.args]
+    kwargs = [(k.arg, self.expr(k.value)) for k in node.keywords]
+    admit = self._admit
+    if not args:  # bpy.ops calls take keyword arguments only
+      def run_keywords() -> Any:
+        f = fn()
+        kw = {k: v() for k, v in kwargs}
+        admit(f, [], kw)
+        return f(**kw)
+      return run_keywords
+    def run() -> Any:
+      f = fn()
+      a = [arg() for arg in args]
+      kw = {k: v() for k, v in kwargs}
+      admit(f, a, kw)
+      return f(*a, **kw)
+    return run
+
+
+def evaluate(source: str, bpy: types.ModuleType, *, max_steps: int = DEFAULT_MAX_STEPS,
+             max_seconds: float = DEFAULT_MAX_SECONDS) -> None:
+  """Run `source` against the `bpy` stubs without `exec`.
+
+  Raises `StaticEvalError` on anything outside the supported subset, or
+  once `max_steps` work units or `max_seconds` of CPU time were spent;
+  errors of the script itself propagate unchanged.
+  """
+  _Evaluator(bpy, max_steps, max_seconds).block(ast.parse(source).body)()
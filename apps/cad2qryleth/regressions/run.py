@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Regression scripts for cad2qryleth
+==================================
+Every `*.py` here (besides this runner) is a hostile input script.  The
+static evaluator must give up on it in-process within its budgets, and
+`convert(..., sandbox=True)` must then stop it with `ScriptLimitError`;
+the first comment of each script names the case.
+
+```bash
+python regressions/run.py              # all scripts, --cpu-limit 2, --mem-limit 512
+```
+"""
+from __future__ import annotations
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from converter import ScriptLimitError, _CaptureContext, convert  # noqa: E402
+from evaluator import StaticEvalError, evaluate  # noqa: E402
+
+HERE = Path(__file__).resolve().parent
+
+
+def main() -> int:
+  failed = 0
+  for script in sorted(HERE.glob("*.py")):
+    if script.name == Path(__file__).name:
+      continue
+    source = script.read_text(encoding="utf-8")
+    started = time.perf_counter()
+    try:
+      evaluate(source, _CaptureContext(None).bpy)
+      static, ok = "evaluated", False
+    except StaticEvalError as exc:
+      static, ok = f"refused ({exc})", True
+    except Exception as exc:
+      static, ok = f"{type(exc).__name__}: {exc}", False
+    static += f" in {time.perf_counter() - started:.2f}s"
+    started = time.perf_counter()
+    try:
+      convert(source, name=script.stem, sandbox=True, cpu_limit=2, memory_limit=512)
+      outcome, ok = "converted", False
+    except ScriptLimitError as exc:
+      outcome = f"ScriptLimitError ({exc.limit})"
+    except Exception as exc:
+      outcome, ok = f"{type(exc).__name__}: {exc}", False
+    failed += not ok
+    print(f"  {'ok  ' if ok else 'FAIL'}  {script.name}: static {static}; "
+          f"{outcome}, {time.perf_counter() - started:.1f}s")
+  return 1 if failed else 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,9 @@
+# Few statements but seconds of CPU: the static evaluator must give up on
+# the copied elements, and `--sandbox --cpu-limit 2` stop the worker with
+# ScriptLimitError (cpu_time).
+import bpy
+
+big = list(range(1000000))
+for i in range(200):
+    sorted(big, reverse=True)
+bpy.ops.mesh.primitive_cube_add(size=1, location=(0, 0, 0))
@@ -0,0 +1,7 @@
+# A single string method call allocating ~3 GB: the static evaluator must
+# refuse the width before the call, and `--sandbox` stop the worker with
+# ScriptLimitError (memory) instead of allocating in the caller.
+import bpy
+
+pad = "a".ljust(3_000_000_000)
+bpy.ops.mesh.primitive_cube_add(size=1, location=(0, 0, 0))
@@ -0,0 +1,7 @@
+# Every exponent is <= 1024, yet the result has a billion digits: the static
+# evaluator must refuse the int width, and `--sandbox` stop the worker with
+# ScriptLimitError (cpu_time or memory).
+import bpy
+
+n = ((10 ** 1000) ** 1000) ** 1000
+bpy.ops.mesh.primitive_cube_add(size=1, location=(0, 0, 0))
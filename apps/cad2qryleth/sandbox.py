@@ -0,0 +1,198 @@
+"""
+Resource-limited script execution for cad2qryleth
+=================================================
+`run_sandboxed()` executes a Blender script in a separate Python process
+instead of calling `exec` in the converter's own interpreter, so a runaway
+loop or allocation cannot stall the caller.
+
+```bash
+python converter.py input/Dog.py --sandbox --cpu-limit 10 --mem-limit 512 --max-prims 100000
+```
+
+The worker applies `RLIMIT_CPU` / `RLIMIT_AS` to itself (POSIX only; on
+other platforms just the wall-clock and primitive limits apply) and streams
+every captured primitive back as one JSON line on its stdout; anything the
+script prints is redirected to stderr.  A breached limit is raised in the
+caller as `converter.ScriptLimitError`, a failing script as
+`converter.ScriptError`.
+"""
+from __future__ import annotations
+import json
+import os
+import queue
+import random
+import signal
+import subprocess
+import sys
+import threading
+import time
+import types
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+if __name__ == "__main__":
+  # the worker only captures: keep its start-up lean by loading the converter
+  # without numpy (the script itself may still import it, see `_worker`)
+  sys.modules["numpy"] = None
+
+from converter import SandboxError, ScriptError, ScriptLimitError
+
+_WORKER = Path(__file__).resolve()
+
+# wall-clock allowance on top of the CPU limit (interpreter start-up, I/O)
+_WALL_GRACE = 5.0
+
+###############################################################################
+# Record transport                                                            #
+###############################################################################
+
+def _plain(rec: Dict[str, Any]) -> Dict[str, Any]:
+  """JSON-safe copy of a capture record (the parts the converter reads)."""
+  obj = rec["__obj"]
+  out = {k: v for k, v in rec.items() if k != "__obj"}
+  out["__obj"] = {
+    "name": obj.name,
+    "scale": list(obj.scale),
+    "materials": [{"diffuse_color": list(m.diffuse_color)} for m in obj.data.materials[:1]],
+  }
+  return out
+
+
+def _record(plain: Dict[str, Any]) -> Dict[str, Any]:
+  """Inverse of `_plain`: rebuild the object stub `_prim_to_schema` expects."""
+  obj = plain.pop("__obj")
+  materials = [types.SimpleNamespace(diffuse_color=tuple(m["diffuse_color"])) for m in obj["materials"]]
+  plain["__obj"] = types.SimpleNamespace(name=obj["name"], scale=obj["scale"],
+                                         data=types.SimpleNamespace(materials=materials))
+  return plain
+
+###############################################################################
+# Worker process                                                              #
+###############################################################################
+
+def _apply_limits(cpu_limit: float | None, memory_limit: int | None) -> None:
+  try:
+    import resource
+  except ImportError:  # not POSIX
+    return
+  if cpu_limit:
+    soft = max(1, int(cpu_limit + 0.999))
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, soft + 1))
+  if memory_limit:
+    limit = memory_limit * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _worker() -> int:
+  from converter import _CaptureContext
+  del sys.modules["numpy"]
+
+  # the pipe keeps fd 1; the script's own output goes to stderr
+  out = os.fdopen(os.dup(1), "w", encoding="utf-8")
+  os.dup2(2, 1)
+  config = json.loads(sys.stdin.readline())
+  source = sys.stdin.read()
+  state = config["random"]
+  random.setstate((state[0], tuple(state[1]), state[2]))
+  _apply_limits(config["cpu_limit"], config["memory_limit"])
+
+  limit = config["max_primitives"]
+  count = 0
+  def send(rec: Dict[str, Any]) -> None:
+    nonlocal count
+    count += 1
+    if limit is not None and count > limit:
+      # stop right here: the script could swallow an exception
+      out.write(json.dumps({"limit": "primitives", "value": limit}) + "\n")
+      out.flush()
+      os._exit(0)
+    out.write(json.dumps({"record": _plain(rec)}) + "\n")
+
+  try:
+    _CaptureContext(send).run(source)
+    final: Dict[str, Any] = {"done": True}
+  except ScriptLimitError as exc:
+    final = {"limit": exc.limit, "value": exc.value}
+  except MemoryError:
+    final = {"limit": "memory", "value": config["memory_limit"]}
+  except (Exception, SystemExit) as exc:
+    final = {"error": f"{type(exc).__name__}: {exc}"}
+  out.write(json.dumps(final) + "\n")
+  out.flush()
+  return 0
+
+###############################################################################
+# Caller side                                                                 #
+###############################################################################
+
+def run_sandboxed(source: str, on_primitive: Callable[[Dict[str, Any]], None], *,
+                  cpu_limit: float | None = 30.0, memory_limit: int | None = 1024,
+                  max_primitives: int | None = None) -> int:
+  """Run `source` in a worker process, passing each captured record to
+  `on_primitive` as it arrives; returns the number of primitives.
+
+  `cpu_limit` is in CPU seconds (the wall clock is capped at twice that
+  plus a few seconds, which catches scripts that sleep), `memory_limit` in
+  MiB of address space.  `None` disables a limit.  The worker starts from
+  this process's `random` state, so scripts using `random` behave as they
+  would in-process.
+  """
+  config = {"cpu_limit": cpu_limit, "memory_limit": memory_limit,
+            "max_primitives": max_primitives, "random": random.getstate()}
+  proc = subprocess.Popen([sys.executable, str(_WORKER)], stdin=subprocess.PIPE,
+                          stdout=subprocess.PIPE, text=True, encoding="utf-8")
+  lines: queue.Queue = queue.Queue()
+
+  def pump() -> None:
+    for line in proc.stdout:
+      lines.put(line)
+    lines.put(None)
+  threading.Thread(target=pump, daemon=True).start()
+
+  deadline = time.monotonic() + 2 * cpu_limit + _WALL_GRACE if cpu_limit else None
+  count = 0
+  final = None
+  try:
+    try:
+      proc.stdin.write(json.dumps(config) + "\n")
+      proc.stdin.write(source)
+      proc.stdin.close()
+    except BrokenPipeError:  # the worker died during start-up; reported below
+      pass
+    while True:
+      timeout = None if deadline is None else deadline - time.monotonic()
+      if timeout is not None and timeout <= 0:
+        raise ScriptLimitError("wall_time", 2 * cpu_limit + _WALL_GRACE, count)
+      try:
+        line = lines.get(timeout=timeout)
+      except queue.Empty:
+        continue
+      if line is None:
+        break
+      msg = json.loads(line)
+      if "record" not in msg:
+        final = msg
+        continue
+      count += 1
+      if max_primitives is not None and count > max_primitives:
+        raise ScriptLimitError("primitives", max_primitives, count)
+      on_primitive(_record(msg["record"]))
+  finally:
+    if proc.poll() is None:
+      proc.kill()
+    proc.wait()
+
+  if final is None:
+    killed = {-getattr(signal, "SIGXCPU", 0), -getattr(signal, "SIGKILL", 0)} - {0}
+    if cpu_limit and proc.returncode in killed:
+      raise ScriptLimitError("cpu_time", cpu_limit, count)
+    raise SandboxError(f"script worker exited with code {proc.returncode}")
+  if "limit" in final:
+    raise ScriptLimitError(final["limit"], final["value"], count)
+  if "error" in final:
+    raise ScriptError(final["error"])
+  return count
+
+
+if __name__ == "__main__":
+  sys.exit(_worker())
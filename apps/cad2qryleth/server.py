@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Warm conversion server for cad2qryleth
+======================================
+Long-running daemon that exposes `converter.convert()` over localhost HTTP,
+so tooling does not pay interpreter startup for every conversion.
+
+```bash
+python server.py --port 8765 --workers 4 --recycle 200   # start the daemon
+python converter.py input/Dog.py --server http://127.0.0.1:8765 -o dog.json
+```
+
+Protocol (JSON in, JSON out):
+
+* `POST /convert` with `{"source": "<script>", "name": "Dog", "up": "y",
+  "options": {...}}` — the fields mirror the CLI arguments (`input` is sent
+  as its contents); `options` carries any further `convert()` keyword
+  arguments (`instancing`, `sandbox`, ...).
+  Replies `{"ok": true, "result": {...}}` or `{"ok": false, "error": "..."}`
+  (HTTP 400 for bad requests, 422 when the script fails to convert; script
+  limit breaches add the structured `details` of `ScriptLimitError`).
+* `GET /health` — `{"ok": true, "workers": N}`.
+
+Conversions run in a pool of pre-started worker processes that are recycled
+after `--recycle` jobs, which bounds any state a misbehaving script leaves
+behind in a worker.  A job that outlives `--timeout` is answered with 504
+and its worker is killed; the pool starts a fresh one in its place.
+"""
+from __future__ import annotations
+import argparse
+import inspect
+import itertools
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict
+
+from cache import ConversionCache, DEFAULT_CACHE_DIR, cached_convert
+from converter import SandboxError, convert, encode_json, loads
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# convert() keyword arguments a request may set through "options"
+_OPTION_NAMES = frozenset(p.name for p in inspect.signature(convert).parameters.values()
+                          if p.kind is p.KEYWORD_ONLY) - {"name", "up_axis", "stats"}
+
+###############################################################################
+# Worker side                                                                 #
+###############################################################################
+
+# `running` values besides worker pids
+_CANCELLED = 0  # timed out before a worker picked the job up
+_DONE = -1      # finished; the server side removes the entry
+
+_worker_cache: ConversionCache | None = None
+_worker_running: Any = None
+_worker_lock: Any = None
+
+
+def _init_worker(cache_dir: str | None, running: Any, lock: Any) -> None:
+  global _worker_cache, _worker_running, _worker_lock
+  signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C is handled by the server process
+  _worker_cache = ConversionCache(cache_dir) if cache_dir else None
+  _worker_running, _worker_lock = running, lock
+
+
+def _job(job_id: int, request: Dict[str, Any]) -> Dict[str, Any]:
+  """Run one conversion inside a pool worker; never raises.  The worker's
+  pid is listed under `job_id` while it runs, so a timed-out job can be
+  killed; a job that timed out while queued is skipped."""
+  if _worker_running.setdefault(job_id, os.getpid()) == _CANCELLED:
+    _worker_running.pop(job_id, None)
+    return {"ok": False, "error": "cancelled: timed out in the queue"}
+  try:
+    data, hit = cached_convert(request["source"], _worker_cache, name=request["name"],
+                               up_axis=request["up"], **request["options"])
+  except SandboxError as exc:
+    return {"ok": False, "error": f"{type(exc).__name__}: {exc}", "details": exc.to_dict()}
+  except (Exception, SystemExit) as exc:
+    return {"ok": False, "error": f"{type(exc).__name__}: {exc}"}
+  finally:
+    with _worker_lock:  # not while `kill_job` holds our pid
+      _worker_running[job_id] = _DONE
+  return {"ok": True, "cached": hit, "result": data}
+
+
+def _parse_request(body: bytes) -> Dict[str, Any]:
+  """Validate a /convert payload and fill CLI defaults."""
+  req = json.loads(body or b"{}")
+  if not isinstance(req, dict) or not isinstance(req.get("source"), str):
+    raise ValueError("'source' (script text) is required")
+  up = str(req.get("up", "y")).lower()
+  if up not in ("y", "z"):
+    raise ValueError("'up' must be 'y' or 'z'")
+  options = req.get("options") or {}
+  if not isinstance(options, dict) or not set(options) <= _OPTION_NAMES:
+    raise ValueError(f"'options' may only contain {sorted(_OPTION_NAMES)}")
+  return {"source": req["source"], "name": str(req.get("name") or "ImportedObject"), "up": up,
+          "options": options}
+
+###############################################################################
+# HTTP front                                                                  #
+###############################################################################
+
+class ConversionServer(ThreadingHTTPServer):
+  """HTTP server owning a pool of warm conversion workers."""
+
+  daemon_threads = True
+
+  def __init__(self, address, *, workers: int, recycle: int, timeout: float,
+               cache_dir: str | None) -> None:
+    super().__init__(address, _Handler)
+    self.workers = workers
+    self.timeout_s = timeout
+    self.job_ids = itertools.count()
+    # job id -> pid of the worker running it, _CANCELLED or _DONE; `lock`
+    # keeps a worker from moving on to another job while `kill_job` reads
+    # its pid and kills it
+    self.manager = multiprocessing.Manager()
+    self.running = self.manager.dict()
+    self.lock = multiprocessing.Lock()
+    self.pool = multiprocessing.Pool(workers, initializer=_init_worker,
+                                     initargs=(cache_dir, self.running, self.lock),
+                                     maxtasksperchild=recycle)
+
+  def run_job(self, job_id: int, request: Dict[str, Any]) -> Dict[str, Any]:
+    """`_job` in the pool; raises `multiprocessing.TimeoutError` after
+    `timeout_s` (see `kill_job`)."""
+    res = self.pool.apply_async(_job, (job_id, request)).get(self.timeout_s)
+    self.running.pop(job_id, None)
+    return res
+
+  def kill_job(self, job_id: int) -> None:
+    """Kill the worker running `job_id` (`Pool` replaces it), or mark the
+    job cancelled if no worker has picked it up yet."""
+    with self.lock:
+      pid = self.running.setdefault(job_id, _CANCELLED)
+      if pid == _CANCELLED:
+        return  # the worker that picks the job up removes the entry
+      self.running.pop(job_id, None)
+      if pid != _DONE:
+        try:
+          os.kill(pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+        except OSError:
+          pass  # the worker died on its own
+
+  def server_close(self) -> None:
+    super().server_close()
+    self.pool.terminate()
+    self.pool.join()
+    self.manager.shutdown()
+
+
+class _Handler(BaseHTTPRequestHandler):
+  server: ConversionServer
+
+  def _reply(self, status: int, payload: Dict[str, Any]) -> None:
+    body = encode_json(payload, compact=True)
+    self.send_response(status)
+    self.send_header("Content-Type", "application/json")
+    self.send_header("Content-Length", str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def do_GET(self) -> None:
+    if self.path == "/health":
+      self._reply(200, {"ok": True, "workers": self.server.workers})
+    else:
+      self._reply(404, {"ok": False, "error": f"unknown endpoint {self.path}"})
+
+  def do_POST(self) -> None:
+    if self.path != "/convert":
+      self._reply(404, {"ok": False, "error": f"unknown endpoint {self.path}"})
+      return
+    try:
+      length = int(self.headers.get("Content-Length", 0))
+      req = _parse_request(self.rfile.read(length))
+    except ValueError as exc:
+      self._reply(400, {"ok": False, "error": str(exc)})
+      return
+    job_id = next(self.server.job_ids)
+    try:
+      res = self.server.run_job(job_id, req)
+    except multiprocessing.TimeoutError:
+      # the pool cannot cancel a running job: stop the runaway script itself
+      self.server.kill_job(job_id)
+      self._reply(504, {"ok": False, "error": f"conversion timed out after {self.server.timeout_s}s"})
+      return
+    self._reply(200 if res["ok"] else 422, res)
+
+  def log_message(self, fmt: str, *args: Any) -> None:
+    sys.stderr.write(f"[cad2qryleth] {self.address_string()} {fmt % args}\n")
+
+###############################################################################
+# Client                                                                      #
+###############################################################################
+
+class RemoteConversionError(RuntimeError):
+  """Raised by `convert_remote` when the server rejects a conversion.
+
+  `details` is the server's structured error (`ScriptLimitError.to_dict()`
+  for limit breaches) or None.
+  """
+
+  def __init__(self, message: str, details: Dict[str, Any] | None = None) -> None:
+    super().__init__(message)
+    self.details = details
+
+  def to_dict(self) -> Dict[str, Any]:
+    """Same shape as `SandboxError.to_dict()`; limit breaches keep their fields."""
+    return {"type": type(self).__name__, "message": str(self), **(self.details or {})}
+
+
+def convert_remote(url: str, src: str, *, name: str = "ImportedObject", up_axis: str = "Y",
+                   timeout: float = 120.0, **options: Any) -> Dict[str, Any]:
+  """`convert()` executed by the server at `url`; same arguments and result."""
+  body = json.dumps({"source": src, "name": name, "up": up_axis.lower(),
+                     "options": options}).encode("utf-8")
+  req = urllib.request.Request(url.rstrip("/") + "/convert", data=body,
+                               headers={"Content-Type": "application/json"})
+  try:
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+      payload = loads(resp.read())
+  except urllib.error.HTTPError as exc:
+    try:
+      payload = json.loads(exc.read())
+    except ValueError:
+      raise RemoteConversionError(f"HTTP {exc.code}: {exc.reason}") from None
+  if not payload.get("ok"):
+    raise RemoteConversionError(payload.get("error", "conversion failed"), payload.get("details"))
+  return payload["result"]
+
+###############################################################################
+# CLI                                                                         #
+###############################################################################
+
+def main(argv: list[str] | None = None) -> int:
+  parser = argparse.ArgumentParser(description="cad2qryleth conversion server (localhost HTTP)")
+  parser.add_argument("--host", default=DEFAULT_HOST, help=f"Bind address (default: {DEFAULT_HOST})")
+  parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port (default: {DEFAULT_PORT})")
+  parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Warm worker processes (default: CPU count)")
+  parser.add_argument("--recycle", type=int, default=200, help="Restart a worker after N jobs (default: 200)")
+  parser.add_argument("--timeout", type=float, default=60.0, help="Per-request conversion timeout, seconds; the worker is killed on expiry (default: 60)")
+  parser.add_argument("--no-cache", action="store_true", help="Disable the on-disk conversion cache")
+  parser.add_argument("--cache-dir", help="Conversion cache directory (default: .cache next to converter.py)")
+  ns = parser.parse_args(argv)
+
+  cache_dir = None if ns.no_cache else str(ns.cache_dir or DEFAULT_CACHE_DIR)
+  server = ConversionServer((ns.host, ns.port), workers=ns.workers, recycle=ns.recycle,
+                            timeout=ns.timeout, cache_dir=cache_dir)
+  print(f"cad2qryleth server on http://{ns.host}:{server.server_port} ({ns.workers} workers)", file=sys.stderr)
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    server.server_close()
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
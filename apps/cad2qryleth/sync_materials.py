@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Global material table generator
+===============================
+Regenerates `global_materials.json` from the front end's
+`globalMaterials.ts`, which stays the single source of truth for global
+material UUIDs and colours.  The converter only ever reads the JSON.
+
+```bash
+python sync_materials.py            # rewrite global_materials.json
+python sync_materials.py --check    # exit 1 if the JSON is out of date
+```
+"""
+from __future__ import annotations
+import argparse
+import json
+import re
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+from converter import GLOBAL_MATERIALS_FILE, write_text_atomic
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_SOURCE = REPO_ROOT / "apps/qryleth-front/src/shared/lib/materials/globalMaterials.ts"
+
+
+def _string(block: str, key: str) -> str | None:
+  m = re.search(rf"\b{key}:\s*'([^']*)'", block)
+  return m.group(1) if m else None
+
+
+def parse_global_materials(ts_source: str) -> List[Dict[str, Any]]:
+  """Extract `uuid`, `name`, `type`, `color`, `opacity` and `transparent` of
+  every entry in `PREDEFINED_GLOBAL_MATERIALS_WITH_UUID`, in file order."""
+  consts = dict(re.findall(r"^\s*(\w+):\s*'(global-material-[\w-]+)'", ts_source, re.M))
+  materials = []
+  # every material literal starts at its `uuid: GLOBAL_MATERIAL_UUIDS.<KEY>` line
+  parts = re.split(r"\buuid:\s*GLOBAL_MATERIAL_UUIDS\.(\w+)", ts_source)
+  for key, block in zip(parts[1::2], parts[2::2]):
+    if key not in consts:
+      raise ValueError(f"Unknown GLOBAL_MATERIAL_UUIDS.{key}")
+    color = _string(block, "color")
+    if color is None:
+      raise ValueError(f"{consts[key]} has no color")
+    opacity = re.search(r"\bopacity:\s*([\d.]+)", block)
+    transparent = re.search(r"\btransparent:\s*(true|false)", block)
+    materials.append({
+      "uuid": consts[key],
+      "name": _string(block, "name"),
+      "type": _string(block, "type"),
+      "color": color.upper(),
+      "opacity": float(opacity.group(1)) if opacity else 1.0,
+      "transparent": bool(transparent and transparent.group(1) == "true"),
+    })
+  return materials
+
+
+def render(materials: List[Dict[str, Any]], source: Path) -> str:
+  return json.dumps({
+    "source": source.resolve().relative_to(REPO_ROOT).as_posix(),
+    "generatedBy": "apps/cad2qryleth/sync_materials.py",
+    "materials": materials,
+  }, indent=2, ensure_ascii=False) + "\n"
+
+
+def main(argv: List[str] | None = None) -> int:
+  parser = argparse.ArgumentParser(description="Regenerate global_materials.json from globalMaterials.ts")
+  parser.add_argument("--source", type=Path, default=DEFAULT_SOURCE, help="Path to globalMaterials.ts")
+  parser.add_argument("--check", action="store_true", help="Only verify that the JSON is up to date")
+  ns = parser.parse_args(argv)
+
+  materials = parse_global_materials(ns.source.read_text(encoding="utf-8"))
+  text = render(materials, ns.source)
+  current = GLOBAL_MATERIALS_FILE.read_text(encoding="utf-8") if GLOBAL_MATERIALS_FILE.exists() else None
+  if ns.check:
+    if current != text:
+      print(f"{GLOBAL_MATERIALS_FILE.name} is out of date; run sync_materials.py", file=sys.stderr)
+      return 1
+    return 0
+  if current != text:
+    write_text_atomic(GLOBAL_MATERIALS_FILE, text)
+  print(f"{GLOBAL_MATERIALS_FILE.name}: {len(materials)} materials")
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
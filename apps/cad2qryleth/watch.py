@@ -0,0 +1,94 @@
+"""
+Watch mode for cad2qryleth
+==========================
+Monitors the input scripts and re-converts only the files that changed.
+
+```bash
+python converter.py input/ --watch
+```
+
+The watcher polls file stamps (mtime + size) instead of relying on
+platform notification APIs, so it needs nothing beyond the stdlib.  Saves
+are debounced: a file is converted once it has been quiet for `debounce`
+seconds, which collapses editor "save bursts" into one conversion.  With
+the default 0.1 s poll and 0.15 s debounce a save shows up in `output/`
+well under a second later; outputs are replaced atomically so the front end
+never reads a half-written JSON file.
+"""
+from __future__ import annotations
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, TextIO, Tuple
+
+from batch import BatchResult, _clashes, _convert_one, collect_outputs, format_result, print_summary
+from cache import ConversionCache
+
+
+def _stamp(path: Path) -> Tuple[int, int] | None:
+  try:
+    st = path.stat()
+  except OSError:
+    return None
+  return st.st_mtime_ns, st.st_size
+
+
+def watch(patterns: Iterable[str], *, out_dir: str | Path = "output", options: Dict[str, Any] | None = None,
+          cache: ConversionCache | None = None, interval: float = 0.1,
+          debounce: float = 0.15, stream: TextIO | None = None, fmt: str = "json",
+          precision: int | None = None, compact: bool = False, json_backend: str | None = None) -> None:
+  """Convert everything matched by `patterns`, then re-convert on change.
+
+  Runs until interrupted (Ctrl+C).  New files matching the patterns are
+  picked up automatically.  `options` are passed to `convert()`.
+  """
+  patterns = list(patterns)
+  options = options or {}
+  stream = stream or sys.stdout
+  Path(out_dir).mkdir(parents=True, exist_ok=True)
+
+  stamps: Dict[Path, Tuple[int, int] | None] = {}
+  results = []
+  names = collect_outputs(patterns)
+  clashes = _clashes(names)
+  for src, name in names.items():
+    stamps[src] = _stamp(src)
+    if src in clashes:
+      results.append(BatchResult(src, error=clashes[src]))
+      continue
+    results.append(_convert_one(str(src), str(out_dir), options, cache, fmt, precision, compact,
+                                    json_backend=json_backend, output=name))
+  print_summary(results, stream)
+  print(f"Watching {len(stamps)} script(s) for changes (Ctrl+C to stop)", file=stream, flush=True)
+
+  pending: Dict[Path, float] = {}  # path -> time of the latest observed change
+  try:
+    while True:
+      time.sleep(interval)
+      now = time.monotonic()
+      current = collect_outputs(patterns)
+      for src in current:
+        stamp = _stamp(src)
+        if stamps.get(src, ()) != stamp:
+          stamps[src] = stamp
+          pending[src] = now
+      for src in set(stamps) - set(current):
+        del stamps[src]
+        pending.pop(src, None)
+        print(f"  gone  {src}", file=stream, flush=True)
+
+      ready = [src for src, changed in pending.items() if now - changed >= debounce]
+      for src in sorted(ready):
+        del pending[src]
+        if stamps.get(src) is None:
+          continue
+        clash = _clashes(current).get(src)
+        if clash:
+          print(format_result(BatchResult(src, error=clash)), file=stream, flush=True)
+          continue
+        result = _convert_one(str(src), str(out_dir), options, cache, fmt, precision, compact,
+                              json_backend=json_backend, output=current[src])
+        print(format_result(result), file=stream, flush=True)
+  except KeyboardInterrupt:
+    pass
+